@@ -0,0 +1,103 @@
+import argparse
+import multiprocessing
+import random
+import time
+from typing import Callable, Dict, List
+
+import pandas as pd
+
+from lifelinescsv_to_icdf.cdfgenerator import INDEX_STRATEGIES, index_datafile, load_val
+
+#Index build benchmark: time and peak memory of indexing a synthetic datafile with each of the index
+#strategies of the generator, compared with the former set_index + sort_values build, and the time of
+#the per-participant lookups done during the generation. Each build runs on a forked process, whose peak
+#resident memory (Linux only, from /proc) is reported relative to its size before the build.
+#
+#   python -m benchmarks.bench_index
+#   python -m benchmarks.bench_index --participants 1000000 --duplicated 0.2 --lookups 20000
+
+
+def synthetic_datafile(participants:int, duplicated:float, columns:int, seed:int) -> pd.DataFrame:
+    """Datafile with the rows in random order, where a fraction of the participants have two rows (variants)."""
+    rng = random.Random(seed)
+    ids = [f'{rng.getrandbits(64):016x}' for _ in range(participants)]
+    rows = ids + rng.sample(ids, int(participants * duplicated))
+    rng.shuffle(rows)
+    data = {'project_pseudo_id': rows}
+    for column in range(columns):
+        data[f'var{column}'] = [str(rng.randint(0, 100)) for _ in rows]
+    return pd.DataFrame(data, dtype=str)
+
+
+def sort_values_build(data_frame:pd.DataFrame) -> pd.DataFrame:
+    data_frame.set_index('project_pseudo_id', inplace=True)
+    return data_frame.sort_values(by='project_pseudo_id')
+
+
+def proc_status_mb(field:str) -> float:
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1]) / 1024
+    return float('nan')
+
+
+def measure(build:Callable[[pd.DataFrame], pd.DataFrame], data_frame:pd.DataFrame, lookup_ids:List[str]) -> Dict[str,float]:
+    data_frame = data_frame.copy()
+    try:
+        #reset the peak resident memory (VmHWM) of the process
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        rss_before = proc_status_mb('VmRSS')
+    except OSError:
+        rss_before = float('nan')
+
+    start = time.perf_counter()
+    data_frame = build(data_frame)
+    build_seconds = time.perf_counter() - start
+    peak_mb = proc_status_mb('VmHWM') - rss_before if rss_before == rss_before else float('nan')
+
+    data_frames = {'datafile': data_frame}
+    start = time.perf_counter()
+    for participant_id in lookup_ids:
+        load_val(data_frames, 'datafile', 'var0', participant_id)
+    lookup_seconds = time.perf_counter() - start
+
+    return {'build_seconds': build_seconds, 'peak_mb': peak_mb, 'lookup_us': lookup_seconds / len(lookup_ids) * 1e6}
+
+
+def measure_in_child(connection, build, data_frame, lookup_ids) -> None:
+    connection.send(measure(build, data_frame, lookup_ids))
+    connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Index build benchmark of the CSV to CDF generator.')
+    parser.add_argument('--participants', type=int, default=200000, help='Number of participants (default 200000).')
+    parser.add_argument('--duplicated', type=float, default=0.1, help='Fraction of participants with two rows (default 0.1). Use 0 to benchmark unique ids.')
+    parser.add_argument('--columns', type=int, default=5, help='Number of variable columns (default 5).')
+    parser.add_argument('--lookups', type=int, default=5000, help='Number of participant lookups timed (default 5000).')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    data_frame = synthetic_datafile(args.participants, args.duplicated, args.columns, args.seed)
+    lookup_ids = random.Random(args.seed).sample(data_frame['project_pseudo_id'].tolist(), args.lookups)
+    print(f"{len(data_frame)} rows, {args.participants} participants ({args.duplicated:.0%} duplicated), {args.columns} columns")
+
+    builds = {'set_index+sort_values': sort_values_build}
+    for strategy in INDEX_STRATEGIES:
+        builds[strategy] = lambda frame, strategy=strategy: index_datafile(frame, strategy)
+
+    print(f"{'index':24}{'build (s)':>12}{'peak (MB)':>12}{'lookup (us)':>14}")
+    context = multiprocessing.get_context('fork')
+    for name, build in builds.items():
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(target=measure_in_child, args=(sender, build, data_frame, lookup_ids))
+        process.start()
+        result = receiver.recv()
+        process.join()
+        print(f"{name:24}{result['build_seconds']:12.3f}{result['peak_mb']:12.1f}{result['lookup_us']:14.1f}")
+
+
+if __name__ == '__main__':
+    main()
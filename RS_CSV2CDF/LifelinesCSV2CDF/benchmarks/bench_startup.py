@@ -0,0 +1,66 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import List
+
+#Start-up benchmark of the transformation command-line tools: measures (in fresh interpreters) the time
+#needed to import the generator and to print its --help, and checks that the heavy dependencies are not
+#imported eagerly.
+#
+#   python -m benchmarks.bench_startup
+#   python -m benchmarks.bench_startup --repeat 20 --max-import-ms 150
+
+#modules that must only be imported on the code paths that need them
+HEAVY_MODULES = ['pandas', 'numpy', 'psutil', 'pyarrow', 'orjson', 'duckdb', 'openpyxl']
+
+LIFELINES_FOLDER = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def time_command(command:List[str], repeat:int) -> List[float]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=LIFELINES_FOLDER, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def eagerly_imported_modules(module:str) -> List[str]:
+    #lazily imported modules are registered on sys.modules, but their type is only ModuleType once their
+    #code is executed (type() is used as any attribute access would trigger the import)
+    script = (f"import sys, types; import {module}; "
+              f"print(' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules and type(sys.modules[m]) is types.ModuleType))")
+    result = subprocess.run([sys.executable, '-c', script], cwd=LIFELINES_FOLDER, check=True, capture_output=True, text=True)
+    return result.stdout.split()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Start-up time benchmark of the CSV to CDF transformation tools.')
+    parser.add_argument('--repeat', type=int, default=10, help='Number of runs of each measurement (default 10).')
+    parser.add_argument('--max-import-ms', type=float, default=None, help='Fail (exit code 1) when the median import time exceeds this value.')
+    args = parser.parse_args()
+
+    baseline = time_command([sys.executable, '-c', 'pass'], args.repeat)
+    import_times = time_command([sys.executable, '-c', 'import lifelinescsv_to_icdf.cdfgenerator'], args.repeat)
+    help_times = time_command([sys.executable, '-m', 'lifelinescsv_to_icdf.cdfgenerator', '--help'], args.repeat)
+
+    print(f"Interpreter start-up:            {statistics.median(baseline):8.1f} ms (median of {args.repeat})")
+    print(f"import cdfgenerator:             {statistics.median(import_times):8.1f} ms")
+    print(f"cdfgenerator --help:             {statistics.median(help_times):8.1f} ms")
+
+    eager = eagerly_imported_modules('lifelinescsv_to_icdf.cdfgenerator')
+    print(f"Heavy modules imported eagerly:  {eager if eager else 'none'}")
+
+    failed = len(eager) > 0
+    if args.max_import_ms is not None and statistics.median(import_times) > args.max_import_ms:
+        print(f"Median import time above the {args.max_import_ms} ms limit.")
+        failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+import json
+from typing import Dict, Iterable, List, Optional, Set
+
+
+#assessment under which the participant id is reported on the CDF records: {"project_pseudo_id":{"a1":<id>}}
+PSEUDO_ID_ASSESSMENT = 'a1'
+
+
+def load_config(config_file_path:str) -> dict:
+    with open(config_file_path) as f:
+        return json.load(f)
+
+
+def config_schema(config:dict) -> Dict[str,List[str]]:
+    """
+    Variables and assessments of the CDF records generated with the given configuration, in the same
+    order used by generate_csd.
+    """
+    schema:Dict[str,List[str]] = {'project_pseudo_id': [PSEUDO_ID_ASSESSMENT]}
+    for assessment_variable, var_assessment_files in config.items():
+        if assessment_variable == 'project_pseudo_id':
+            continue
+        schema[assessment_variable] = list(dict.fromkeys(list(varversion.keys())[0] for varversion in var_assessment_files))
+    return schema
+
+
+def datafile_columns(config:dict) -> Dict[str,Set[str]]:
+    """Columns (project_pseudo_id and the configured variables) to be read from each datafile."""
+    columns:Dict[str,Set[str]] = {}
+    for assessment_variable, var_assessment_files in config.items():
+        for varversion in var_assessment_files:
+            filename = list(varversion.values())[0]
+            columns.setdefault(filename,{'project_pseudo_id'}).add(assessment_variable)
+    return columns
+
+
+def select_config(config:dict, variables:Optional[Iterable[str]]=None, assessments:Optional[Iterable[str]]=None) -> dict:
+    """
+    Part of a configuration with only the given variables and/or assessments (all of them when None).
+    Datafiles that only provide other variables or assessments are no longer referenced.
+    """
+    variables = set(variables) if variables is not None else None
+    assessments = set(assessments) if assessments is not None else None
+    unknown_variables = (variables or set()) - set(config)
+    if unknown_variables:
+        raise ValueError(f"Variables not found on the configuration: {sorted(unknown_variables)}")
+    unknown_assessments = (assessments or set()) - {list(varversion.keys())[0] for var_assessment_files in config.values() for varversion in var_assessment_files}
+    if unknown_assessments:
+        raise ValueError(f"Assessments not found on the configuration: {sorted(unknown_assessments)}")
+
+    selected = {}
+    for assessment_variable, var_assessment_files in config.items():
+        if variables is not None and assessment_variable not in variables:
+            continue
+        selected_files = [varversion for varversion in var_assessment_files
+                          if assessments is None or list(varversion.keys())[0] in assessments]
+        if selected_files:
+            selected[assessment_variable] = selected_files
+    return selected
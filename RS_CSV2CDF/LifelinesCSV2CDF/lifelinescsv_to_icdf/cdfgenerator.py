@@ -1,19 +1,40 @@
-import pandas as pd
+from __future__ import annotations
 import time
-import resource
 import json
-from typing import Set, Dict, List
-import uuid
+import datetime
+from typing import AbstractSet, Set, Dict, List, Optional
 import argparse
+import concurrent.futures
 import csv
+import importlib.util
 import os
 import sys
-import psutil
 import logging
 import traceback
+from .lazy_imports import lazy_import, resolve
 from .transformation_exceptions import MissingParticipantRowException
 from .transformation_exceptions import MoreThanOneValueInAssessmentVariants
-
+from .cdfconfig import PSEUDO_ID_ASSESSMENT, load_config, config_schema, datafile_columns, select_config
+from .compression import CODECS, get_codec, build_preset_dictionary, write_preset_dictionary
+from .serializers import SERIALIZERS, get_serializer
+from .sharding import Shard, parse_shard, shard_from_environment, select_shard_ids, sample_ids, sample_name
+from .manifest import metadata_folder, write_metadata
+from .prejoin import ParticipantPresence
+from .qa import QASummary
+from .fingerprint import RunFingerprint, RECORD_HASHES_FILE
+from .validation import RecordValidator
+from .parquet_output import DEFAULT_PARQUET_PARTITIONS, DEFAULT_PARQUET_ROW_GROUP_SIZE
+from .cdfstore import DEFAULT_STORE_BATCH_SIZE
+from .mmapstore import MMapDatafile, open_or_build_store
+from .duckdb_backend import DuckDBBackend
+from .streaming import stream_records
+from .outofcore import OutOfCoreBackend
+from .output_writers import create_output_writer, MergingWriter, MERGEABLE_OUTPUT_FORMATS, WriteBehindWriter, StageStats, payload_size, DEFAULT_BUNDLE_SIZE, DEFAULT_WRITE_QUEUE_SIZE
+
+
+# pandas is only imported once it is actually used (e.g., not when printing the --help)
+pd = lazy_import('pandas')
+np = lazy_import('numpy')
 
 # Set the log level to INFO
 logging.basicConfig(level=logging.INFO)
@@ -26,59 +47,168 @@ logging.basicConfig(level=logging.INFO)
 
 
 def load_val(data_frames:Dict[str,pd.core.frame.DataFrame],file:str,col:str,participant_id:str)->int:
+    #memory-mapped datafiles (--mmap-store)
+    if isinstance(data_frames[file],MMapDatafile):
+        return data_frames[file].lookup(participant_id,col)
     try:
-        val = (data_frames[file].loc[participant_id])[col]
+        #column first: a row (.loc[participant_id]) would cast all its values to a common type (e.g., the
+        #integers of a typed datafile to floats when the other columns are floats)
+        val = data_frames[file][col].loc[participant_id]
         return val;
     except KeyError as ke:
         raise MissingParticipantRowException(ke)    
 
 
-def load_and_index_csv_datafiles(config_file_path:str) -> Dict[str,pd.core.frame.DataFrame]:
+def memory_usage_mb() -> float:
+    #psutil is only imported when memory logging is enabled (--log-memory)
+    import psutil
+    process = psutil.Process()
+    return process.memory_info().rss / 1024 ** 2
+
+
+#number of rows read at a time when only the rows of some participants are kept
+ROW_FILTER_CHUNK_SIZE = 100000
+
+#Index of the datafiles (by project_pseudo_id):
+# 'sorted': monotonic index, lookups (unique or duplicated ids) are binary searches returning slices, and
+#           the rows of consecutive ids are contiguous (batch access in id order)
+# 'hash':   the index is left in file order, lookups use the hash table of the index. Only efficient when
+#           ids are unique on every datafile: with duplicated (multi-variant) ids on an unsorted index,
+#           each lookup scans the whole index
+INDEX_STRATEGIES = ['sorted','hash']
+
+#CSV readers: 'arrow' (multithreaded pyarrow.csv reader), 'pandas' (pandas C reader), or 'auto' (arrow when pyarrow is installed)
+CSV_ENGINES = ['auto','arrow','pandas']
+
+
+def read_parquet_datafile(file:str,columns:Set[str],participant_ids:Optional[Set[str]]=None) -> pd.core.frame.DataFrame:
+    """
+    Typed datafile (e.g., the compact RS dataset written by rs_fl_variables_csv_gen.py --format parquet).
+    Values keep their types (dates, booleans, integers, floats) and are formatted by cdf_value on generation.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    filters = [('project_pseudo_id','in',list(participant_ids))] if participant_ids is not None else None
+    table = pq.read_table(file,columns=list(columns),filters=filters)
+    #integer columns with missing values stay integers (Int64) instead of becoming floats, so they are
+    #written as on the CSV files (120, not 120.0)
+    data_frame = table.to_pandas(types_mapper=lambda arrow_type: pd.Int64Dtype() if pa.types.is_integer(arrow_type) else None)
+    data_frame['project_pseudo_id'] = data_frame['project_pseudo_id'].astype(str)
+    return data_frame
+
+
+def read_arrow_csv_datafile(file:str,columns:Set[str],participant_ids:Optional[Set[str]]=None) -> pd.core.frame.DataFrame:
+    """
+    Read the given columns of a CSV file with the (multithreaded) pyarrow CSV reader. As with the
+    pandas reader, all the values are read as strings and empty values are kept as empty strings.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+
+    convert_options = pa_csv.ConvertOptions(include_columns=sorted(columns),
+                                            column_types={column:pa.string() for column in columns},
+                                            strings_can_be_null=False,null_values=[])
+    table = pa_csv.read_csv(file,convert_options=convert_options)
+    if participant_ids is not None:
+        table = table.filter(pc.is_in(table['project_pseudo_id'],value_set=pa.array(list(participant_ids),type=pa.string())))
+    return table.to_pandas()
+
+
+def resolve_csv_engine(csv_engine:str) -> str:
+    if csv_engine not in CSV_ENGINES:
+        raise ValueError(f"Unknown CSV engine '{csv_engine}'. Available: {CSV_ENGINES}")
+    if csv_engine == 'auto':
+        return 'arrow' if importlib.util.find_spec('pyarrow') is not None else 'pandas'
+    return csv_engine
+
+
+def read_csv_datafile(file:str,columns:Set[str],participant_ids:Optional[Set[str]]=None,csv_engine:str='auto') -> pd.core.frame.DataFrame:
+    if file.endswith('.parquet'):
+        return read_parquet_datafile(file,columns,participant_ids)
+
+    if resolve_csv_engine(csv_engine) == 'arrow':
+        return read_arrow_csv_datafile(file,columns,participant_ids)
+
+    if participant_ids is None:
+        return pd.read_csv(file,na_filter=False,dtype=str,usecols=columns)
+
+    #read the file in chunks, keeping only the rows of the given participants, so the memory used
+    #depends on the number of selected participants rather than on the size of the file
+    chunks = [chunk[chunk['project_pseudo_id'].isin(participant_ids)]
+              for chunk in pd.read_csv(file,na_filter=False,dtype=str,usecols=columns,chunksize=ROW_FILTER_CHUNK_SIZE)]
+    return pd.concat(chunks) if chunks else pd.DataFrame(columns=list(columns),dtype=str)
+
+
+def index_datafile(data_frame:pd.core.frame.DataFrame,index_strategy:str='sorted') -> pd.core.frame.DataFrame:
+    """
+    Index (in place) a datafile by project_pseudo_id, using one of the INDEX_STRATEGIES. The sort is
+    stable, so the rows of a participant keep their order on the file.
+    """
+    if index_strategy not in INDEX_STRATEGIES:
+        raise ValueError(f"Unknown index strategy '{index_strategy}'. Available: {INDEX_STRATEGIES}")
+    data_frame.set_index('project_pseudo_id',inplace=True)
+    if index_strategy == 'sorted' and not data_frame.index.is_monotonic_increasing:
+        data_frame.sort_index(inplace=True,kind='stable')
+    return data_frame
+
+
+def load_and_index_csv_datafiles(config_file_path:str,log_memory:bool=False,participant_ids:Optional[Set[str]]=None,
+                                 load_threads:Optional[int]=None,csv_engine:str='auto',index_strategy:str='sorted',
+                                 config:Optional[dict]=None) -> Dict[str,pd.core.frame.DataFrame]:
+    """
+    Load and index (by project_pseudo_id) the columns of the CSV files required by the configuration
+    (config, e.g. a part of it selected with select_config, or the one on config_file_path by default).
+    When participant_ids is given, only the rows of those participants are loaded.
+    The files are read concurrently by load_threads threads (default: one per file, up to the number
+    of CPUs), using the reader given by csv_engine (see CSV_ENGINES), and indexed as given by
+    index_strategy (see INDEX_STRATEGIES).
+    """
 
     data_frames:Dict[str,pd.core.frame.DataFrame] = {}
 
-    #load transformation configuration file
-    f = open(config_file_path)
-    data = json.load(f)
-    assessment_variables = data.keys();
-
-    #default set of columns that must be loaded (regardless the configuration)
-    default_columns:Set[str] = {'project_pseudo_id'}
-
-    #key: 'file name', value: list of variables to be read in such a file
-    required_csv_columns:Dict[str,set] = {}
+    #key: 'file name', value: columns (project_pseudo_id and variables) to be read in such a file
+    required_csv_columns:Dict[str,Set[str]] = datafile_columns(config if config is not None else load_config(config_file_path))
 
-    datafiles:Set[str] = set()
+    datafiles:List[str] = list(required_csv_columns.keys())
 
+    csv_engine = resolve_csv_engine(csv_engine)
+    if index_strategy not in INDEX_STRATEGIES:
+        raise ValueError(f"Unknown index strategy '{index_strategy}'. Available: {INDEX_STRATEGIES}")
+    if load_threads is None:
+        load_threads = min(len(datafiles),os.cpu_count() or 1)
 
-    #get the CSV files that are needed for the transformation
-    for assessment_variable in assessment_variables:
-        var_assessment_files = data[assessment_variable]
-
-        #get the files, and their respective columns that need to be read
-        for varversion in var_assessment_files:
-            filename:str = list(varversion.values())[0]     
-            
-            datafiles.add(filename)
-
-            if not filename in required_csv_columns:
-                required_csv_columns[filename]=default_columns.copy()
-
-            required_csv_columns[filename].add(assessment_variable)
+    def read_datafile(file:str):
+        #load only the needed columns
+        logging.info(f"Loading {file} ({csv_engine} reader). Columns:{required_csv_columns[file]}")
+        read_start = time.perf_counter()
+        data_frame = read_csv_datafile(file,required_csv_columns[file],participant_ids,csv_engine)
+        read_seconds = time.perf_counter() - read_start
+        file_mb = os.path.getsize(file) / 1024 ** 2
+        logging.info(f"{file} read in {read_seconds:.2f} sec ({file_mb:.1f} MB, {file_mb/max(read_seconds,1e-9):.1f} MB/s)")
+        return data_frame
+
+    #read the files concurrently (the readers release the GIL while parsing). pandas and numpy are lazy
+    #modules, which are not thread-safe on their first use (Python < 3.12): they are imported here first
+    resolve(np)
+    resolve(pd)
+    load_start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(load_threads,1)) as executor:
+        read_data_frames = dict(zip(datafiles,executor.map(read_datafile,datafiles)))
+    load_seconds = time.perf_counter() - load_start
+    total_mb = sum(os.path.getsize(file) for file in datafiles) / 1024 ** 2
+    logging.info(f"{len(datafiles)} files read in {load_seconds:.2f} sec with {load_threads} threads ({total_mb:.1f} MB, {total_mb/max(load_seconds,1e-9):.1f} MB/s)")
 
     #create an indexed dataframe for each datafile
     for file in datafiles:
-        
-        #load only the needed columns
-        logging.info(f"Loading and indexing {file}. Columns:{required_csv_columns[file]}")        
-        data_frames[file] = pd.read_csv(file,na_filter=False,dtype=str,usecols=required_csv_columns[file]);  
+        data_frames[file] = read_data_frames.pop(file)
         logging.info(str(data_frames[file]))      
-        data_frames[file].set_index('project_pseudo_id',inplace=True)
-        data_frames[file] = data_frames[file].sort_values(by='project_pseudo_id')
-        process = psutil.Process()
-        memory_usage = process.memory_info().rss / 1024 ** 2
-
-        logging.info(f"{file} loaded and indexed. Total memory usage: {memory_usage} MB")
+        index_datafile(data_frames[file],index_strategy)
+        if log_memory:
+            logging.info(f"{file} loaded and indexed. Total memory usage: {memory_usage_mb()} MB")
+        else:
+            logging.info(f"{file} loaded and indexed.")
 
     
     return data_frames
@@ -88,8 +218,31 @@ def load_and_index_csv_datafiles(config_file_path:str) -> Dict[str,pd.core.frame
 
 
 
-def get_single_non_empty_value(series:pd.core.series.Series)->str:
-    variant_values = series.values.tolist()    
+def cdf_value(value)->str:
+    """
+    String CDF value of a value read from a typed datafile: dates as DD-MM-YYYY, booleans as True/False,
+    floats as DataFrame.to_csv writes them (3.0, 1.25) and missing values (None, NA, NaT, NaN) as empty
+    strings.
+    """
+    if isinstance(value,str):
+        return value
+    if pd.isna(value):
+        return ''
+    if isinstance(value,(bool,np.bool_)):
+        return 'True' if value else 'False'
+    if isinstance(value,datetime.date):
+        return value.strftime('%d-%m-%Y')
+    if isinstance(value,float):
+        return repr(float(value))
+    return str(value)
+
+
+#variables that are on all datafiles (the same on all the variants of a questionnaire)
+DEFAULT_VARIABLES = ["project_pseudo_id","variant_id","date","age","gender","zip_code"]
+
+
+def get_single_non_empty_value(values:List)->str:
+    variant_values = [cdf_value(value) for value in values]
 
     non_empty_values:List = list(filter(lambda element: len(element)>0,variant_values));
     
@@ -99,75 +252,93 @@ def get_single_non_empty_value(series:pd.core.series.Series)->str:
         return non_empty_values[0];
     else:
         raise MoreThanOneValueInAssessmentVariants(f'Two or more values found on an assessment variant:{non_empty_values}');
-    
 
 
-def generate_csd(participant_id:str,config:dict,data_frames:Dict[str,pd.core.frame.DataFrame])->dict:
-    assessment_variables = config.keys()
-    
-    #variables that are on all datafiles
-    default_vars = ["project_pseudo_id","variant_id","date","age","gender","zip_code"]
+def assessment_value(variable:str,values:List)->str:
+    """
+    CDF value of a variable given its values on the rows of a participant in a datafile. These rules are
+    shared by all the backends (the duckdb one compiles them into SQL, see duckdb_backend.value_expression):
+    - a single row: the value, or "" when it is empty or a missing-data code ($X)
+    - several rows (questionnaire variants): the value of the first row for the default variables, and
+      otherwise the only non-empty value ("" if none). Several non-empty values raise
+      MoreThanOneValueInAssessmentVariants.
+    """
+    if len(values) == 1:
+        value = cdf_value(values[0])
+        #Missing values (with $X code) will be returned as empty strings (convention on the tools that will use the CDF format)
+        return value if value != '' and value[0] != '$' else ''
+    #the default variables are always duplicated across multiple variants, the first value is returned.
+    if variable in DEFAULT_VARIABLES:
+        return cdf_value(values[0])
+    return get_single_non_empty_value(values)
+
+
+def empty_record(participant_id:str,config:dict)->dict:
+    """
+    Record of a participant without values: its project_pseudo_id, and every assessment of the variables
+    of the configuration reported as missing (""), in the order of the configuration. The backends fill in
+    the values found on the datafiles.
+    """
+    record = {"project_pseudo_id":{PSEUDO_ID_ASSESSMENT:participant_id}}
+    for assessment_variable, var_assessment_files in config.items():
+        if assessment_variable == "project_pseudo_id":
+            # Already set it at the top; don’t overwrite it
+            continue
+        record[assessment_variable] = {list(varversion.keys())[0]: "" for varversion in var_assessment_files}
+    return record
 
 
-    # output = {"project_pseudo_id":{"1a":participant_id}}
-    output = {"project_pseudo_id":{"a1":participant_id}}
-    
-    for assessment_variable in assessment_variables:
+def generate_csd(participant_id:str,config:dict,data_frames:Dict[str,pd.core.frame.DataFrame],present_files:Optional[AbstractSet[str]]=None,
+                 abort_on_conflict:bool=True)->dict:
+    """
+    Generate the CDF record of a participant. present_files, when given, are the datafiles known (from
+    the pre-join, see prejoin.py) to have rows for the participant; the others are not looked up.
+    When a variable has more than one non-empty value on the variants of an assessment, the process is
+    aborted, or, with abort_on_conflict=False (long-running processes, e.g., server.py), a
+    MoreThanOneValueInAssessmentVariants is raised.
+    """
+    output = empty_record(participant_id,config)
+
+    for assessment_variable, var_assessment_files in config.items():
 
         if assessment_variable == "project_pseudo_id":
-            # Already set it at the top; don’t overwrite it
             continue
 
-
-        var_assessments = {}
-        var_assessment_files = config[assessment_variable]
+        var_assessments = output[assessment_variable]
 
         for varversion in var_assessment_files:
             assessment_name = list(varversion.keys())[0]
             assessment_file = list(varversion.values())[0]                 
-            # Return each value encapsulated in quotes
 
-            try:
+            #no row for the participant in the datafile (known beforehand): reported as missing
+            if present_files is not None and assessment_file not in present_files:
+                var_assessments[assessment_name] = ""
+                continue
 
-                
+            try:
                 var_value = load_val(data_frames,assessment_file,assessment_variable,participant_id)
 
-                
-                if isinstance(var_value,str):
-
-                    var_str_value = str(var_value);
-                    #Missing values (with $X code) will be returned as empty strings (convention on the tools that will use the CDF format)
-                    if var_str_value!='' and var_str_value[0]!='$':
-                        var_assessments[assessment_name] = var_str_value;
-                    else:
-                        var_assessments[assessment_name] = "";                        
-
                 # when the datafile has multiple rows with the same pseudo-id (due to having multiple variants of the questionnaire),
-                # rather than an string, pandas returns an Series object, with one row for each value.
-                # It is expected that only one non-empty element is in the series, except for the default variables.
-                elif isinstance(var_value,pd.core.series.Series):
+                # rather than an single value, pandas returns an Series object, with one row for each value.
+                if isinstance(var_value,pd.core.series.Series):
                     logging.debug(f'Processing multiple rows for variable{assessment_variable} in file {assessment_file}')
                     try:
-                        #the default variables are always duplicated across multiple variants, the first value is returned.
-                        if assessment_variable in default_vars:                            
-                            var_assessments[assessment_name] = var_value.values.tolist()[0];
-                        else:
-                            var_assessments[assessment_name] = get_single_non_empty_value(var_value)
+                        var_assessments[assessment_name] = assessment_value(assessment_variable,var_value.values.tolist())
                     except MoreThanOneValueInAssessmentVariants as e:                    
-                        logging.error(f"Variable {assessment_variable} has multiple non-empty values for the pseudo_id '{var_value.index.tolist()[0]}' in the file {assessment_file}. Aborting.")
+                        message = f"Variable {assessment_variable} has multiple non-empty values for the pseudo_id '{var_value.index.tolist()[0]}' in the file {assessment_file}"
+                        if not abort_on_conflict:
+                            raise MoreThanOneValueInAssessmentVariants(f"{message}: {e.message}")
+                        logging.error(f"{message}. Aborting.")
                         os.abort()
                 else:
-                    logging.error(f"Unsupported type:{type(var_value)} found while processing variable {assessment_variable} in the file {assessment_file}. Aborting");
-                    os.abort()
+                    #(typed datafiles, e.g., parquet: the value is converted to its CDF string here)
+                    var_assessments[assessment_name] = assessment_value(assessment_variable,[var_value])
 
-                
             except MissingParticipantRowException as mr:
                 #for consistency, the value of a variable a given patient assessment is reported as missing ("") when
                 #there is no row for the participant in the datafile
                 var_assessments[assessment_name] = ""
                 logging.debug(f'Missing row: missing row for participant [{participant_id}] in file [{assessment_file}]  when looking for of variable {assessment_variable} (reported as missing data)')
-                        
-        output[assessment_variable]=var_assessments
 
     return output    
 
@@ -179,8 +350,17 @@ def load_ids(ids_file)->List[str]:
         reader = csv.reader(f)
         next(reader) # skip header
         content_list = [row[0] for row in reader]
-    
-    return content_list
+
+    #duplicated ids would overwrite each other's output: only the first occurrence is kept
+    unique_ids = list(dict.fromkeys(content_list))
+    if len(unique_ids) < len(content_list):
+        logging.warning(f"{len(content_list)-len(unique_ids)} duplicated IDs ignored in {ids_file}")
+
+    return unique_ids
+
+
+def comma_separated(value:str)->List[str]:
+    return [name.strip() for name in value.split(',') if name.strip()]
 
 
 def main():
@@ -191,10 +371,51 @@ def main():
     parser.add_argument('ids_file', help='Path to the CSV file with a list of IDs.')
     parser.add_argument('config_file', help='Path to the JSON configuration file.')
     parser.add_argument('output_folder', help='Path to the output folder.')
+    parser.add_argument('--format', dest='output_format', choices=['json','jsonl','parquet','sqlite'], default='json', help="Output format: one <id>.cdf.json file per participant ('json', default), bundles of participants in JSON-lines files ('jsonl'), a long table (project_pseudo_id, variable, assessment, value) on Parquet files partitioned by a hash of the participant id ('parquet', requires pyarrow), or a single SQLite file indexed by participant id ('sqlite', see cdfstore.CDFStore).")
+    parser.add_argument('--bundle-size', type=int, default=DEFAULT_BUNDLE_SIZE, help=f'Number of participants per bundle file when using --format jsonl (default {DEFAULT_BUNDLE_SIZE}).')
+    parser.add_argument('--parquet-partitions', type=int, default=DEFAULT_PARQUET_PARTITIONS, help=f'Number of hash partitions of the participants when using --format parquet (default {DEFAULT_PARQUET_PARTITIONS}).')
+    parser.add_argument('--parquet-row-group-size', type=int, default=DEFAULT_PARQUET_ROW_GROUP_SIZE, help=f'Rows per row group when using --format parquet (default {DEFAULT_PARQUET_ROW_GROUP_SIZE}).')
+    parser.add_argument('--store-batch-size', type=int, default=DEFAULT_STORE_BATCH_SIZE, help=f'Records inserted per transaction when using --format sqlite (default {DEFAULT_STORE_BATCH_SIZE}).')
+    parser.add_argument('--sparse', action='store_true', help="Leave the missing values (\"\") out of the records of the 'jsonl' output, writing the schema of the records once per bundle instead. Use sparse.iter_dense_bundle to read them back as dense records.")
+    parser.add_argument('--compression', choices=list(CODECS.keys()), default='none', help="Compression of the 'json' and 'jsonl' outputs (default none). 'zlib' and 'zstd' (requires zstandard) use a preset dictionary built from the configuration, saved with the run metadata; use compression.read_cdf_file/iter_cdf_bundle to read the files.")
+    parser.add_argument('--writer-threads', type=int, default=1, help='Number of threads writing the output while the records are generated (default 1). 0 writes each record synchronously.')
+    parser.add_argument('--write-queue-size', type=int, default=DEFAULT_WRITE_QUEUE_SIZE, help=f'Maximum number of generated records waiting to be written (default {DEFAULT_WRITE_QUEUE_SIZE}).')
+    parser.add_argument('--load-threads', type=int, default=None, help='Number of CSV files read concurrently (default: one thread per file, up to the number of CPUs).')
+    parser.add_argument('--csv-engine', choices=CSV_ENGINES, default='auto', help="CSV reader: 'arrow' (multithreaded, requires pyarrow), 'pandas', or 'auto' (default, arrow when pyarrow is installed).")
+    parser.add_argument('--index', dest='index_strategy', choices=INDEX_STRATEGIES, default='sorted', help="Index of the datafiles: 'sorted' (default, binary-search lookups, supports duplicated ids) or 'hash' (no sort, hash lookups; use it only when the ids are unique on every datafile).")
+    parser.add_argument('--backend', choices=['pandas','duckdb','streaming','outofcore'], default='pandas', help="Execution backend: 'pandas' (default, the datafiles are loaded as indexed data frames, or a --mmap-store), 'duckdb' (the configuration is run as a single SQL query on an embedded DuckDB database, which can spill to disk; requires duckdb, CSV datafiles only), 'streaming' (merge join of CSV datafiles sorted by project_pseudo_id, read row by row without loading them; the records are generated in id order, see streaming.py) or 'outofcore' (the datafiles are loaded one at a time, and their values spilled to disk and merged, so the memory used is bounded by the largest datafile; the records are generated in id order, see outofcore.py).")
+    parser.add_argument('--spill-directory', default=None, help="Folder where the outofcore backend writes its temporary fragments files (default: the system's temporary folder, e.g. $TMPDIR).")
+    parser.add_argument('--duckdb-memory-limit', default=None, help="Memory limit of the duckdb backend, e.g. '8GB' (default: DuckDB's default, 80%% of the RAM).")
+    parser.add_argument('--duckdb-threads', type=int, default=None, help='Threads used by the duckdb backend (default: all the CPUs).')
+    parser.add_argument('--duckdb-temp-directory', default=None, help='Folder where the duckdb backend spills data that does not fit in memory.')
+    parser.add_argument('--mmap-store', default=None, help='Folder of a memory-mapped store of the datafiles (see mmapstore.py), used instead of loading them. It is built (from the complete datafiles) when it does not exist or a datafile changed.')
+    parser.add_argument('--variables', type=comma_separated, default=None, help='Comma-separated variables to generate (default: all the variables of the configuration). The datafiles not needed for them are not read.')
+    parser.add_argument('--assessments', type=comma_separated, default=None, help='Comma-separated assessments (e.g. 1a,2a) to generate (default: all of them).')
+    parser.add_argument('--merge-existing', action='store_true', help="Merge the generated variables/assessments into the records already on the output folder (formats 'json' and 'sqlite'), instead of replacing them. Use it with --variables/--assessments to update a part of a previous output.")
+    parser.add_argument('--record-hashes', action='store_true', help='Besides the run fingerprint (see fingerprint.py), write the hash of every record, to find the differing participants when comparing two runs.')
+    parser.add_argument('--validate', action='store_true', help='Validate every generated record against the schema of the configuration (see validation.py), writing a report of the violations with the run metadata.')
+    parser.add_argument('--log-memory', action='store_true', help='Log the memory usage of the process while the CSV files are loaded (requires psutil).')
+    parser.add_argument('--shard', type=parse_shard, default=None, help="Process only the shard i/N (zero-based) of the participants, partitioned by a hash of their ids. By default it is taken from SLURM_ARRAY_TASK_ID/SLURM_ARRAY_TASK_COUNT when running as a SLURM array job (see --no-auto-shard).")
+    parser.add_argument('--no-auto-shard', action='store_true', help='Do not take the shard from the SLURM array variables: every task of an array job processes all the participants of its ids file (the behaviour of earlier versions, e.g., for array jobs that already split the ids into one file per task).')
+    sample_group = parser.add_mutually_exclusive_group()
+    sample_group.add_argument('--sample', type=float, default=None, help='Smoke run: process only a fraction (0-1] of the participants, selected by a hash of their ids (see --sample-seed). Only their rows are loaded, and the output is written on the sub-folder samples/sample-<fraction>-seed-<seed> of the output folder.')
+    sample_group.add_argument('--sample-n', type=int, default=None, help='Smoke run: process only (at most) this number of participants, those with the lowest hashes of their ids (see --sample).')
+    parser.add_argument('--sample-seed', type=int, default=0, help='Seed of the hash used by --sample/--sample-n (default 0). The same seed always selects the same participants.')
+    parser.add_argument('--coverage-report', default=None, help='Path of a CSV file where to write the coverage matrix (participants x datafiles, 1 when the participant has rows on the file).')
+    parser.add_argument('--serializer', choices=['auto'] + list(SERIALIZERS.keys()), default='auto', help="JSON encoder. 'auto' (default) uses orjson for the compact encoding when installed, and the standard json module otherwise. The output is the same with all of them.")
+    parser.add_argument('--compact-json', action='store_true', help='Write the records without whitespace and with UTF-8 characters unescaped (smaller, faster with orjson). By default the records are written as json.dump does, byte for byte the same as earlier versions of the generator.')
 
     # Parse the command-line arguments
     args = parser.parse_args()
 
+    #options that the output format does not support are rejected before anything is loaded
+    if args.sparse and args.output_format != 'jsonl':
+        parser.error("--sparse is only supported by the 'jsonl' output format.")
+    if args.compression != 'none' and args.output_format not in ('json','jsonl'):
+        parser.error("--compression is only supported by the 'json' and 'jsonl' output formats.")
+    if args.merge_existing and args.output_format not in MERGEABLE_OUTPUT_FORMATS:
+        parser.error(f"--merge-existing is only supported by the {' and '.join(repr(f) for f in MERGEABLE_OUTPUT_FORMATS)} output formats.")
+
     if not os.path.isfile(args.ids_file):
         print(f"The specified file path '${args.ids_file}' does not exist.")
         return
@@ -210,43 +431,214 @@ def main():
 
     #load rows identifiers and transformation configuration settings
     
+    try:
+        shard:Optional[Shard] = args.shard or (None if args.no_auto_shard else shard_from_environment())
+    except ValueError as e:
+        parser.error(str(e))
+
     load_start_time = time.time()
     ids = load_ids(args.ids_file)
-    data_frames = load_and_index_csv_datafiles(args.config_file)
+    sampled = args.sample is not None or args.sample_n is not None
+    if sampled:
+        ids = sample_ids(ids,args.sample,args.sample_n,args.sample_seed)
+        #a separate output tree, so a smoke run never mixes with (or overwrites) a complete output
+        args.output_folder = os.path.join(args.output_folder,'samples',sample_name(args.sample,args.sample_n,args.sample_seed))
+        os.makedirs(args.output_folder,exist_ok=True)
+        logging.info(f"Processing a sample of {len(ids)} participants, written to {args.output_folder}")
+    if shard is not None:
+        ids = select_shard_ids(ids,shard)
+        logging.info(f"Processing shard {shard}: {len(ids)} participants")
+    full_config = load_config(args.config_file)
+    config_params = full_config
+    if args.variables is not None or args.assessments is not None:
+        #projection: the datafiles that only provide other variables/assessments are not read at all
+        config_params = select_config(full_config,args.variables,args.assessments)
+        logging.info(f"Generating {sum(len(files) for files in config_params.values())} of {sum(len(files) for files in full_config.values())} variable assessments, from {len(datafile_columns(config_params))} of {len(datafile_columns(full_config))} datafiles")
+    backend = None
+    if args.backend == 'duckdb':
+        backend = DuckDBBackend(config_params,memory_limit=args.duckdb_memory_limit,threads=args.duckdb_threads,temp_directory=args.duckdb_temp_directory)
+        data_frames = {}
+    elif args.backend == 'streaming':
+        #nothing to load: the datafiles are read while the records are generated
+        data_frames = {}
+    elif args.backend == 'outofcore':
+        #the datafiles are loaded one at a time while the records are generated
+        def load_datafile(file,columns,participant_ids):
+            return index_datafile(read_csv_datafile(file,columns,participant_ids,args.csv_engine),args.index_strategy)
+        backend = OutOfCoreBackend(config_params,load_datafile,spill_directory=args.spill_directory,log_memory=args.log_memory)
+        data_frames = {}
+    elif args.mmap_store:
+        data_frames = open_or_build_store(args.mmap_store,args.config_file,
+                                          lambda: load_and_index_csv_datafiles(args.config_file,log_memory=args.log_memory,load_threads=args.load_threads,csv_engine=args.csv_engine,index_strategy=args.index_strategy,config=config_params),
+                                          cdf_value,config=config_params)
+    elif shard is not None or sampled:
+        #only the rows of the participants of the shard/sample are kept
+        data_frames = load_and_index_csv_datafiles(args.config_file,log_memory=args.log_memory,participant_ids=set(ids),load_threads=args.load_threads,csv_engine=args.csv_engine,index_strategy=args.index_strategy,config=config_params)
+    else:
+        data_frames = load_and_index_csv_datafiles(args.config_file,log_memory=args.log_memory,load_threads=args.load_threads,csv_engine=args.csv_engine,index_strategy=args.index_strategy,config=config_params)
     load_end_time = time.time()
 
-    logging.info(f"{len(data_frames)} CSV files loaded and indexed in {load_end_time - load_start_time} seconds.")
-
-    process = psutil.Process()
-    memory_usage = process.memory_info().rss / 1024 ** 2
-
-    logging.info(f"Total memory usage: {memory_usage} MB")
-
-
-    config_file = open(args.config_file)
-    config_params = json.load(config_file)
+    if args.backend == 'duckdb':
+        logging.info(f"{len(backend.files)} CSV files loaded into DuckDB in {load_end_time - load_start_time} seconds.")
+    elif args.backend == 'pandas':
+        logging.info(f"{len(data_frames)} CSV files loaded and indexed in {load_end_time - load_start_time} seconds.")
+
+    if args.log_memory:
+        logging.info(f"Total memory usage: {memory_usage_mb()} MB")
+
+    #pre-join the ids with the datafiles, so that missing participants are not looked up one by one
+    #(the duckdb and streaming backends join them while generating the records)
+    presence = None
+    qa = QASummary(config_schema(config_params))
+    if args.backend == 'pandas':
+        presence = ParticipantPresence(ids,data_frames)
+        qa.add_presence(presence)
+        qa.add_missing_codes(data_frames,ids)
+        coverage = presence.summary()
+        for file, file_coverage in coverage['files'].items():
+            logging.info(f"{file}: {file_coverage['present']} of {coverage['participants']} participants present, {file_coverage['absent']} absent")
+        if coverage['participants_in_no_file'] > 0:
+            logging.warning(f"{coverage['participants_in_no_file']} participants are not present in any datafile")
+        write_metadata(args.output_folder,'coverage',coverage,shard)
+        if args.coverage_report:
+            presence.write_coverage_matrix(args.coverage_report)
+            logging.info(f"Coverage matrix written to {args.coverage_report}")
+    else:
+        qa.set_missing_codes_unavailable(datafile_columns(config_params),f'{args.backend} backend')
+        if args.coverage_report:
+            logging.warning(f"--coverage-report is not supported by the {args.backend} backend")
 
     progress_count = 0;
 
 
+    try:
+        serializer = get_serializer(args.serializer,args.compact_json)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+    logging.info(f"Writing '{args.output_format}' output using the '{serializer.name}' serializer ({'compact' if serializer.compact else 'standard'} encoding)")
+
+    format_options = {}
+    if args.output_format == 'parquet':
+        format_options = {'partitions':args.parquet_partitions,'row_group_size':args.parquet_row_group_size}
+        #generated in id order, so each row group of a partition covers its own range of ids
+        ids = sorted(ids)
+    elif args.output_format == 'sqlite':
+        format_options = {'batch_size':args.store_batch_size}
+
+    if args.sparse:
+        format_options = {'schema':config_schema(config_params)}
+
+    codec = None
+    if args.compression != 'none':
+        #built from the whole configuration, so it is the same when only a part of it is generated again
+        dictionary = build_preset_dictionary(full_config,serializer.compact)
+        write_preset_dictionary(args.output_folder,dictionary)
+        codec = get_codec(args.compression,dictionary)
+
+    shard_suffix = shard.suffix if shard is not None else None
+    base_writer = create_output_writer(args.output_format,args.output_folder,serializer,bundle_size=args.bundle_size,shard_suffix=shard_suffix,codec=codec,**format_options)
+    output_writer = base_writer
+    if args.merge_existing:
+        output_writer = MergingWriter(output_writer)
+    merging_writer = output_writer if args.merge_existing else None
+    if args.writer_threads > 0:
+        output_writer = WriteBehindWriter(output_writer,writer_threads=args.writer_threads,queue_size=args.write_queue_size)
+        output_stats = output_writer.stats
+    else:
+        output_stats = StageStats('output')
+    assembly_stats = StageStats('assembly')
+
+    #fingerprint of the generated records (not computed when they are merged into existing ones)
+    fingerprint = None
+    record_hashes_file = None
+    if not args.merge_existing:
+        if args.record_hashes:
+            os.makedirs(metadata_folder(args.output_folder),exist_ok=True)
+            record_hashes_name = f"{RECORD_HASHES_FILE}-{shard.suffix}.tsv" if shard is not None else f"{RECORD_HASHES_FILE}.tsv"
+            record_hashes_file = open(os.path.join(metadata_folder(args.output_folder),record_hashes_name),'w',encoding='utf-8')
+        fingerprint = RunFingerprint(record_hashes=record_hashes_file)
+    validator = RecordValidator(config_params) if args.validate else None
+
+    #(participant id, record) pairs, generated as they are consumed
+    if backend is not None:
+        records = backend.items(ids)
+    elif args.backend == 'streaming':
+        records = stream_records(config_params,ids)
+    else:
+        records = ((id,generate_csd(id,config_params,data_frames,presence.present_files(id))) for id in ids)
+
     process_start_time = time.time()
-    for id in ids:
+    with output_writer:
         try:
-            participant_data = generate_csd(id,config_params,data_frames)
-            output_file = os.path.join(args.output_folder,id+".cdf.json")        
-            with open(output_file, 'w') as json_file:
-                json.dump(participant_data, json_file)
-            progress_count += 1
-            if progress_count%100==0:
-                process_end_time = time.time()
-                logging.info(f'{progress_count} files processed. Elapsed time: {process_end_time - process_start_time} sec ({progress_count/(process_end_time - process_start_time)} rows/s)')
+            assembly_start = time.perf_counter()
+            for id, participant_data in records:
+                qa.add(participant_data)
+                if fingerprint is not None:
+                    fingerprint.add(id,participant_data)
+                if validator is not None:
+                    validator.validate(id,participant_data)
+                payload = output_writer.encode(id,participant_data)
+                write_start = time.perf_counter()
+                output_writer.write_encoded(id,payload)
+                write_end = time.perf_counter()
+
+                if args.writer_threads > 0:
+                    #time blocked on a full queue
+                    assembly_stats.add(1,payload_size(payload),write_start-assembly_start,write_end-write_start)
+                else:
+                    assembly_stats.add(1,payload_size(payload),write_start-assembly_start)
+                    output_stats.add(1,payload_size(payload),write_end-write_start)
+
+                progress_count += 1
+                if progress_count%100==0:
+                    process_end_time = time.time()
+                    logging.info(f'{progress_count} files processed. Elapsed time: {process_end_time - process_start_time} sec ({progress_count/(process_end_time - process_start_time)} rows/s)')
+                assembly_start = time.perf_counter()
         except Exception as e:
             traceback.print_exc()
             process_end_time = time.time()
             print(f"An error occurred after processing {progress_count} rows: {str(e)}. Time elapsed: {process_end_time - process_start_time} sec.")               
             sys.exit(1)     
 
+    logging.info(assembly_stats.summary())
+    logging.info(output_stats.summary())
+
     process_end_time = time.time()
+
+    manifest = {
+        'shard': shard._asdict() if shard is not None else None,
+        'sample': {'fraction':args.sample,'size':args.sample_n,'seed':args.sample_seed} if sampled else None,
+        'ids_file': os.path.abspath(args.ids_file),
+        'config_file': os.path.abspath(args.config_file),
+        'output_format': args.output_format,
+        'backend': args.backend,
+        'sparse': args.sparse,
+        'variables': args.variables,
+        'assessments': args.assessments,
+        'merged_into_existing': merging_writer.merged if merging_writer is not None else None,
+        'participants': progress_count,
+        'bundles': [os.path.relpath(path,args.output_folder) for path in getattr(base_writer,'bundle_paths',[])],
+        'metrics': {
+            'load_seconds': load_end_time - load_start_time,
+            'generation_seconds': process_end_time - process_start_time,
+            'assembly': assembly_stats.to_dict(),
+            'output': output_stats.to_dict(),
+        },
+    }
+    write_metadata(args.output_folder,'manifest',manifest,shard)
+    write_metadata(args.output_folder,'qa',qa.to_dict(),shard)
+    if fingerprint is not None:
+        if record_hashes_file is not None:
+            record_hashes_file.close()
+        run_fingerprint = fingerprint.to_dict()
+        write_metadata(args.output_folder,'fingerprint',run_fingerprint,shard)
+        logging.info(f"Run fingerprint: {run_fingerprint['root']} ({run_fingerprint['records']} records)")
+    if validator is not None:
+        write_metadata(args.output_folder,'validation',validator.report.to_dict(),shard)
+        log = logging.info if validator.report.invalid_records == 0 else logging.error
+        log(f"Validation: {validator.report.summary()}")
+
     print(f"{progress_count} files created on {args.output_folder} in {process_end_time - process_start_time} sec.")   
 
 if __name__ == '__main__':
@@ -0,0 +1,124 @@
+import json
+import sqlite3
+from typing import Iterator, List, Optional, Tuple
+from .output_writers import OutputWriter
+from .serializers import Serializer, get_serializer
+
+
+#Default number of records inserted per transaction
+DEFAULT_STORE_BATCH_SIZE = 5000
+
+#Records are kept on a table clustered by participant id (WITHOUT ROWID), so the B-tree of the primary
+#key is the table itself: look-ups are O(log n) and iterating it returns the records in id order.
+CREATE_TABLE = 'CREATE TABLE IF NOT EXISTS cdf (project_pseudo_id TEXT PRIMARY KEY, record BLOB NOT NULL) WITHOUT ROWID'
+
+
+class SQLiteStoreWriter(OutputWriter):
+    """
+    Writes the CDF records (serialized as JSON) on a single SQLite file, inserting them in batches of
+    batch_size records per transaction. Records of participants already on the store are replaced.
+    """
+
+    readable = True
+
+    def __init__(self, path:str, serializer:Optional[Serializer]=None, batch_size:int=DEFAULT_STORE_BATCH_SIZE):
+        self.path = path
+        self.bundle_paths = [path]
+        self.serializer = serializer or get_serializer()
+        self.batch_size = batch_size
+        self._batch:List[Tuple[str,bytes]] = []
+        #the connection is used by the write-behind thread, but never by two threads at the same time
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute(CREATE_TABLE)
+        self._connection.commit()
+        #records already on the store are read (see read()) with their own connection
+        self._read_connection:Optional[sqlite3.Connection] = None
+
+    def encode(self, participant_id:str, record:dict) -> bytes:
+        return self.serializer.dumps(record)
+
+    def read(self, participant_id:str) -> Optional[dict]:
+        if self._read_connection is None:
+            self._read_connection = sqlite3.connect(self.path)
+        row = self._read_connection.execute('SELECT record FROM cdf WHERE project_pseudo_id = ?', (participant_id,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def write_encoded(self, participant_id:str, payload:bytes) -> None:
+        self._batch.append((participant_id, payload))
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._batch:
+            with self._connection:
+                self._connection.executemany('INSERT OR REPLACE INTO cdf (project_pseudo_id, record) VALUES (?, ?)', self._batch)
+            self._batch = []
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self.flush()
+            self._connection.close()
+            self._connection = None
+        if self._read_connection is not None:
+            self._read_connection.close()
+            self._read_connection = None
+
+
+class CDFStore:
+    """
+    Read access to a store written with --format sqlite:
+
+        with CDFStore('output/cdf.sqlite') as store:
+            record = store.get('participant-id')
+            for participant_id, record in store:
+                ...
+    """
+
+    def __init__(self, path:str):
+        self.path = path
+        self._connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+
+    def get(self, participant_id:str) -> Optional[dict]:
+        row = self._connection.execute('SELECT record FROM cdf WHERE project_pseudo_id = ?', (participant_id,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def __getitem__(self, participant_id:str) -> dict:
+        record = self.get(participant_id)
+        if record is None:
+            raise KeyError(participant_id)
+        return record
+
+    def __contains__(self, participant_id:str) -> bool:
+        return self._connection.execute('SELECT 1 FROM cdf WHERE project_pseudo_id = ?', (participant_id,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        return self._connection.execute('SELECT COUNT(*) FROM cdf').fetchone()[0]
+
+    def ids(self, start:Optional[str]=None) -> Iterator[str]:
+        """Participant ids in order, optionally starting at (or after) the given id."""
+        for (participant_id,) in self._select('project_pseudo_id', start):
+            yield participant_id
+
+    def __iter__(self) -> Iterator[Tuple[str,dict]]:
+        return self.items()
+
+    def items(self, start:Optional[str]=None) -> Iterator[Tuple[str,dict]]:
+        """(participant id, record) pairs in id order. Records are read as they are iterated."""
+        for participant_id, record in self._select('project_pseudo_id, record', start):
+            yield participant_id, json.loads(record)
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def _select(self, columns:str, start:Optional[str]):
+        if start is None:
+            return self._connection.execute(f'SELECT {columns} FROM cdf ORDER BY project_pseudo_id')
+        return self._connection.execute(f'SELECT {columns} FROM cdf WHERE project_pseudo_id >= ? ORDER BY project_pseudo_id', (start,))
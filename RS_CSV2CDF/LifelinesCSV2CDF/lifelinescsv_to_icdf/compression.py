@@ -0,0 +1,230 @@
+import gzip
+import io
+import json
+import os
+import zlib
+from typing import BinaryIO, Dict, Iterator, Optional
+from .cdfconfig import config_schema
+from .manifest import metadata_folder
+from .serializers import get_serializer
+
+
+#Compressed outputs. Per-participant files are compressed one by one; bundles are compressed as a
+#stream. The zlib and zstd codecs use a preset dictionary built from the configuration (see
+#build_preset_dictionary): every record repeats the same variable and assessment names, so with the
+#dictionary even a small per-participant record compresses well. The dictionary is saved with the run
+#metadata, where the readers below find it.
+
+DICTIONARY_FILE = 'compression-dictionary.bin'
+
+#chunk size used when reading compressed streams
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def build_preset_dictionary(config:dict, compact:bool=False) -> bytes:
+    """
+    Raw-content dictionary: the serialized 'skeleton' of the records of the configuration (every
+    variable and assessment, with empty values), in the encoding of the records.
+    """
+    skeleton = {variable: {assessment: '' for assessment in assessments} for variable, assessments in config_schema(config).items()}
+    return get_serializer('json', compact).dumps(skeleton)
+
+
+class Codec:
+    name = 'none'
+    extension = ''
+
+    def compress(self, data:bytes) -> bytes:
+        return data
+
+    def decompress(self, data:bytes) -> bytes:
+        return data
+
+    def open_writer(self, fileobj:BinaryIO) -> BinaryIO:
+        return fileobj
+
+    def open_reader(self, fileobj:BinaryIO) -> BinaryIO:
+        return fileobj
+
+
+class GzipCodec(Codec):
+    """gzip (the format does not support preset dictionaries). mtime=0 keeps the output reproducible."""
+    name = 'gzip'
+    extension = '.gz'
+
+    def __init__(self, dictionary:Optional[bytes]=None, level:int=6):
+        self.level = level
+
+    def compress(self, data:bytes) -> bytes:
+        return gzip.compress(data, compresslevel=self.level, mtime=0)
+
+    def decompress(self, data:bytes) -> bytes:
+        return gzip.decompress(data)
+
+    def open_writer(self, fileobj:BinaryIO) -> BinaryIO:
+        return gzip.GzipFile(fileobj=fileobj, mode='wb', compresslevel=self.level, mtime=0)
+
+    def open_reader(self, fileobj:BinaryIO) -> BinaryIO:
+        return gzip.GzipFile(fileobj=fileobj, mode='rb')
+
+
+class ZlibCodec(Codec):
+    """zlib stream (deflate) with a preset dictionary."""
+    name = 'zlib'
+    extension = '.zz'
+
+    def __init__(self, dictionary:Optional[bytes]=None, level:int=6):
+        self.dictionary = dictionary
+        self.level = level
+
+    def _compressobj(self):
+        if self.dictionary:
+            return zlib.compressobj(self.level, zdict=self.dictionary)
+        return zlib.compressobj(self.level)
+
+    def _decompressobj(self):
+        if self.dictionary:
+            return zlib.decompressobj(zdict=self.dictionary)
+        return zlib.decompressobj()
+
+    def compress(self, data:bytes) -> bytes:
+        compressor = self._compressobj()
+        return compressor.compress(data) + compressor.flush()
+
+    def decompress(self, data:bytes) -> bytes:
+        decompressor = self._decompressobj()
+        return decompressor.decompress(data) + decompressor.flush()
+
+    def open_writer(self, fileobj:BinaryIO) -> BinaryIO:
+        return _ZlibWriter(fileobj, self._compressobj())
+
+    def open_reader(self, fileobj:BinaryIO) -> BinaryIO:
+        return io.BufferedReader(_ZlibReader(fileobj, self._decompressobj()))
+
+
+class ZstdCodec(Codec):
+    """Zstandard with a preset dictionary (requires the zstandard package)."""
+    name = 'zstd'
+    extension = '.zst'
+
+    def __init__(self, dictionary:Optional[bytes]=None, level:int=3):
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError('The zstd compression requires the zstandard package (pip install zstandard)')
+        dict_data = zstandard.ZstdCompressionDict(dictionary, dict_type=zstandard.DICT_TYPE_RAWCONTENT) if dictionary else None
+        self._compressor = zstandard.ZstdCompressor(level=level, dict_data=dict_data)
+        self._decompressor = zstandard.ZstdDecompressor(dict_data=dict_data)
+
+    def compress(self, data:bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def decompress(self, data:bytes) -> bytes:
+        return self._decompressor.decompress(data)
+
+    def open_writer(self, fileobj:BinaryIO) -> BinaryIO:
+        return self._compressor.stream_writer(fileobj)
+
+    def open_reader(self, fileobj:BinaryIO) -> BinaryIO:
+        return io.BufferedReader(self._decompressor.stream_reader(fileobj))
+
+
+CODECS:Dict[str,type] = {
+    'none': Codec,
+    'gzip': GzipCodec,
+    'zlib': ZlibCodec,
+    'zstd': ZstdCodec,
+}
+
+
+def get_codec(name:str, dictionary:Optional[bytes]=None) -> Codec:
+    if name not in CODECS:
+        raise ValueError(f"Unknown compression '{name}'. Available: {list(CODECS.keys())}")
+    if name == 'none':
+        return Codec()
+    return CODECS[name](dictionary)
+
+
+def codec_for_path(path:str, dictionary:Optional[bytes]=None) -> Codec:
+    for name, codec_class in CODECS.items():
+        if codec_class.extension and path.endswith(codec_class.extension):
+            return get_codec(name, dictionary)
+    return Codec()
+
+
+def write_preset_dictionary(output_folder:str, dictionary:bytes) -> str:
+    path = os.path.join(metadata_folder(output_folder), DICTIONARY_FILE)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(dictionary)
+    return path
+
+
+def find_preset_dictionary(path:str) -> Optional[bytes]:
+    """Preset dictionary of the run that generated the given output file (if any)."""
+    dictionary_path = os.path.join(metadata_folder(os.path.dirname(os.path.abspath(path))), DICTIONARY_FILE)
+    if not os.path.isfile(dictionary_path):
+        return None
+    with open(dictionary_path, 'rb') as f:
+        return f.read()
+
+
+def read_cdf_file(path:str, dictionary:Optional[bytes]=None) -> dict:
+    """Read a (possibly compressed) <id>.cdf.json[.gz|.zz|.zst] file."""
+    codec = codec_for_path(path, dictionary if dictionary is not None else find_preset_dictionary(path))
+    with open(path, 'rb') as f:
+        return json.loads(codec.decompress(f.read()))
+
+
+def iter_cdf_bundle(path:str, dictionary:Optional[bytes]=None) -> Iterator[dict]:
+    """Iterate the records of a (possibly compressed) bundle file, decompressing it as a stream."""
+    codec = codec_for_path(path, dictionary if dictionary is not None else find_preset_dictionary(path))
+    with open(path, 'rb') as f:
+        reader = codec.open_reader(f)
+        for line in reader:
+            if line.strip():
+                yield json.loads(line)
+
+
+class _ZlibWriter(io.RawIOBase):
+
+    def __init__(self, fileobj:BinaryIO, compressor):
+        self._fileobj = fileobj
+        self._compressor = compressor
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._fileobj.write(self._compressor.compress(data))
+        return len(data)
+
+    def close(self) -> None:
+        if not self.closed:
+            self._fileobj.write(self._compressor.flush())
+        super().close()
+
+
+class _ZlibReader(io.RawIOBase):
+
+    def __init__(self, fileobj:BinaryIO, decompressor):
+        self._fileobj = fileobj
+        self._decompressor = decompressor
+        self._pending = b''
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._pending:
+            chunk = self._fileobj.read(READ_CHUNK_SIZE)
+            if not chunk:
+                self._pending = self._decompressor.flush()
+                if not self._pending:
+                    return 0
+                break
+            self._pending = self._decompressor.decompress(chunk)
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
@@ -0,0 +1,138 @@
+import logging
+from typing import Iterator, List, Optional, Tuple
+from .cdfconfig import datafile_columns
+from .transformation_exceptions import MoreThanOneValueInAssessmentVariants
+
+
+#DuckDB execution backend (--backend duckdb): the required columns of every datafile are loaded into
+#(temporary) DuckDB tables, which keep the order of the rows of the files, and the configuration is
+#compiled into a single SQL query that aggregates the rows of each participant and left-joins the results
+#on the participant ids. DuckDB runs it multithreaded, and spills to disk (temp_directory) when the data
+#does not fit in memory. The records are assembled from the result rows, fetched in batches.
+#
+#The values follow the rules of generate_csd (see cdfgenerator.assessment_value), compiled into SQL by
+#value_expression, and the records start from cdfgenerator.empty_record (no rows for the participant: '').
+
+DEFAULT_FETCH_SIZE = 10000
+
+#prefix of the error raised by the query when a participant has several values for a variable
+MULTIPLE_VALUES_ERROR = 'Two or more values found on an assessment variant'
+
+
+def quote_identifier(name:str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def quote_literal(value:str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def value_expression(column:str, file:str) -> str:
+    """Aggregate expression of the CDF value of a column for the rows of a participant."""
+    #(imported here: cdfgenerator imports this module)
+    from .cdfgenerator import DEFAULT_VARIABLES
+    value = f"coalesce({quote_identifier(column)}, '')"
+    single = f"CASE WHEN {value} = '' OR starts_with({value}, '$') THEN '' ELSE {value} END"
+    if column in DEFAULT_VARIABLES:
+        multiple = f"arg_min({value}, row_number)"
+    else:
+        message = quote_literal(f"{MULTIPLE_VALUES_ERROR} (variable {column}, file {file}, participant ") + " || project_pseudo_id || ')'"
+        multiple = (f"CASE WHEN count_if({value} <> '') > 1 THEN error({message}) "
+                    f"ELSE coalesce(max({value}) FILTER (WHERE {value} <> ''), '') END")
+    return f"CASE WHEN count(*) = 1 THEN any_value({single}) ELSE {multiple} END"
+
+
+class DuckDBBackend:
+    """
+    Generates the CDF records of a configuration with an embedded DuckDB database:
+
+        backend = DuckDBBackend(config)
+        for participant_id, record in backend.items(ids):
+            ...
+
+    memory_limit (e.g., '4GB'), threads and temp_directory (where to spill) are passed to DuckDB.
+    """
+
+    def __init__(self, config:dict, memory_limit:Optional[str]=None, threads:Optional[int]=None,
+                 temp_directory:Optional[str]=None, fetch_size:int=DEFAULT_FETCH_SIZE):
+        try:
+            import duckdb
+        except ImportError:
+            raise ImportError('The duckdb backend requires the duckdb package (pip install duckdb)')
+        self._duckdb = duckdb
+        self.config = config
+        self.fetch_size = fetch_size
+        self.connection = duckdb.connect()
+        for setting, value in [('memory_limit', memory_limit), ('threads', threads), ('temp_directory', temp_directory)]:
+            if value is not None:
+                self.connection.execute(f"SET {setting} = {quote_literal(str(value))}")
+
+        self.files = datafile_columns(config)
+        for file in self.files:
+            if file.endswith('.parquet'):
+                raise ValueError(f"The duckdb backend only reads CSV datafiles ({file})")
+        self.table_names = {file: f"datafile_{number}" for number, file in enumerate(self.files)}
+        #(variable, assessment, result column) in the order of the records
+        self._plan:List[Tuple[str,str,int]] = []
+        self.query = self._compile()
+        self._load()
+
+    def _load(self) -> None:
+        for file, columns in self.files.items():
+            selected = ', '.join(quote_identifier(column) for column in sorted(columns))
+            logging.info(f"Loading {file} into DuckDB. Columns:{columns}")
+            self.connection.execute(f"CREATE TEMP TABLE {self.table_names[file]} AS SELECT {selected} FROM "
+                                    f"read_csv({quote_literal(file)}, header=true, all_varchar=true, delim=',', quote='\"', escape='\"')")
+
+    def _compile(self) -> str:
+        file_names = {file: f"{name}_values" for file, name in self.table_names.items()}
+        ctes = ["ids AS (SELECT * FROM requested_ids)"]
+        for file, columns in self.files.items():
+            variables = sorted(columns - {'project_pseudo_id'})
+            aggregates = ', '.join(f"{value_expression(variable, file)} AS {quote_identifier(variable)}" for variable in variables)
+            #the rowid of the tables follows the order of the rows on the files
+            ctes.append(f"{file_names[file]} AS (SELECT project_pseudo_id, {aggregates} "
+                        f"FROM (SELECT *, rowid AS row_number FROM {self.table_names[file]}) GROUP BY project_pseudo_id)")
+
+        result_columns = []
+        for variable, var_assessment_files in self.config.items():
+            if variable == 'project_pseudo_id':
+                continue
+            for varversion in var_assessment_files:
+                assessment, file = list(varversion.items())[0]
+                result_columns.append(f"coalesce({file_names[file]}.{quote_identifier(variable)}, '')")
+                self._plan.append((variable, assessment, len(result_columns)))
+
+        joins = ' '.join(f"LEFT JOIN {name} ON {name}.project_pseudo_id = ids.participant_id" for name in file_names.values())
+        return (f"WITH {', '.join(ctes)} SELECT ids.participant_id{''.join(', ' + column for column in result_columns)} "
+                f"FROM ids {joins} ORDER BY ids.position")
+
+    def items(self, ids:List[str]) -> Iterator[Tuple[str,dict]]:
+        """(participant id, CDF record) pairs of the given participants, in the given order."""
+        import pandas as pd
+        requested_ids = pd.DataFrame({'participant_id': list(ids), 'position': range(len(ids))})
+        self.connection.register('requested_ids', requested_ids)
+        try:
+            cursor = self.connection.execute(self.query)
+            while True:
+                rows = cursor.fetchmany(self.fetch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield row[0], self._record(row)
+        except self._duckdb.Error as e:
+            if MULTIPLE_VALUES_ERROR in str(e):
+                raise MoreThanOneValueInAssessmentVariants(str(e))
+            raise
+        finally:
+            self.connection.unregister('requested_ids')
+
+    def _record(self, row:tuple) -> dict:
+        from .cdfgenerator import empty_record
+        record = empty_record(row[0], self.config)
+        for variable, assessment, column in self._plan:
+            record[variable][assessment] = row[column]
+        return record
+
+    def close(self) -> None:
+        self.connection.close()
@@ -0,0 +1,215 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+import sys
+from typing import Dict, List, Optional, Set, TextIO
+from .manifest import metadata_folder, metadata_path, read_metadata
+from .sharding import participant_hash
+
+
+#Fingerprint of the output of a run, to compare two runs (e.g., before and after a change of the loader
+#or the generation engine) without reading their outputs again.
+#
+#Every record gets a canonical hash: a 128-bit BLAKE2b digest of its JSON with sorted keys, so it does not
+#depend on the output format, the compression, the serializer or the order of the keys. The hashes are
+#combined, in an order-independent way, into buckets (by a hash of the participant id): each bucket keeps
+#the number of records and the XOR and the sum (mod 2^128) of their hashes. The run fingerprint is the
+#hash of the bucket digests (a two-level Merkle tree): two runs with the same root have the same records,
+#and otherwise only the participants of the differing buckets have to be checked. The shards of a run
+#write their own fingerprints, merged by adding up the buckets (see merge_shards.py).
+#
+#With --record-hashes, the generator also writes the hash of every record (record-hashes.tsv), which
+#narrows the differences down to the participants without reading the outputs.
+#
+#   python -m lifelinescsv_to_icdf.fingerprint <output folder A> <output folder B>
+
+DEFAULT_BUCKETS = 256
+HASH_BITS = 128
+#the buckets do not follow the shards (participant_hash with the default seed)
+BUCKET_SEED = 0x5eed
+RECORD_HASHES_FILE = 'record-hashes'
+#per-participant files of a 'json' output: <participant id>.cdf.json[<codec extension>] (not the .cdf.jsonl bundles)
+PARTICIPANT_FILE = re.compile(r'(.*)\.cdf\.json(\.[A-Za-z0-9]+)?')
+
+
+def record_hash(record:dict) -> int:
+    canonical = json.dumps(record, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return int.from_bytes(hashlib.blake2b(canonical, digest_size=HASH_BITS // 8).digest(), 'big')
+
+
+def bucket_of(participant_id:str, buckets:int=DEFAULT_BUCKETS) -> int:
+    return participant_hash(participant_id, BUCKET_SEED) % buckets
+
+
+class RunFingerprint:
+    """Order-independent fingerprint of a set of records (see the module comment)."""
+
+    def __init__(self, buckets:int=DEFAULT_BUCKETS, record_hashes:Optional[TextIO]=None):
+        self.buckets = buckets
+        self.counts = [0] * buckets
+        self.xors = [0] * buckets
+        self.sums = [0] * buckets
+        #where to write '<participant id>\t<record hash>' lines (optional)
+        self.record_hashes = record_hashes
+
+    def add(self, participant_id:str, record:dict) -> int:
+        digest = record_hash(record)
+        bucket = bucket_of(participant_id, self.buckets)
+        self.counts[bucket] += 1
+        self.xors[bucket] ^= digest
+        self.sums[bucket] = (self.sums[bucket] + digest) % (1 << HASH_BITS)
+        if self.record_hashes is not None:
+            self.record_hashes.write(f'{participant_id}\t{digest:032x}\n')
+        return digest
+
+    def merge(self, other:'RunFingerprint') -> 'RunFingerprint':
+        if other.buckets != self.buckets:
+            raise ValueError(f'Fingerprints with different numbers of buckets: {self.buckets} and {other.buckets}')
+        for bucket in range(self.buckets):
+            self.counts[bucket] += other.counts[bucket]
+            self.xors[bucket] ^= other.xors[bucket]
+            self.sums[bucket] = (self.sums[bucket] + other.sums[bucket]) % (1 << HASH_BITS)
+        return self
+
+    def bucket_digest(self, bucket:int) -> str:
+        state = f'{self.counts[bucket]}:{self.xors[bucket]:032x}:{self.sums[bucket]:032x}'
+        return hashlib.blake2b(state.encode('ascii'), digest_size=HASH_BITS // 8).hexdigest()
+
+    def root(self) -> str:
+        return hashlib.blake2b(''.join(self.bucket_digest(bucket) for bucket in range(self.buckets)).encode('ascii'),
+                               digest_size=HASH_BITS // 8).hexdigest()
+
+    def to_dict(self) -> dict:
+        xor = 0
+        for value in self.xors:
+            xor ^= value
+        return {
+            'algorithm': f'blake2b-{HASH_BITS}',
+            'records': sum(self.counts),
+            'root': self.root(),
+            'xor': f'{xor:032x}',
+            'sum': f'{sum(self.sums) % (1 << HASH_BITS):032x}',
+            'buckets': [[self.counts[bucket], f'{self.xors[bucket]:032x}', f'{self.sums[bucket]:032x}'] for bucket in range(self.buckets)],
+        }
+
+    @classmethod
+    def from_dict(cls, content:dict) -> 'RunFingerprint':
+        fingerprint = cls(len(content['buckets']))
+        for bucket, (count, xor, total) in enumerate(content['buckets']):
+            fingerprint.counts[bucket] = count
+            fingerprint.xors[bucket] = int(xor, 16)
+            fingerprint.sums[bucket] = int(total, 16)
+        return fingerprint
+
+
+def merge_fingerprints(fingerprints:List[dict]) -> dict:
+    merged = RunFingerprint.from_dict(fingerprints[0])
+    for fingerprint in fingerprints[1:]:
+        merged.merge(RunFingerprint.from_dict(fingerprint))
+    return merged.to_dict()
+
+
+def load_run_fingerprint(output_folder:str) -> dict:
+    """Fingerprint of a run: fingerprint.json, or the merge of the fingerprints of its shards."""
+    path = metadata_path(output_folder, 'fingerprint')
+    if os.path.isfile(path):
+        return read_metadata(path)
+    shard_paths = sorted(glob.glob(os.path.join(metadata_folder(output_folder), 'fingerprint-shard-*.json')))
+    if not shard_paths:
+        raise FileNotFoundError(f"No fingerprint found on '{metadata_folder(output_folder)}'")
+    return merge_fingerprints([read_metadata(shard_path) for shard_path in shard_paths])
+
+
+def differing_buckets(fingerprint_a:dict, fingerprint_b:dict) -> List[int]:
+    if len(fingerprint_a['buckets']) != len(fingerprint_b['buckets']):
+        raise ValueError('The fingerprints have different numbers of buckets')
+    return [bucket for bucket, (state_a, state_b) in enumerate(zip(fingerprint_a['buckets'], fingerprint_b['buckets'])) if state_a != state_b]
+
+
+def read_record_hashes(output_folder:str, buckets:Set[int], bucket_count:int) -> Optional[Dict[str,str]]:
+    """Record hashes (of the participants of the given buckets) written with --record-hashes, if any."""
+    paths = glob.glob(os.path.join(metadata_folder(output_folder), RECORD_HASHES_FILE + '*.tsv'))
+    if not paths:
+        return None
+    hashes = {}
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                participant_id, digest = line.rstrip('\n').split('\t')
+                if bucket_of(participant_id, bucket_count) in buckets:
+                    hashes[participant_id] = digest
+    return hashes
+
+
+def output_record_hashes(output_folder:str, buckets:Set[int], bucket_count:int) -> Optional[Dict[str,str]]:
+    """
+    Record hashes of the participants of the given buckets, read from a 'json' output (only their files
+    are read). None when the output has no per-participant files (e.g., 'jsonl' bundles).
+    """
+    from .compression import read_cdf_file
+    participant_files = False
+    hashes = {}
+    for name in os.listdir(output_folder):
+        match = PARTICIPANT_FILE.fullmatch(name)
+        if match is None:
+            continue
+        participant_files = True
+        participant_id = match.group(1)
+        if bucket_of(participant_id, bucket_count) in buckets:
+            hashes[participant_id] = f'{record_hash(read_cdf_file(os.path.join(output_folder, name))):032x}'
+    return hashes if participant_files else None
+
+
+def differing_participants(hashes_a:Dict[str,str], hashes_b:Dict[str,str]) -> List[str]:
+    return sorted(pid for pid in set(hashes_a) | set(hashes_b) if hashes_a.get(pid) != hashes_b.get(pid))
+
+
+def compare_participants(output_a:str, output_b:str, buckets:Set[int], bucket_count:int) -> Optional[List[str]]:
+    """
+    Differing participants of the given buckets of two outputs, from their record hashes (--record-hashes)
+    or, failing that, from their per-participant files. None when an output has neither, so the
+    participants cannot be compared.
+    """
+    hashes = []
+    for output_folder in [output_a, output_b]:
+        output_hashes = read_record_hashes(output_folder, buckets, bucket_count)
+        if output_hashes is None:
+            output_hashes = output_record_hashes(output_folder, buckets, bucket_count)
+        if output_hashes is None:
+            return None
+        hashes.append(output_hashes)
+    return differing_participants(*hashes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the outputs of two CSV to CDF transformations using their fingerprints.')
+    parser.add_argument('output_a', help='Output folder of the first run.')
+    parser.add_argument('output_b', help='Output folder of the second run.')
+    args = parser.parse_args()
+
+    fingerprint_a = load_run_fingerprint(args.output_a)
+    fingerprint_b = load_run_fingerprint(args.output_b)
+    if fingerprint_a['root'] == fingerprint_b['root']:
+        print(f"Equivalent outputs: {fingerprint_a['records']} records, fingerprint {fingerprint_a['root']}")
+        return
+
+    bucket_count = len(fingerprint_a['buckets'])
+    buckets = set(differing_buckets(fingerprint_a, fingerprint_b))
+    print(f"Different outputs: {fingerprint_a['records']} and {fingerprint_b['records']} records, {len(buckets)} of {bucket_count} buckets differ")
+
+    participants = compare_participants(args.output_a, args.output_b, buckets, bucket_count)
+    if participants is None:
+        print("The differing participants cannot be listed: an output has neither record hashes (generate it with --record-hashes) "
+              "nor one file per participant (the 'json' output format)")
+        sys.exit(1)
+    print(f"{len(participants)} differing participants:")
+    for participant_id in participants:
+        print(participant_id)
+    sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
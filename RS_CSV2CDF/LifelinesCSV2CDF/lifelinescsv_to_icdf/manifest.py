@@ -0,0 +1,33 @@
+import json
+import os
+from typing import Optional
+from .sharding import Shard
+
+
+#Run metadata (manifests, summaries) is kept on a sub-folder of the output folder, so that it is not
+#mistaken for CDF files by the tools that read every .json file of the output folder.
+METADATA_FOLDER = '_run_metadata'
+
+
+def metadata_folder(output_folder:str) -> str:
+    return os.path.join(output_folder, METADATA_FOLDER)
+
+
+def metadata_path(output_folder:str, name:str, shard:Optional[Shard]=None) -> str:
+    """Path of a run metadata file. Sharded runs get one file per shard (e.g., manifest-shard-003-of-016.json)."""
+    if shard is not None:
+        name = f'{name}-{shard.suffix}'
+    return os.path.join(metadata_folder(output_folder), name + '.json')
+
+
+def write_metadata(output_folder:str, name:str, content:dict, shard:Optional[Shard]=None) -> str:
+    path = metadata_path(output_folder, name, shard)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(content, f, indent=4)
+    return path
+
+
+def read_metadata(path:str) -> dict:
+    with open(path) as f:
+        return json.load(f)
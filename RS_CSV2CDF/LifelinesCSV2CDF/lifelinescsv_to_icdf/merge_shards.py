@@ -0,0 +1,100 @@
+import argparse
+import glob
+import logging
+import os
+import sys
+from typing import List
+from .manifest import metadata_folder, read_metadata, write_metadata
+from .qa import merge_qa_summaries
+from .fingerprint import merge_fingerprints
+from .validation import merge_validation_reports
+
+
+logging.basicConfig(level=logging.INFO)
+
+#Combines the per-shard manifests written by the shards of a SLURM array job (see sharding.py) into a
+#single manifest.json with the totals of the run, and their QA summaries (see qa.py), fingerprints (see
+#fingerprint.py) and validation reports (see validation.py) into a single qa.json, fingerprint.json and
+#validation.json. Usually run as a job depending on the array job:
+#
+#   python -m lifelinescsv_to_icdf.merge_shards <output folder>
+
+
+def merge_metrics(metrics:List[dict]) -> dict:
+    """Add up the (possibly nested) numeric metrics of the shards."""
+    merged:dict = {}
+    for shard_metrics in metrics:
+        for key, value in shard_metrics.items():
+            if isinstance(value, dict):
+                merged[key] = merge_metrics([merged.get(key, {}), value])
+            else:
+                merged[key] = merged.get(key, 0) + value
+    return merged
+
+
+def merge_manifests(manifests:List[dict]) -> dict:
+    if any(manifest.get('shard') is None for manifest in manifests):
+        raise ValueError('Not all the manifests belong to a sharded run (a manifest without shard was found)')
+    shard_count = manifests[0]['shard']['count']
+    if any(manifest['shard']['count'] != shard_count for manifest in manifests):
+        raise ValueError('The manifests do not belong to the same sharded run')
+
+    present = {manifest['shard']['index'] for manifest in manifests}
+    manifests = sorted(manifests, key=lambda manifest: manifest['shard']['index'])
+
+    return {
+        'shard_count': shard_count,
+        'missing_shards': [index for index in range(shard_count) if index not in present],
+        'ids_file': manifests[0]['ids_file'],
+        'config_file': manifests[0]['config_file'],
+        'output_format': manifests[0]['output_format'],
+        'participants': sum(manifest['participants'] for manifest in manifests),
+        'bundles': [bundle for manifest in manifests for bundle in manifest['bundles']],
+        'metrics': merge_metrics([manifest['metrics'] for manifest in manifests]),
+        #wall-clock time of the slowest shard
+        'max_shard_seconds': max(manifest['metrics']['load_seconds'] + manifest['metrics']['generation_seconds'] for manifest in manifests),
+        'shards': [{'index': manifest['shard']['index'], 'participants': manifest['participants'], 'metrics': manifest['metrics']} for manifest in manifests],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Merge the manifests of the shards of a CSV to CDF transformation.')
+    parser.add_argument('output_folder', help='Output folder of the sharded transformation.')
+    args = parser.parse_args()
+
+    manifest_paths = sorted(glob.glob(os.path.join(metadata_folder(args.output_folder), 'manifest-shard-*.json')))
+    if len(manifest_paths) == 0:
+        print(f"No shard manifests found on '{metadata_folder(args.output_folder)}'.")
+        sys.exit(1)
+
+    try:
+        merged = merge_manifests([read_metadata(path) for path in manifest_paths])
+    except ValueError as e:
+        print(f"The manifests on '{metadata_folder(args.output_folder)}' cannot be merged: {e}")
+        sys.exit(1)
+    path = write_metadata(args.output_folder, 'manifest', merged)
+    logging.info(f"{len(manifest_paths)} shard manifests merged into {path}: {merged['participants']} participants.")
+
+    qa_paths = sorted(glob.glob(os.path.join(metadata_folder(args.output_folder), 'qa-shard-*.json')))
+    if qa_paths:
+        path = write_metadata(args.output_folder, 'qa', merge_qa_summaries([read_metadata(path) for path in qa_paths]))
+        logging.info(f"{len(qa_paths)} shard QA summaries merged into {path}.")
+
+    fingerprint_paths = sorted(glob.glob(os.path.join(metadata_folder(args.output_folder), 'fingerprint-shard-*.json')))
+    if fingerprint_paths:
+        fingerprint = merge_fingerprints([read_metadata(path) for path in fingerprint_paths])
+        path = write_metadata(args.output_folder, 'fingerprint', fingerprint)
+        logging.info(f"{len(fingerprint_paths)} shard fingerprints merged into {path}: {fingerprint['root']}.")
+
+    validation_paths = sorted(glob.glob(os.path.join(metadata_folder(args.output_folder), 'validation-shard-*.json')))
+    if validation_paths:
+        path = write_metadata(args.output_folder, 'validation', merge_validation_reports([read_metadata(path) for path in validation_paths]))
+        logging.info(f"{len(validation_paths)} shard validation reports merged into {path}.")
+
+    if merged['missing_shards']:
+        logging.error(f"Missing shards: {merged['missing_shards']}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
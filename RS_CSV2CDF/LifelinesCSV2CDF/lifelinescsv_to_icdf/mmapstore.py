@@ -0,0 +1,233 @@
+import argparse
+import bisect
+import itertools
+import json
+import logging
+import mmap
+import os
+import shutil
+from array import array
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+from .cdfconfig import load_config, datafile_columns
+from .transformation_exceptions import MissingParticipantRowException
+
+
+#Memory-mapped value store: an alternative to the pandas frames for the per-participant look-ups of the
+#generator. Each datafile is converted (once) into string arrays, one per column, with the rows sorted
+#by participant id. A string array is two files: <name>.offsets (n+1 int64 offsets) and <name>.bytes (the
+#UTF-8 values, concatenated). The files are opened with mmap, so opening a store is nearly instant, the
+#values are only paged in when looked up, and every process using the store shares the same page cache.
+#
+#   python -m lifelinescsv_to_icdf.mmapstore config.json store_folder
+#   python -m lifelinescsv_to_icdf.cdfgenerator ids.csv config.json output --mmap-store store_folder
+
+MANIFEST_FILE = 'store.json'
+STORE_VERSION = 1
+
+
+class StringArray:
+    """Read-only, memory-mapped array of strings (offsets + bytes files)."""
+
+    def __init__(self, path:str):
+        self._offsets_file = open(path + '.offsets', 'rb')
+        self._bytes_file = open(path + '.bytes', 'rb')
+        self._offsets_mmap = mmap.mmap(self._offsets_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.offsets = memoryview(self._offsets_mmap).cast('q')
+        #mmap does not support empty files
+        self.data = mmap.mmap(self._bytes_file.fileno(), 0, access=mmap.ACCESS_READ) if self.offsets[-1] > 0 else b''
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def raw(self, position:int) -> bytes:
+        return self.data[self.offsets[position]:self.offsets[position + 1]]
+
+    def __getitem__(self, position:int) -> str:
+        return self.raw(position).decode('utf-8')
+
+    def close(self) -> None:
+        self.offsets.release()
+        self._offsets_mmap.close()
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self._offsets_file.close()
+        self._bytes_file.close()
+
+
+class _RawIds:
+    #view of the ids as bytes, for binary searches (UTF-8 byte order is the code point order)
+    def __init__(self, ids:StringArray):
+        self._ids = ids
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __getitem__(self, position:int) -> bytes:
+        return self._ids.raw(position)
+
+
+def write_string_array(path:str, values:Iterable[str]) -> None:
+    encoded = [value.encode('utf-8') for value in values]
+    offsets = array('q', [0])
+    offsets.extend(itertools.accumulate(len(value) for value in encoded))
+    with open(path + '.offsets', 'wb') as f:
+        offsets.tofile(f)
+    with open(path + '.bytes', 'wb') as f:
+        f.write(b''.join(encoded))
+
+
+class MMapDatafile:
+    """
+    Memory-mapped datafile: the load_val backend for a datafile converted with build_store. Look-ups are
+    binary searches on the sorted ids; as with the pandas frames, a participant with several rows gets a
+    Series with one value per row.
+    """
+
+    def __init__(self, folder:str, columns:List[str]):
+        self.ids = StringArray(os.path.join(folder, 'ids'))
+        self._raw_ids = _RawIds(self.ids)
+        self.columns = {column: StringArray(os.path.join(folder, f'col-{number:05d}')) for number, column in enumerate(columns)}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def row_range(self, participant_id:str) -> Tuple[int,int]:
+        """Positions [start, end) of the rows of the participant (empty when there are none)."""
+        key = participant_id.encode('utf-8')
+        start = bisect.bisect_left(self._raw_ids, key)
+        end = start
+        while end < len(self._raw_ids) and self._raw_ids[end] == key:
+            end += 1
+        return start, end
+
+    def __contains__(self, participant_id:str) -> bool:
+        start, end = self.row_range(participant_id)
+        return end > start
+
+    def contains(self, participant_ids:List[str]) -> List[bool]:
+        """
+        Whether each of the given participants has rows (used by the pre-join, see prejoin.py), without
+        decoding the ids of the datafile: one binary search per participant when they are a few, a single
+        merge pass over the sorted ids when they are many.
+        """
+        keys = [participant_id.encode('utf-8') for participant_id in participant_ids]
+        present = [False] * len(keys)
+        rows = len(self._raw_ids)
+        binary_searches = len(keys) * max(rows.bit_length(), 1) < rows
+        position = 0
+        for query in sorted(range(len(keys)), key=keys.__getitem__):
+            key = keys[query]
+            if binary_searches:
+                position = bisect.bisect_left(self._raw_ids, key, position)
+            else:
+                while position < rows and self._raw_ids[position] < key:
+                    position += 1
+            present[query] = position < rows and self._raw_ids[position] == key
+        return present
+
+    def lookup(self, participant_id:str, column:str):
+        start, end = self.row_range(participant_id)
+        if start == end:
+            raise MissingParticipantRowException(participant_id)
+        values = self.columns[column]
+        if end - start == 1:
+            return values[start]
+        import pandas as pd
+        return pd.Series([values[position] for position in range(start, end)], index=[participant_id] * (end - start), dtype=object)
+
+    def close(self) -> None:
+        self.ids.close()
+        for values in self.columns.values():
+            values.close()
+
+
+def _source_signature(path:str) -> dict:
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def build_store(data_frames:dict, store_folder:str, format_value:Callable[[object],str]=str) -> None:
+    """
+    Convert indexed datafiles (as returned by load_and_index_csv_datafiles) into a store. Values that are
+    not strings (typed datafiles) are converted with format_value.
+    """
+    temporary_folder = store_folder.rstrip(os.sep) + '.building'
+    shutil.rmtree(temporary_folder, ignore_errors=True)
+    os.makedirs(temporary_folder)
+
+    manifest = {'version': STORE_VERSION, 'datafiles': {}}
+    for number, (file, data_frame) in enumerate(data_frames.items()):
+        folder = f'datafile-{number:05d}'
+        os.makedirs(os.path.join(temporary_folder, folder))
+        ids = [str(pid) for pid in data_frame.index.tolist()]
+        #stable: the rows of a participant keep their order
+        order = sorted(range(len(ids)), key=lambda position: ids[position].encode('utf-8'))
+        write_string_array(os.path.join(temporary_folder, folder, 'ids'), (ids[position] for position in order))
+        columns = list(data_frame.columns)
+        for column_number, column in enumerate(columns):
+            values = data_frame[column].tolist()
+            write_string_array(os.path.join(temporary_folder, folder, f'col-{column_number:05d}'),
+                               (value if isinstance(value, str) else format_value(value) for value in (values[position] for position in order)))
+        manifest['datafiles'][file] = {'folder': folder, 'columns': columns, 'rows': len(ids), 'source': _source_signature(file)}
+
+    with open(os.path.join(temporary_folder, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=4)
+
+    #replace the previous version of the store (if any)
+    shutil.rmtree(store_folder, ignore_errors=True)
+    os.replace(temporary_folder, store_folder)
+
+
+def stale_datafiles(store_folder:str, required_columns:Dict[str,Set[str]]) -> List[str]:
+    """Datafiles that are missing on the store, changed after it was built, or lack some required column."""
+    manifest_path = os.path.join(store_folder, MANIFEST_FILE)
+    if not os.path.isfile(manifest_path):
+        return list(required_columns)
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if manifest.get('version') != STORE_VERSION:
+        return list(required_columns)
+    stale = []
+    for file, columns in required_columns.items():
+        entry = manifest['datafiles'].get(file)
+        if entry is None or entry['source'] != _source_signature(file) or not (columns - {'project_pseudo_id'}) <= set(entry['columns']):
+            stale.append(file)
+    return stale
+
+
+def open_store(store_folder:str, files:Optional[Iterable[str]]=None) -> Dict[str,MMapDatafile]:
+    """Datafiles of a store (all, or the given ones), to be used in place of the pandas frames."""
+    with open(os.path.join(store_folder, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    files = list(files) if files is not None else list(manifest['datafiles'])
+    return {file: MMapDatafile(os.path.join(store_folder, manifest['datafiles'][file]['folder']), manifest['datafiles'][file]['columns'])
+            for file in files}
+
+
+def open_or_build_store(store_folder:str, config_file_path:str, load:Callable[[],dict], format_value:Callable[[object],str]=str,
+                        config:Optional[dict]=None) -> Dict[str,MMapDatafile]:
+    """
+    Open the store of a configuration (config, or the one on config_file_path by default), (re)building it
+    first with the frames returned by load() when it is missing or stale.
+    """
+    required_columns = datafile_columns(config if config is not None else load_config(config_file_path))
+    stale = stale_datafiles(store_folder, required_columns)
+    if stale:
+        logging.info(f'Building the memory-mapped store {store_folder} (missing or changed datafiles: {stale})')
+        build_store(load(), store_folder, format_value)
+    return open_store(store_folder, required_columns.keys())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert the datafiles of a configuration into a memory-mapped store (see cdfgenerator --mmap-store).')
+    parser.add_argument('config_file', help='Path to the JSON configuration file.')
+    parser.add_argument('store_folder', help='Folder of the store (replaced if it exists).')
+    args = parser.parse_args()
+
+    from .cdfgenerator import load_and_index_csv_datafiles, cdf_value
+    build_store(load_and_index_csv_datafiles(args.config_file), args.store_folder, cdf_value)
+    print(f'Store written on {args.store_folder}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+import gc
+import heapq
+import itertools
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from typing import Iterator, List, Optional, Tuple
+from .cdfconfig import datafile_columns
+
+
+#Out-of-core, file-at-a-time generation (--backend outofcore): instead of holding every datafile in
+#memory, the datafiles are loaded one after the other. For each file, the values of the variables
+#it provides are computed for every participant with rows on it (a 'fragment' of the record:
+#{variable: {assessment: value}}) and spilled to a fragments file, in participant id order; the file is
+#then freed before loading the next one. Finally the fragments files are merged (a k-way merge on the
+#ids, reading them line by line) into complete records. The peak memory is bounded by the largest
+#datafile rather than by the sum of all of them.
+#
+#A fragments file is a JSON line per participant: ["<participant id>", {variable: {assessment: value}}]
+
+FRAGMENTS_FILE = 'fragments-{:05d}.jsonl'
+
+
+def file_config(config:dict, file:str) -> dict:
+    """Part of a configuration provided by a datafile (the assessments of the variables read from it)."""
+    result = {}
+    for variable, var_assessment_files in config.items():
+        if variable == 'project_pseudo_id':
+            continue
+        assessments = [varversion for varversion in var_assessment_files if list(varversion.values())[0] == file]
+        if assessments:
+            result[variable] = assessments
+    return result
+
+
+def read_fragments(path:str) -> Iterator[Tuple[str,dict]]:
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            participant_id, fragment = json.loads(line)
+            yield participant_id, fragment
+
+
+class OutOfCoreBackend:
+    """
+    Generates the CDF records of a configuration loading a single datafile at a time:
+
+        backend = OutOfCoreBackend(config, load_datafile)
+        for participant_id, record in backend.items(ids):
+            ...
+
+    load_datafile(file, columns, participant_ids) returns the indexed data frame of a datafile (see
+    cdfgenerator.read_csv_datafile and index_datafile). The fragments are written to a temporary folder
+    on spill_directory (default: the system's temporary folder), removed once the records are generated.
+    """
+
+    def __init__(self, config:dict, load_datafile, spill_directory:Optional[str]=None, log_memory:bool=False):
+        self.config = config
+        self.load_datafile = load_datafile
+        self.spill_directory = spill_directory
+        self.log_memory = log_memory
+        self.files = datafile_columns(config)
+
+    def spill(self, ids:List[str], spill_folder:str) -> List[str]:
+        """Write the fragments files of the (sorted, unique) ids, one per datafile. Returns their paths."""
+        from .cdfgenerator import generate_csd, memory_usage_mb
+        import pandas as pd
+        requested_ids = set(ids)
+        ids_index = pd.Index(ids)
+        paths = []
+        for number, (file, columns) in enumerate(self.files.items()):
+            start = time.perf_counter()
+            data_frame = self.load_datafile(file, columns, requested_ids)
+            #participants with rows on the file, in id order
+            present_ids = ids_index[ids_index.isin(data_frame.index)].tolist()
+            fragment_config = file_config(self.config, file)
+            data_frames = {file: data_frame}
+            present_files = frozenset([file])
+
+            path = os.path.join(spill_folder, FRAGMENTS_FILE.format(number))
+            with open(path, 'w', encoding='utf-8') as f:
+                for participant_id in present_ids:
+                    fragment = generate_csd(participant_id, fragment_config, data_frames, present_files)
+                    del fragment['project_pseudo_id']
+                    f.write(json.dumps([participant_id, fragment], ensure_ascii=False, separators=(',', ':')))
+                    f.write('\n')
+            paths.append(path)
+
+            message = f"{file}: {len(present_ids)} fragments spilled in {time.perf_counter() - start:.2f} sec"
+            if self.log_memory:
+                message += f" (memory usage before freeing the datafile: {memory_usage_mb()} MB)"
+            logging.info(message)
+            #free the datafile before loading the next one
+            del data_frames, data_frame
+            gc.collect()
+        return paths
+
+    def merge(self, ids:List[str], paths:List[str]) -> Iterator[Tuple[str,dict]]:
+        """Records of the (sorted, unique) ids, merging the fragments files."""
+        from .cdfgenerator import empty_record
+        fragments = heapq.merge(*(read_fragments(path) for path in paths), key=lambda item: item[0])
+        grouped = itertools.groupby(fragments, key=lambda item: item[0])
+        current = next(grouped, None)
+        for participant_id in ids:
+            #participants without rows on a file have its values reported as missing ("")
+            record = empty_record(participant_id, self.config)
+            if current is not None and current[0] == participant_id:
+                for _, fragment in current[1]:
+                    for variable, assessments in fragment.items():
+                        record[variable].update(assessments)
+                current = next(grouped, None)
+            yield participant_id, record
+
+    def items(self, ids:List[str]) -> Iterator[Tuple[str,dict]]:
+        """(participant id, CDF record) pairs of the given participants, in id order."""
+        sorted_ids = sorted(set(ids))
+        spill_folder = tempfile.mkdtemp(prefix='cdf-fragments-', dir=self.spill_directory)
+        try:
+            paths = self.spill(sorted_ids, spill_folder)
+            yield from self.merge(sorted_ids, paths)
+        finally:
+            shutil.rmtree(spill_folder, ignore_errors=True)
@@ -0,0 +1,321 @@
+import json
+import os
+import queue
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+from .serializers import Serializer, get_serializer
+from .compression import Codec
+from .sparse import sparsify, schema_header
+
+
+#Default size of the file buffer of the bundle files
+DEFAULT_BUFFER_BYTES = 1024 * 1024
+
+#Default number of participants per bundle file
+DEFAULT_BUNDLE_SIZE = 1000
+
+#Output formats whose writers can read back their records, so that new records can be merged into them
+MERGEABLE_OUTPUT_FORMATS = ['json', 'sqlite']
+
+#Default maximum number of encoded records waiting to be written by the write-behind stage
+DEFAULT_WRITE_QUEUE_SIZE = 1024
+
+
+class StageStats:
+    """
+    Throughput counters of a stage of the generation loop. busy_seconds is the time spent doing the
+    stage's work, and wait_seconds the time spent blocked on the other stage.
+    """
+
+    def __init__(self, name:str):
+        self.name = name
+        self.records = 0
+        self.bytes = 0
+        self.busy_seconds = 0.0
+        self.wait_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, records:int, nbytes:int, busy_seconds:float, wait_seconds:float=0.0) -> None:
+        with self._lock:
+            self.records += records
+            self.bytes += nbytes
+            self.busy_seconds += busy_seconds
+            self.wait_seconds += wait_seconds
+
+    def to_dict(self) -> dict:
+        return {'records':self.records,'bytes':self.bytes,'busy_seconds':self.busy_seconds,'wait_seconds':self.wait_seconds}
+
+    def summary(self) -> str:
+        records_per_sec = self.records/self.busy_seconds if self.busy_seconds > 0 else 0.0
+        mb_per_sec = self.bytes/1024**2/self.busy_seconds if self.busy_seconds > 0 else 0.0
+        return (f'{self.name}: {self.records} records, {self.bytes/1024**2:.2f} MB in {self.busy_seconds:.2f} busy sec '
+                f'({records_per_sec:.1f} rows/s, {mb_per_sec:.2f} MB/s), {self.wait_seconds:.2f} sec waiting on the other stage')
+
+
+def payload_size(payload) -> int:
+    return len(payload) if isinstance(payload, (bytes, bytearray)) else 0
+
+
+class OutputWriter(ABC):
+    """
+    Destination of the generated CDF records.
+
+    Writing is split in two steps: encode() does the CPU-bound part (e.g., serializing the record) and
+    write_encoded() does the I/O. This allows the two steps to run on different threads.
+    """
+
+    #number of threads that can call write_encoded() concurrently
+    max_writer_threads = 1
+
+    #whether read() returns the records already on the output (required by MergingWriter)
+    readable = False
+
+    @abstractmethod
+    def encode(self, participant_id:str, record:dict):
+        """Payload of the record, as written by write_encoded()."""
+
+    @abstractmethod
+    def write_encoded(self, participant_id:str, payload) -> None:
+        """Write the payload of a record."""
+
+    def write(self, participant_id:str, record:dict) -> None:
+        self.write_encoded(participant_id, self.encode(participant_id, record))
+
+    def read(self, participant_id:str) -> Optional[dict]:
+        """Record of the participant already on the output (None if there is none), see MergingWriter."""
+        raise TypeError(f"{type(self).__name__} cannot read back its records")
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+
+class JSONFileWriter(OutputWriter):
+    """
+    One <participant_id>.cdf.json file per participant (compressed one by one with the given codec, if
+    any), written as soon as the record is (use WriteBehindWriter to write them on other threads). To
+    batch the I/O of many participants use the 'jsonl' output (JSONBundleWriter) instead.
+    """
+
+    max_writer_threads = 32
+    readable = True
+
+    def __init__(self, output_folder:str, serializer:Optional[Serializer]=None, codec:Optional[Codec]=None):
+        self.output_folder = output_folder
+        self.serializer = serializer or get_serializer()
+        self.codec = codec or Codec()
+
+    def output_path(self, participant_id:str) -> str:
+        return os.path.join(self.output_folder, participant_id+".cdf.json"+self.codec.extension)
+
+    def encode(self, participant_id:str, record:dict) -> bytes:
+        return self.codec.compress(self.serializer.dumps(record))
+
+    def read(self, participant_id:str) -> Optional[dict]:
+        path = self.output_path(participant_id)
+        if not os.path.isfile(path):
+            return None
+        with open(path, 'rb') as f:
+            return json.loads(self.codec.decompress(f.read()))
+
+    def write_encoded(self, participant_id:str, payload:bytes) -> None:
+        #unbuffered: the payload is already complete, so it is written with a single system call
+        with open(self.output_path(participant_id), 'wb', buffering=0) as f:
+            f.write(payload)
+
+
+class JSONBundleWriter(OutputWriter):
+    """
+    Bundles of bundle_size participants, one record per line (JSON lines), on files named
+    <prefix>-00000.cdf.jsonl, <prefix>-00001.cdf.jsonl, ... (compressed as a stream with the given codec,
+    if any). When a schema is given, the records are written sparse, with the schema on the first line of
+    each bundle (see sparse.py).
+    """
+
+    def __init__(self, output_folder:str, serializer:Optional[Serializer]=None, bundle_size:int=DEFAULT_BUNDLE_SIZE,
+                 buffer_bytes:int=DEFAULT_BUFFER_BYTES, prefix:str='bundle', codec:Optional[Codec]=None,
+                 schema:Optional[Dict[str,List[str]]]=None):
+        if bundle_size < 1:
+            raise ValueError(f'Invalid bundle size: {bundle_size}')
+        self.output_folder = output_folder
+        self.serializer = serializer or get_serializer()
+        self.bundle_size = bundle_size
+        self.buffer_bytes = buffer_bytes
+        self.prefix = prefix
+        self.codec = codec or Codec()
+        self.schema = schema
+        self.bundle_paths:List[str] = []
+        self._file = None
+        self._stream = None
+        self._records_in_bundle = 0
+
+    def bundle_path(self, bundle_number:int) -> str:
+        return os.path.join(self.output_folder, f'{self.prefix}-{bundle_number:05d}.cdf.jsonl{self.codec.extension}')
+
+    def encode(self, participant_id:str, record:dict) -> bytes:
+        if self.schema is not None:
+            record = sparsify(record)
+        return self.serializer.dumps(record) + b'\n'
+
+    def write_encoded(self, participant_id:str, payload:bytes) -> None:
+        if self._file is None:
+            self._open_next_bundle()
+        self._stream.write(payload)
+        self._records_in_bundle += 1
+        if self._records_in_bundle == self.bundle_size:
+            self._close_bundle()
+
+    def close(self) -> None:
+        self._close_bundle()
+
+    def _open_next_bundle(self) -> None:
+        path = self.bundle_path(len(self.bundle_paths))
+        self.bundle_paths.append(path)
+        self._file = open(path, 'wb', buffering=self.buffer_bytes)
+        self._stream = self.codec.open_writer(self._file)
+        self._records_in_bundle = 0
+        if self.schema is not None:
+            self._stream.write(self.serializer.dumps(schema_header(self.schema)) + b'\n')
+
+    def _close_bundle(self) -> None:
+        if self._file is not None:
+            self._stream.close()
+            self._file.close()
+            self._file = None
+            self._stream = None
+
+
+class WriteBehindWriter(OutputWriter):
+    """
+    Decouples the generation of the records from the (blocking) file I/O: encoded records are put on a
+    bounded queue, which is drained by a pool of writer threads calling the wrapped writer. When the
+    queue is full the producer blocks, which caps the memory used by the pending records.
+    """
+
+    def __init__(self, writer:OutputWriter, writer_threads:int=1, queue_size:int=DEFAULT_WRITE_QUEUE_SIZE):
+        self.writer = writer
+        self.writer_threads = max(1, min(writer_threads, writer.max_writer_threads))
+        self.stats = StageStats('output')
+        self._queue:queue.Queue = queue.Queue(maxsize=queue_size)
+        self._error:Optional[BaseException] = None
+        self._closed = False
+        self._threads = [threading.Thread(target=self._drain, name=f'cdf-writer-{i}', daemon=True) for i in range(self.writer_threads)]
+        for thread in self._threads:
+            thread.start()
+
+    def encode(self, participant_id:str, record:dict):
+        return self.writer.encode(participant_id, record)
+
+    def write_encoded(self, participant_id:str, payload) -> None:
+        self._raise_writer_error()
+        self._queue.put((participant_id, payload))
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        #the wrapped writer may still have buffered data to write (e.g., the last bundle)
+        close_start = time.perf_counter()
+        self.writer.close()
+        self.stats.add(0, 0, time.perf_counter() - close_start)
+        self._raise_writer_error()
+
+    def _drain(self) -> None:
+        while True:
+            wait_start = time.perf_counter()
+            item = self._queue.get()
+            write_start = time.perf_counter()
+            if item is None:
+                self.stats.add(0, 0, 0.0, write_start - wait_start)
+                return
+            if self._error is not None:
+                #an error already happened: keep draining the queue so that the producer does not block
+                continue
+            participant_id, payload = item
+            try:
+                self.writer.write_encoded(participant_id, payload)
+            except BaseException as e:
+                self._error = e
+            self.stats.add(1, payload_size(payload), time.perf_counter() - write_start, write_start - wait_start)
+
+    def _raise_writer_error(self) -> None:
+        if self._error is not None:
+            raise self._error
+
+
+def merge_records(existing:dict, record:dict) -> dict:
+    """An existing record updated with the variables and assessments of a (partial) record."""
+    merged:Dict[str,dict] = {variable: dict(assessments) for variable, assessments in existing.items()}
+    for variable, assessments in record.items():
+        merged.setdefault(variable, {}).update(assessments)
+    return merged
+
+
+class MergingWriter(OutputWriter):
+    """
+    Merges the generated records into the records already on the output of the wrapped writer (e.g., when
+    only some variables or assessments are generated again), instead of replacing them. Participants
+    without a previous record get the generated one.
+    """
+
+    def __init__(self, writer:OutputWriter):
+        if not writer.readable:
+            raise TypeError(f"Records cannot be merged into the output of {type(writer).__name__}: it cannot read back its records "
+                            f"(formats {MERGEABLE_OUTPUT_FORMATS} can)")
+        self.writer = writer
+        self.max_writer_threads = writer.max_writer_threads
+        self.readable = writer.readable
+        self.merged = 0
+
+    def encode(self, participant_id:str, record:dict):
+        existing = self.writer.read(participant_id)
+        if existing is not None:
+            record = merge_records(existing, record)
+            self.merged += 1
+        return self.writer.encode(participant_id, record)
+
+    def write_encoded(self, participant_id:str, payload) -> None:
+        self.writer.write_encoded(participant_id, payload)
+
+    def read(self, participant_id:str) -> Optional[dict]:
+        return self.writer.read(participant_id)
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+def output_file_prefix(base_name:str, shard_suffix:Optional[str]=None) -> str:
+    return f'{base_name}-{shard_suffix}' if shard_suffix else base_name
+
+
+def create_output_writer(output_format:str, output_folder:str, serializer:Optional[Serializer]=None,
+                         bundle_size:int=DEFAULT_BUNDLE_SIZE, buffer_bytes:int=DEFAULT_BUFFER_BYTES, shard_suffix:Optional[str]=None,
+                         codec:Optional[Codec]=None, **format_options) -> OutputWriter:
+    """
+    Writer for the given output format. shard_suffix is added to the names of the files shared by several
+    participants (bundles, Parquet files, stores), so that the shards of a run can use the same output folder.
+    """
+    if output_format == 'json':
+        return JSONFileWriter(output_folder, serializer, codec=codec)
+    elif output_format == 'jsonl':
+        return JSONBundleWriter(output_folder, serializer, bundle_size=bundle_size, buffer_bytes=buffer_bytes,
+                                prefix=output_file_prefix('bundle', shard_suffix), codec=codec, **format_options)
+    elif output_format == 'parquet':
+        from .parquet_output import ParquetWriter
+        return ParquetWriter(output_folder, prefix=output_file_prefix('cdf', shard_suffix), **format_options)
+    elif output_format == 'sqlite':
+        from .cdfstore import SQLiteStoreWriter
+        return SQLiteStoreWriter(os.path.join(output_folder, output_file_prefix('cdf', shard_suffix) + '.sqlite'), serializer, **format_options)
+    else:
+        raise ValueError(f"Unsupported output format '{output_format}'")
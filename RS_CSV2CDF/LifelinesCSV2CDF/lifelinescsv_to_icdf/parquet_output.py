@@ -0,0 +1,83 @@
+import os
+from typing import Dict, List, Tuple
+from .output_writers import OutputWriter
+from .sharding import participant_hash
+
+
+#Default number of hash partitions (sub-folders) of the Parquet output
+DEFAULT_PARQUET_PARTITIONS = 16
+
+#Default number of rows (participant, variable, assessment) per row group. With ~150 values per
+#participant it is about 850 participants: small enough to skip most of a file when filtering by
+#project_pseudo_id, and large enough for efficient sequential reads.
+DEFAULT_PARQUET_ROW_GROUP_SIZE = 131072
+
+
+class ParquetWriter(OutputWriter):
+    """
+    Writes the CDF records as a long (tidy) table with the columns project_pseudo_id, variable,
+    assessment and value, partitioned by a hash of the participant id:
+
+        <output folder>/pid_bucket=00007/<prefix>.parquet
+
+    Rows are buffered per partition and written as row groups sorted by project_pseudo_id. When the
+    participants are generated in id order (cdfgenerator sorts them for this format), the row groups of
+    a partition cover disjoint id ranges, so their min/max statistics can be used for predicate pushdown.
+    Requires pyarrow.
+    """
+
+    def __init__(self, output_folder:str, partitions:int=DEFAULT_PARQUET_PARTITIONS,
+                 row_group_size:int=DEFAULT_PARQUET_ROW_GROUP_SIZE, prefix:str='cdf'):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError('The Parquet output format requires pyarrow (pip install pyarrow)')
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self.schema = pyarrow.schema([('project_pseudo_id', pyarrow.string()), ('variable', pyarrow.string()),
+                                      ('assessment', pyarrow.string()), ('value', pyarrow.string())])
+        self.output_folder = output_folder
+        self.partitions = partitions
+        self.row_group_size = row_group_size
+        self.prefix = prefix
+        self.bundle_paths:List[str] = []
+        self._buffers:Dict[int,List[Tuple[str,str,str,str]]] = {}
+        self._writers:Dict[int,object] = {}
+
+    def partition_path(self, partition:int) -> str:
+        return os.path.join(self.output_folder, f'pid_bucket={partition:05d}', f'{self.prefix}.parquet')
+
+    def encode(self, participant_id:str, record:dict) -> List[Tuple[str,str,str,str]]:
+        return [(participant_id, variable, assessment, value)
+                for variable, assessments in record.items() if variable != 'project_pseudo_id'
+                for assessment, value in assessments.items()]
+
+    def write_encoded(self, participant_id:str, payload:List[Tuple[str,str,str,str]]) -> None:
+        partition = participant_hash(participant_id) % self.partitions
+        buffer = self._buffers.setdefault(partition, [])
+        buffer.extend(payload)
+        if len(buffer) >= self.row_group_size:
+            self._write_row_group(partition)
+
+    def close(self) -> None:
+        for partition in list(self._buffers.keys()):
+            self._write_row_group(partition)
+        for writer in self._writers.values():
+            writer.close()
+        self._writers = {}
+
+    def _write_row_group(self, partition:int) -> None:
+        rows = self._buffers.pop(partition, [])
+        if not rows:
+            return
+        rows.sort(key=lambda row: row[0])
+        table = self._pa.Table.from_arrays([self._pa.array(column, type=self._pa.string()) for column in zip(*rows)], schema=self.schema)
+
+        if partition not in self._writers:
+            path = self.partition_path(partition)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.bundle_paths.append(path)
+            self._writers[partition] = self._pq.ParquetWriter(path, self.schema, compression='zstd',
+                                                              use_dictionary=['variable', 'assessment', 'value'])
+        self._writers[partition].write_table(table, row_group_size=len(rows))
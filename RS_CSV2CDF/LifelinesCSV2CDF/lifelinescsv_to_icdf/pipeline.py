@@ -0,0 +1,206 @@
+import concurrent.futures
+import hashlib
+import json
+import logging
+import os
+import subprocess
+import time
+from typing import Dict, List, Optional
+
+
+#Runner of pipelines of command-line stages (see rs_pipeline.py for the Rotterdam Study pipeline). Each
+#stage declares the files it reads and writes; a stage depends on the stages that write its inputs, and
+#stages whose dependencies are done run concurrently. A stage is skipped when its command and the content
+#of its inputs are the same as on its last successful run, and its outputs still exist.
+#Outputs ending with a path separator are folders, created before the stage runs.
+
+STATE_FILE = 'pipeline-state.json'
+REPORT_FILE = 'pipeline-report.json'
+
+#chunk size used when hashing the inputs
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class Stage:
+
+    def __init__(self, name:str, command:List[str], inputs:List[str], outputs:List[str], cwd:Optional[str]=None):
+        self.name = name
+        self.command = command
+        self.inputs = inputs
+        self.outputs = outputs
+        self.cwd = cwd
+
+
+class PipelineError(Exception):
+    pass
+
+
+def content_hash(path:str) -> str:
+    """sha256 of a file, or of the relative paths and contents of all the files in a folder."""
+    digest = hashlib.sha256()
+    if os.path.isdir(path):
+        for folder, subfolders, files in os.walk(path):
+            subfolders.sort()
+            for file in sorted(files):
+                file_path = os.path.join(folder, file)
+                digest.update(os.path.relpath(file_path, path).encode('utf-8'))
+                digest.update(content_hash(file_path).encode('ascii'))
+    else:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def stage_fingerprint(stage:Stage) -> str:
+    digest = hashlib.sha256(json.dumps([stage.command, stage.cwd]).encode('utf-8'))
+    for path in stage.inputs:
+        if not os.path.exists(path):
+            raise PipelineError(f"Input '{path}' of stage '{stage.name}' does not exist")
+        digest.update(path.encode('utf-8'))
+        digest.update(content_hash(path).encode('ascii'))
+    return digest.hexdigest()
+
+
+def run_command(command:List[str], cwd:Optional[str]=None) -> Dict[str,float]:
+    """Run a command, returning its exit code, wall time and peak resident memory (MB, when available)."""
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=cwd)
+    peak_rss_mb = float('nan')
+    if hasattr(os, 'wait4'):
+        _, status, rusage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        #ru_maxrss is given in KB on Linux
+        peak_rss_mb = rusage.ru_maxrss / 1024
+    else:
+        process.wait()
+    return {'returncode': process.returncode, 'seconds': time.perf_counter() - start, 'peak_rss_mb': peak_rss_mb}
+
+
+class Pipeline:
+
+    def __init__(self, stages:List[Stage], state_folder:str, max_parallel:Optional[int]=None):
+        names = [stage.name for stage in stages]
+        if len(set(names)) < len(names):
+            raise PipelineError(f'Duplicated stage names: {names}')
+        self.stages = {stage.name: stage for stage in stages}
+        self.state_folder = state_folder
+        self.max_parallel = max_parallel or len(stages) or 1
+        self.dependencies = self._dependencies()
+
+    def _dependencies(self) -> Dict[str,List[str]]:
+        writers:Dict[str,str] = {}
+        for stage in self.stages.values():
+            for output in stage.outputs:
+                output = os.path.normpath(os.path.abspath(output))
+                if output in writers:
+                    raise PipelineError(f"'{output}' is written by the stages '{writers[output]}' and '{stage.name}'")
+                writers[output] = stage.name
+        dependencies = {name: [] for name in self.stages}
+        for stage in self.stages.values():
+            for path in stage.inputs:
+                writer = writers.get(os.path.normpath(os.path.abspath(path)))
+                if writer == stage.name:
+                    raise PipelineError(f"Stage '{stage.name}' reads its own output '{path}'")
+                if writer is not None and writer not in dependencies[stage.name]:
+                    dependencies[stage.name].append(writer)
+        self._check_acyclic(dependencies)
+        return dependencies
+
+    @staticmethod
+    def _check_acyclic(dependencies:Dict[str,List[str]]) -> None:
+        visiting, visited = set(), set()
+
+        def visit(name:str):
+            if name in visited:
+                return
+            if name in visiting:
+                raise PipelineError(f"Cyclic dependency involving stage '{name}'")
+            visiting.add(name)
+            for dependency in dependencies[name]:
+                visit(dependency)
+            visiting.discard(name)
+            visited.add(name)
+
+        for name in dependencies:
+            visit(name)
+
+    def _load_state(self) -> dict:
+        path = os.path.join(self.state_folder, STATE_FILE)
+        if not os.path.isfile(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    def _save_state(self, state:dict) -> None:
+        with open(os.path.join(self.state_folder, STATE_FILE), 'w') as f:
+            json.dump(state, f, indent=4)
+
+    def _run_stage(self, stage:Stage, previous_fingerprint:Optional[str], force:bool) -> dict:
+        fingerprint = stage_fingerprint(stage)
+        if not force and fingerprint == previous_fingerprint and all(os.path.exists(output) for output in stage.outputs):
+            logging.info(f"Stage '{stage.name}': inputs unchanged, skipped")
+            return {'status': 'skipped', 'fingerprint': fingerprint, 'seconds': 0.0, 'peak_rss_mb': float('nan')}
+
+        for output in stage.outputs:
+            folder = output if output.endswith(os.sep) else os.path.dirname(output)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+        logging.info(f"Stage '{stage.name}': running {' '.join(stage.command)}")
+        result = run_command(stage.command, stage.cwd)
+        missing = [output for output in stage.outputs if not os.path.exists(output)]
+        if result['returncode'] != 0 or missing:
+            logging.error(f"Stage '{stage.name}' failed (exit code {result['returncode']}, missing outputs: {missing})")
+            return {'status': 'failed', 'fingerprint': None, **result}
+        return {'status': 'ran', 'fingerprint': fingerprint, **result}
+
+    def run(self, force:bool=False) -> Dict[str,dict]:
+        """
+        Run the pipeline. Returns the result of every stage (status 'ran', 'skipped', 'failed' or 'blocked'
+        when a dependency failed), which is also saved on the report file of the state folder.
+        """
+        os.makedirs(self.state_folder, exist_ok=True)
+        state = self._load_state()
+        results:Dict[str,dict] = {}
+        pending = list(self.stages)
+        running:Dict[concurrent.futures.Future,str] = {}
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_parallel) as executor:
+            while pending or running:
+                for name in list(pending):
+                    statuses = [results.get(dependency, {}).get('status') for dependency in self.dependencies[name]]
+                    if any(status in ('failed', 'blocked') for status in statuses):
+                        results[name] = {'status': 'blocked', 'seconds': 0.0, 'peak_rss_mb': float('nan')}
+                        pending.remove(name)
+                    elif all(status in ('ran', 'skipped') for status in statuses):
+                        running[executor.submit(self._run_stage, self.stages[name], state.get(name), force)] = name
+                        pending.remove(name)
+                if not running:
+                    continue
+
+                done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                    except PipelineError as e:
+                        logging.error(str(e))
+                        results[name] = {'status': 'failed', 'seconds': 0.0, 'peak_rss_mb': float('nan')}
+                    if results[name]['status'] in ('ran', 'skipped'):
+                        state[name] = results[name]['fingerprint']
+                    else:
+                        state.pop(name, None)
+                    self._save_state(state)
+
+        results = {name: results[name] for name in self.stages}
+        with open(os.path.join(self.state_folder, REPORT_FILE), 'w') as f:
+            json.dump(results, f, indent=4)
+        return results
+
+
+def format_report(results:Dict[str,dict]) -> str:
+    """Table with the status, time and peak memory of every stage."""
+    lines = [f"{'stage':24}{'status':>10}{'seconds':>12}{'peak RSS (MB)':>16}"]
+    for name, result in results.items():
+        lines.append(f"{name:24}{result['status']:>10}{result['seconds']:12.2f}{result['peak_rss_mb']:16.1f}")
+    return '\n'.join(lines)
@@ -0,0 +1,57 @@
+from __future__ import annotations
+import csv
+from typing import Dict, FrozenSet, List
+from .lazy_imports import lazy_import
+from .mmapstore import MMapDatafile
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+
+class ParticipantPresence:
+    """
+    Pre-join of the participant ids with the index of every loaded datafile: a (participants x files)
+    boolean matrix telling whether each participant has at least one row on each file. Computed once,
+    with vectorized index look-ups, before the generation starts.
+    """
+
+    def __init__(self, ids:List[str], data_frames:Dict[str,pd.core.frame.DataFrame]):
+        self.ids = ids
+        self.files = list(data_frames.keys())
+        ids_index = pd.Index(ids)
+        self.matrix = np.zeros((len(ids), len(self.files)), dtype=bool)
+        for column, file in enumerate(self.files):
+            if isinstance(data_frames[file], MMapDatafile):
+                #binary searches on the mapped ids, instead of materializing the index of the store
+                self.matrix[:, column] = data_frames[file].contains(ids)
+            else:
+                self.matrix[:, column] = ids_index.isin(data_frames[file].index)
+
+        self._rows = {pid: row for row, pid in enumerate(ids)}
+        self._present_files_cache:Dict[bytes,FrozenSet[str]] = {}
+
+    def present_files(self, participant_id:str) -> FrozenSet[str]:
+        """Files that have rows for the given participant."""
+        row = self.matrix[self._rows[participant_id]]
+        #participants share a handful of distinct presence patterns, so the sets are reused
+        key = row.tobytes()
+        if key not in self._present_files_cache:
+            self._present_files_cache[key] = frozenset(file for file, present in zip(self.files, row) if present)
+        return self._present_files_cache[key]
+
+    def summary(self) -> dict:
+        present_per_file = self.matrix.sum(axis=0)
+        return {
+            'participants': len(self.ids),
+            'participants_in_no_file': int((~self.matrix.any(axis=1)).sum()) if self.files else len(self.ids),
+            'files': {file: {'present': int(present_per_file[column]), 'absent': len(self.ids) - int(present_per_file[column])}
+                      for column, file in enumerate(self.files)},
+        }
+
+    def write_coverage_matrix(self, path:str) -> None:
+        """CSV with one row per participant, and one 1/0 (present/absent) column per file."""
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['project_pseudo_id'] + self.files)
+            for pid, row in zip(self.ids, self.matrix.astype(np.uint8).tolist()):
+                writer.writerow([pid] + row)
@@ -0,0 +1,134 @@
+from __future__ import annotations
+import logging
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set
+from .lazy_imports import lazy_import
+
+pd = lazy_import('pandas')
+
+
+#QA summary of a run, kept while the records are generated (so that the output does not have to be read
+#again afterwards) and written to _run_metadata/qa.json (qa-shard-<i>-of-<N>.json on sharded runs, merged
+#by merge_shards.py):
+# - variables: number (and rate) of records with a non-missing value, per variable and assessment
+# - missing_rows: participants without rows on each datafile
+# - missing_codes: frequency of the missing-data codes ($X) on the rows of the participants, per datafile
+#   and variable
+#The counters are plain (key -> count) Counters, so summaries of different workers or shards are merged by
+#adding them up. The datafile counters are only available with the pandas backend: the datafiles whose
+#codes could not be counted are listed on missing_codes_unavailable.
+
+
+class QASummary:
+
+    def __init__(self, schema:Optional[Dict[str,List[str]]]=None):
+        self.records = 0
+        #(variable, assessment) -> records with a non-missing value
+        self.non_missing:Counter = Counter()
+        if schema is not None:
+            for variable, assessments in schema.items():
+                for assessment in assessments:
+                    self.non_missing[(variable, assessment)] += 0
+        self.participants_checked = 0
+        #datafile -> participants without rows on it
+        self.missing_rows:Counter = Counter()
+        #(datafile, variable, code) -> rows
+        self.missing_codes:Counter = Counter()
+        #datafiles whose codes were not counted (not loaded as pandas frames)
+        self.missing_codes_unavailable:Set[str] = set()
+
+    def add(self, record:dict) -> None:
+        """Count the values of a generated record."""
+        self.records += 1
+        non_missing = self.non_missing
+        for variable, assessments in record.items():
+            for assessment, value in assessments.items():
+                if value != '':
+                    non_missing[(variable, assessment)] += 1
+
+    def add_presence(self, presence) -> None:
+        """Count the participants without rows on each datafile (see prejoin.ParticipantPresence)."""
+        coverage = presence.summary()
+        self.participants_checked += coverage['participants']
+        for file, file_coverage in coverage['files'].items():
+            self.missing_rows[file] += file_coverage['absent']
+
+    def add_missing_codes(self, data_frames:dict, ids:Iterable[str]) -> None:
+        """
+        Count the missing-data codes on the rows of the given participants of the (pandas) datafiles. The
+        rows are selected with a boolean mask, so only the coded values are copied, not the datafiles.
+        """
+        ids_index = pd.Index(list(ids))
+        unavailable = []
+        for file, data_frame in data_frames.items():
+            if not isinstance(data_frame, pd.DataFrame):
+                unavailable.append(file)
+                continue
+            participant_rows = data_frame.index.isin(ids_index)
+            for variable in data_frame.columns:
+                column = data_frame[variable]
+                #typed (parquet) columns have no codes
+                if not pd.api.types.is_string_dtype(column.dtype):
+                    continue
+                codes = column[participant_rows & column.str.startswith('$', na=False).to_numpy()].value_counts()
+                for code, count in codes.items():
+                    self.missing_codes[(file, variable, code)] += int(count)
+        if unavailable:
+            self.set_missing_codes_unavailable(unavailable, 'the datafiles are not pandas frames')
+
+    def set_missing_codes_unavailable(self, files:Iterable[str], reason:str) -> None:
+        """Record that the missing-data codes of the given datafiles are not counted."""
+        files = sorted(files)
+        logging.warning(f"Missing-data codes are not counted on the QA summary ({reason}): {files}")
+        self.missing_codes_unavailable.update(files)
+
+    def merge(self, other:QASummary) -> QASummary:
+        self.records += other.records
+        self.non_missing.update(other.non_missing)
+        self.participants_checked += other.participants_checked
+        self.missing_rows.update(other.missing_rows)
+        self.missing_codes.update(other.missing_codes)
+        self.missing_codes_unavailable.update(other.missing_codes_unavailable)
+        return self
+
+    def to_dict(self) -> dict:
+        variables:Dict[str,dict] = {}
+        for (variable, assessment), count in self.non_missing.items():
+            variables.setdefault(variable, {})[assessment] = {
+                'non_missing': count, 'rate': count / self.records if self.records else None}
+        missing_codes:Dict[str,dict] = {}
+        for (file, variable, code), count in sorted(self.missing_codes.items()):
+            missing_codes.setdefault(file, {}).setdefault(variable, {})[code] = count
+        return {
+            'records': self.records,
+            'variables': variables,
+            'participants_checked': self.participants_checked,
+            'missing_rows': {file: {'participants': count, 'rate': count / self.participants_checked if self.participants_checked else None}
+                             for file, count in self.missing_rows.items()},
+            'missing_codes': missing_codes,
+            'missing_codes_unavailable': sorted(self.missing_codes_unavailable),
+        }
+
+    @classmethod
+    def from_dict(cls, content:dict) -> QASummary:
+        summary = cls()
+        summary.records = content['records']
+        for variable, assessments in content['variables'].items():
+            for assessment, counts in assessments.items():
+                summary.non_missing[(variable, assessment)] += counts['non_missing']
+        summary.participants_checked = content['participants_checked']
+        for file, counts in content['missing_rows'].items():
+            summary.missing_rows[file] += counts['participants']
+        for file, variables in content['missing_codes'].items():
+            for variable, codes in variables.items():
+                for code, count in codes.items():
+                    summary.missing_codes[(file, variable, code)] += count
+        summary.missing_codes_unavailable.update(content.get('missing_codes_unavailable', []))
+        return summary
+
+
+def merge_qa_summaries(summaries:List[dict]) -> dict:
+    merged = QASummary()
+    for summary in summaries:
+        merged.merge(QASummary.from_dict(summary))
+    return merged.to_dict()
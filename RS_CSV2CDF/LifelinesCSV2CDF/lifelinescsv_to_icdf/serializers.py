@@ -0,0 +1,80 @@
+import json
+import logging
+from abc import ABC, abstractmethod
+from typing import Dict
+
+
+#Serializers turn a CDF record (nested dict of strings) into the bytes written on the output files, in
+#the key order of the record (i.e., the order of the variables in the configuration file). There are two
+#encodings:
+# - standard (default): the bytes written by json.dump with its default settings (', '/': ' separators,
+#   non-ASCII characters as \uXXXX escapes), i.e., the same files as the original generator.
+# - compact (opt-in, --compact-json): no whitespace and UTF-8 without ASCII escaping (the output of orjson).
+#All the serializers of an encoding produce exactly the same bytes for the same record, so the output does
+#not depend on which encoder happens to be installed on the node.
+
+ENCODINGS = ['standard','compact']
+
+
+class Serializer(ABC):
+    name = 'base'
+    compact = False
+
+    @abstractmethod
+    def dumps(self, record:dict) -> bytes:
+        """Encoded record."""
+
+
+class JSONSerializer(Serializer):
+    """Standard-library encoder (both encodings). The compact one matches the output of orjson byte by byte."""
+    name = 'json'
+
+    def __init__(self, compact:bool=False):
+        self.compact = compact
+        self._encoder = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False) if compact else json.JSONEncoder()
+
+    def dumps(self, record:dict) -> bytes:
+        return self._encoder.encode(record).encode('utf-8')
+
+
+class OrjsonSerializer(Serializer):
+    """orjson-based encoder (optional dependency, compact encoding only)."""
+    name = 'orjson'
+    compact = True
+
+    def __init__(self):
+        import orjson
+        self._dumps = orjson.dumps
+
+    def dumps(self, record:dict) -> bytes:
+        return self._dumps(record)
+
+
+SERIALIZERS:Dict[str,type] = {
+    'json': JSONSerializer,
+    'orjson': OrjsonSerializer,
+}
+
+
+def get_serializer(name:str='auto', compact:bool=False) -> Serializer:
+    """
+    Return the serializer with the given name for the standard or the compact encoding. 'auto' picks
+    the fastest encoder installed for the encoding, falling back to the standard library json module.
+    """
+    if name == 'auto':
+        if not compact:
+            return JSONSerializer()
+        try:
+            return OrjsonSerializer()
+        except ImportError:
+            logging.debug('orjson is not installed, using the standard json serializer')
+            return JSONSerializer(compact=True)
+
+    if name not in SERIALIZERS:
+        raise ValueError(f"Unknown serializer '{name}'. Available: {['auto'] + list(SERIALIZERS.keys())}")
+
+    if name == 'orjson':
+        if not compact:
+            raise ValueError("The 'orjson' serializer only writes the compact encoding (use --compact-json)")
+        return OrjsonSerializer()
+    return SERIALIZERS[name](compact)
@@ -0,0 +1,139 @@
+import argparse
+import json
+import logging
+import os
+import sys
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Optional
+from .cdfgenerator import CSV_ENGINES, INDEX_STRATEGIES
+from .output_writers import create_output_writer
+from .serializers import get_serializer
+from .transformation_exceptions import MoreThanOneValueInAssessmentVariants
+from .transformer import CDFTransformer
+
+
+#Local HTTP server keeping the datafiles of a configuration loaded (warm) between requests, so batches of
+#participants can be (re)generated without loading the CSV files again:
+#
+#   python -m lifelinescsv_to_icdf.server config.json --port 8765
+#
+#   GET  /health                                   -> {"status": "ok", "datafiles": N, "load_seconds": S}
+#   POST /generate  {"ids": [...]}                 -> the CDF records, one JSON document per line
+#   POST /write     {"ids": [...], "output_folder": "...", "format": "json"}
+#                                                  -> {"participants": N, "bundles": [...]}
+#
+#Participants with conflicting values on the variants of an assessment get a 422 response (the server keeps
+#running; records already written by a /write request are kept). Requests are handled one at a time. The server listens on the loopback interface by default; it has no
+#authentication, so it should not be exposed to other hosts.
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+
+class BadRequest(Exception):
+    pass
+
+
+class CDFRequestHandler(BaseHTTPRequestHandler):
+
+    #set by create_server
+    transformer:CDFTransformer = None
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._send_json(200,{'status':'ok','datafiles':len(self.transformer.data_frames),'load_seconds':self.transformer.load_seconds})
+        else:
+            self._send_json(404,{'error':f'Unknown path {self.path}'})
+
+    def do_POST(self):
+        try:
+            if self.path == '/generate':
+                self._generate(self._read_request())
+            elif self.path == '/write':
+                self._write(self._read_request())
+            else:
+                self._send_json(404,{'error':f'Unknown path {self.path}'})
+        except BadRequest as e:
+            self._send_json(400,{'error':str(e)})
+        except MoreThanOneValueInAssessmentVariants as e:
+            logging.error(e.message)
+            self._send_json(422,{'error':e.message})
+        except Exception as e:
+            logging.exception(f'Error while processing {self.path}')
+            self._send_json(500,{'error':str(e)})
+
+    def log_message(self, format, *args):
+        logging.info(f'{self.address_string()} {format % args}')
+
+    def _read_request(self) -> dict:
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError as e:
+            raise BadRequest(f'Invalid JSON request: {e}')
+        if not isinstance(request,dict) or not isinstance(request.get('ids'),list):
+            raise BadRequest("The request must be a JSON object with a list of 'ids'")
+        return request
+
+    def _generate(self, request:dict) -> None:
+        serializer = get_serializer()
+        body = b''.join(serializer.dumps(record) + b'\n' for record in self.transformer.generate(request['ids']))
+        self._send(200,'application/x-ndjson',body)
+
+    def _write(self, request:dict) -> None:
+        output_folder = request.get('output_folder')
+        if not output_folder or not os.path.isdir(output_folder):
+            raise BadRequest(f"The output folder '{output_folder}' does not exist")
+        try:
+            writer = create_output_writer(request.get('format','json'),output_folder)
+        except ValueError as e:
+            raise BadRequest(str(e))
+        with writer:
+            count = self.transformer.write(request['ids'],writer)
+        bundles = [os.path.relpath(path,output_folder) for path in getattr(writer,'bundle_paths',[])]
+        self._send_json(200,{'participants':count,'bundles':bundles})
+
+    def _send_json(self, status:int, content:dict) -> None:
+        self._send(status,'application/json',json.dumps(content).encode('utf-8'))
+
+    def _send(self, status:int, content_type:str, body:bytes) -> None:
+        self.send_response(status)
+        self.send_header('Content-Type',content_type)
+        self.send_header('Content-Length',str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def create_server(transformer:CDFTransformer, host:str=DEFAULT_HOST, port:int=DEFAULT_PORT) -> HTTPServer:
+    """HTTP server for the given transformer (port 0 picks a free port, see server.server_address)."""
+    handler = type('BoundCDFRequestHandler',(CDFRequestHandler,),{'transformer':transformer})
+    return HTTPServer((host,port),handler)
+
+
+def main(argv:Optional[list]=None):
+    parser = argparse.ArgumentParser(description='Serve CDF records of a configuration from a local HTTP server, keeping its datafiles loaded between requests.')
+    parser.add_argument('config_file', help='Path to the JSON configuration file.')
+    parser.add_argument('--host', default=DEFAULT_HOST, help=f'Interface to listen on (default {DEFAULT_HOST}).')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'Port to listen on (default {DEFAULT_PORT}).')
+    parser.add_argument('--load-threads', type=int, default=None, help='Number of CSV files read concurrently.')
+    parser.add_argument('--csv-engine', choices=CSV_ENGINES, default='auto', help='CSV reader (see cdfgenerator --help).')
+    parser.add_argument('--index', dest='index_strategy', choices=INDEX_STRATEGIES, default='sorted', help='Index of the datafiles (see cdfgenerator --help).')
+    args = parser.parse_args(argv)
+
+    if not os.path.isfile(args.config_file):
+        print(f"The specified file path '{args.config_file}' does not exist.")
+        sys.exit(1)
+
+    transformer = CDFTransformer(args.config_file,load_threads=args.load_threads,csv_engine=args.csv_engine,index_strategy=args.index_strategy)
+    server = create_server(transformer,args.host,args.port)
+    logging.info(f'Serving CDF records on http://{server.server_address[0]}:{server.server_address[1]}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
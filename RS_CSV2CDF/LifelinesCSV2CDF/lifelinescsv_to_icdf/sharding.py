@@ -0,0 +1,103 @@
+import hashlib
+import os
+from typing import Iterable, List, Mapping, NamedTuple, Optional
+
+
+class Shard(NamedTuple):
+    """Zero-based index of a shard, and total number of shards."""
+    index:int
+    count:int
+
+    def __str__(self) -> str:
+        return f'{self.index}/{self.count}'
+
+    @property
+    def suffix(self) -> str:
+        return f'shard-{self.index:03d}-of-{self.count:03d}'
+
+
+def participant_hash(participant_id:str, seed:int=0) -> int:
+    """
+    Stable 64-bit hash of a participant id. Unlike hash(), it does not change between processes or
+    Python versions, so it can be used to partition (or sample) the participants deterministically.
+    """
+    key = seed.to_bytes(8, 'little') if seed else b''
+    digest = hashlib.blake2b(participant_id.encode('utf-8'), digest_size=8, key=key).digest()
+    return int.from_bytes(digest, 'big')
+
+
+def shard_of(participant_id:str, shard_count:int) -> int:
+    return participant_hash(participant_id) % shard_count
+
+
+def select_shard_ids(ids:Iterable[str], shard:Shard) -> List[str]:
+    return [pid for pid in ids if shard_of(pid, shard.count) == shard.index]
+
+
+def sample_ids(ids:Iterable[str], fraction:Optional[float]=None, size:Optional[int]=None, seed:int=0) -> List[str]:
+    """
+    Deterministic sample of the participants, by a hash of their ids with the given seed: those with a
+    hash below fraction * 2^64, or the size participants with the lowest hashes. The same seed always
+    selects the same participants (and, with a fraction, a participant is selected or not regardless of
+    the other ids). The ids keep their order.
+    """
+    ids = list(ids)
+    if fraction is not None:
+        if not 0 < fraction <= 1:
+            raise ValueError(f'Invalid sample fraction: {fraction}. It must be between 0 and 1')
+        threshold = int(fraction * 2 ** 64)
+        return [pid for pid in ids if participant_hash(pid, seed) < threshold]
+    if size is not None:
+        if size < 0:
+            raise ValueError(f'Invalid sample size: {size}')
+        selected = set(sorted(set(ids), key=lambda pid: (participant_hash(pid, seed), pid))[:size])
+        return [pid for pid in ids if pid in selected]
+    return ids
+
+
+def sample_name(fraction:Optional[float]=None, size:Optional[int]=None, seed:int=0) -> str:
+    """Name of the output folder of a sample, e.g. sample-0.01-seed-0 or sample-n1000-seed-0."""
+    return f"sample-{fraction if fraction is not None else f'n{size}'}-seed-{seed}"
+
+
+def parse_shard(value:str) -> Shard:
+    """Parse a 'i/N' shard specification (0 <= i < N)."""
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise ValueError(f"Invalid shard '{value}'. Expected <index>/<count>, e.g., 0/16")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid shard '{value}'. The index must be between 0 and {count-1}")
+    return Shard(index, count)
+
+
+def shard_from_environment(environ:Mapping[str,str]=os.environ) -> Optional[Shard]:
+    """
+    Shard of the current SLURM array task, if any: the position of the task on the array, out of
+    SLURM_ARRAY_TASK_COUNT shards. The array must be a range, so --array=0-15, --array=1-16 and
+    --array=0-30:2 all result in the shards 0/16 ... 15/16. Arrays that are not (e.g., --array=1,3,7)
+    would leave some participants in no shard, and raise ValueError.
+    """
+    if 'SLURM_ARRAY_TASK_ID' not in environ:
+        return None
+
+    def variable(name:str, default:Optional[int]=None) -> int:
+        if name not in environ:
+            if default is None:
+                raise ValueError(f"{name} is not set, so the shard of the SLURM array task cannot be derived. Give it with --shard, or use --no-auto-shard")
+            return default
+        try:
+            return int(environ[name])
+        except ValueError:
+            raise ValueError(f"Invalid {name} '{environ[name]}'. Expected an integer")
+
+    task_id = variable('SLURM_ARRAY_TASK_ID')
+    count = variable('SLURM_ARRAY_TASK_COUNT')
+    task_min = variable('SLURM_ARRAY_TASK_MIN', 0)
+    step = variable('SLURM_ARRAY_TASK_STEP', 1)
+    task_max = variable('SLURM_ARRAY_TASK_MAX', task_min + (count - 1) * step)
+    position, offset = divmod(task_id - task_min, step) if step > 0 else (-1, 0)
+    if count < 1 or step < 1 or task_max - task_min != (count - 1) * step or offset != 0 or not 0 <= position < count:
+        raise ValueError(f"The SLURM array ({count} tasks from {task_min} to {task_max}, step {step}) is not a range, so task {task_id} "
+                         f"cannot be mapped to a shard. Use --array=<first>-<last>[:<step>], give the shard with --shard, or use --no-auto-shard")
+    return Shard(position, count)
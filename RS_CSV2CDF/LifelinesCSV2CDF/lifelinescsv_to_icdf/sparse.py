@@ -0,0 +1,50 @@
+from typing import Dict, Iterator, List, Optional
+from .compression import iter_cdf_bundle
+
+
+#Sparse CDF records (--format jsonl --sparse): the assessments with missing values ("") are left out of
+#the records, as well as the variables with no values at all. Instead, every bundle starts with a line
+#with the schema of the records (the variables and assessments of the configuration, see
+#cdfconfig.config_schema):
+#
+#   {"cdf_schema": {"project_pseudo_id": ["a1"], "var1": ["1a", "1b"], ...}}
+#   {"project_pseudo_id": {"a1": "<id>"}, "var1": {"1b": "5"}}
+#   ...
+#
+#iter_dense_bundle reads the bundles back as the usual (dense) records, with "" for the missing values.
+
+SCHEMA_KEY = 'cdf_schema'
+
+
+def sparsify(record:dict) -> dict:
+    sparse_record = {}
+    for variable, assessments in record.items():
+        values = {assessment: value for assessment, value in assessments.items() if value != ''}
+        if values:
+            sparse_record[variable] = values
+    return sparse_record
+
+
+def densify(record:dict, schema:Dict[str,List[str]]) -> dict:
+    """Dense record (every variable and assessment of the schema, in its order) of a sparse record."""
+    return {variable: {assessment: record.get(variable, {}).get(assessment, '') for assessment in assessments}
+            for variable, assessments in schema.items()}
+
+
+def schema_header(schema:Dict[str,List[str]]) -> dict:
+    return {SCHEMA_KEY: schema}
+
+
+def iter_dense_bundle(path:str, dictionary:Optional[bytes]=None) -> Iterator[dict]:
+    """
+    Iterate the records of a (possibly compressed) bundle file as dense records. Bundles written without
+    --sparse (with no schema line) are returned as they are.
+    """
+    schema = None
+    for line_record in iter_cdf_bundle(path, dictionary):
+        if SCHEMA_KEY in line_record and len(line_record) == 1:
+            schema = line_record[SCHEMA_KEY]
+        elif schema is not None:
+            yield densify(line_record, schema)
+        else:
+            yield line_record
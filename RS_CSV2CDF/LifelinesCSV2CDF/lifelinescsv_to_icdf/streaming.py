@@ -0,0 +1,144 @@
+import csv
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from .cdfconfig import datafile_columns
+from .transformation_exceptions import OutOfOrderInputException
+
+
+#Streaming generation (--backend streaming) for datafiles sorted by project_pseudo_id: all the datafiles
+#are read at the same time, row by row, and advanced together (merge join) on the participant ids. The
+#record of a participant is emitted as soon as every file has moved past its id, so only the rows of the
+#current participant of each file are kept in memory. The sort order of every file is checked (a pre-scan
+#of the id column) before the first record is emitted: a file with an id lower than the previous one
+#raises OutOfOrderInputException, and nothing is written.
+#Ids are compared as Python strings (the order of pandas' sort_values and of `sort` with LC_ALL=C).
+#The records are assembled with the helpers of generate_csd (cdfgenerator.empty_record and assessment_value).
+
+
+def check_sort_order(file:str) -> None:
+    """Raise OutOfOrderInputException when the rows of a CSV datafile are not sorted by project_pseudo_id."""
+    with open(file, newline='', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        if 'project_pseudo_id' not in header:
+            raise ValueError(f"Columns ['project_pseudo_id'] not found in {file}")
+        id_position = header.index('project_pseudo_id')
+        previous_id = None
+        for line, row in enumerate(reader, start=2):
+            if not row:
+                continue
+            if previous_id is not None and row[id_position] < previous_id:
+                raise OutOfOrderInputException(file, line, previous_id, row[id_position])
+            previous_id = row[id_position]
+
+
+class SortedDatafileReader:
+    """
+    Reads the given columns of a CSV file sorted by project_pseudo_id, one participant (group of
+    consecutive rows) at a time: participant_id and rows are those of the current participant.
+    """
+
+    def __init__(self, file:str, columns:Set[str]):
+        self.file = file
+        self._f = open(file, newline='', encoding='utf-8-sig')
+        self._reader = csv.reader(self._f)
+        header = next(self._reader, [])
+        missing = set(columns) - set(header)
+        if missing:
+            raise ValueError(f"Columns {sorted(missing)} not found in {file}")
+        self._id_position = header.index('project_pseudo_id')
+        self._positions = {column: header.index(column) for column in columns if column != 'project_pseudo_id'}
+        self._line = 1
+        self._next_row:Optional[Tuple[str,Dict[str,str]]] = self._read_row()
+        self.participant_id:Optional[str] = None
+        self.rows:List[Dict[str,str]] = []
+        self.advance()
+
+    def _read_row(self) -> Optional[Tuple[str,Dict[str,str]]]:
+        for row in self._reader:
+            self._line += 1
+            if not row:
+                continue
+            values = {column: row[position] if position < len(row) else '' for column, position in self._positions.items()}
+            return row[self._id_position], values
+        return None
+
+    def advance(self) -> None:
+        """Move to the next participant (participant_id is None at the end of the file)."""
+        previous_id = self.participant_id
+        if self._next_row is None:
+            self.participant_id, self.rows = None, []
+            return
+        self.participant_id, first_values = self._next_row
+        if previous_id is not None and self.participant_id < previous_id:
+            raise OutOfOrderInputException(self.file, self._line, previous_id, self.participant_id)
+        self.rows = [first_values]
+        while True:
+            self._next_row = self._read_row()
+            if self._next_row is None or self._next_row[0] != self.participant_id:
+                break
+            self.rows.append(self._next_row[1])
+
+    def skip_to(self, participant_id:str) -> None:
+        """Advance until the current participant is participant_id or a later one."""
+        while self.participant_id is not None and self.participant_id < participant_id:
+            self.advance()
+
+    def close(self) -> None:
+        self._f.close()
+
+
+def assemble_record(participant_id:str, config:dict, rows_by_file:Dict[str,List[Dict[str,str]]]) -> dict:
+    #(imported here: cdfgenerator imports this module)
+    from .cdfgenerator import empty_record, assessment_value
+    record = empty_record(participant_id, config)
+    for assessment_variable, var_assessment_files in config.items():
+        if assessment_variable == "project_pseudo_id":
+            continue
+        var_assessments = record[assessment_variable]
+        for varversion in var_assessment_files:
+            assessment_name, assessment_file = list(varversion.items())[0]
+            rows = rows_by_file.get(assessment_file)
+            #no row for the participant in the datafile: reported as missing
+            var_assessments[assessment_name] = assessment_value(assessment_variable, [row[assessment_variable] for row in rows]) if rows else ""
+    return record
+
+
+def stream_records(config:dict, ids:Optional[Iterable[str]]=None) -> Iterator[Tuple[str,dict]]:
+    """
+    (participant id, CDF record) pairs, in id order, of the given participants (sorted in memory), or of
+    all the participants found on the datafiles when ids is None.
+    """
+    files = datafile_columns(config)
+    for file in files:
+        if file.endswith('.parquet'):
+            raise ValueError(f"The streaming backend only reads CSV datafiles ({file})")
+    #(a file found out of order while merging would leave the records emitted so far without its values)
+    for file in files:
+        check_sort_order(file)
+    readers = [SortedDatafileReader(file, columns) for file, columns in files.items()]
+    try:
+        driver = iter(sorted(set(ids))) if ids is not None else None
+        while True:
+            if driver is not None:
+                participant_id = next(driver, None)
+            else:
+                #k-way merge: the lowest current id among the files
+                current_ids = [reader.participant_id for reader in readers if reader.participant_id is not None]
+                participant_id = min(current_ids) if current_ids else None
+            if participant_id is None:
+                break
+
+            rows_by_file = {}
+            for reader in readers:
+                reader.skip_to(participant_id)
+                if reader.participant_id == participant_id:
+                    rows_by_file[reader.file] = reader.rows
+            record = assemble_record(participant_id, config, rows_by_file)
+            #every file moves past the participant before its record is emitted
+            for reader in readers:
+                if reader.participant_id == participant_id:
+                    reader.advance()
+            yield participant_id, record
+    finally:
+        for reader in readers:
+            reader.close()
@@ -8,4 +8,13 @@ class MissingParticipantRowException(Exception):
 class MoreThanOneValueInAssessmentVariants(Exception):
     def __init__(self, message:str):
         self.message = message
-        super().__init__(message)        
\ No newline at end of file
+        super().__init__(message)        
+
+
+class OutOfOrderInputException(Exception):
+    def __init__(self, file:str, line:int, previous_id:str, participant_id:str):
+        self.file = file
+        self.line = line
+        self.previous_id = previous_id
+        self.participant_id = participant_id
+        super().__init__(f"{file} is not sorted by project_pseudo_id: '{participant_id}' (line {line}) comes after '{previous_id}'")
@@ -0,0 +1,58 @@
+from __future__ import annotations
+import logging
+import time
+from typing import Iterable, Iterator, List, Optional, Set, Tuple
+from .cdfconfig import load_config
+from .cdfgenerator import load_and_index_csv_datafiles, generate_csd
+from .output_writers import OutputWriter
+from .prejoin import ParticipantPresence
+
+
+class CDFTransformer:
+    """
+    In-process transformation API: the datafiles required by the configuration are loaded and indexed
+    once, and the records of any number of batches of participants are generated from them:
+
+        transformer = CDFTransformer('config.json')
+        for record in transformer.generate(['id1','id2']):
+            ...
+        with create_output_writer('jsonl','output') as writer:
+            transformer.write(other_ids,writer)
+
+    Participants without rows on the datafiles get records with all the values missing, as with the
+    command-line tool. Unlike the command-line tool, conflicting values on the variants of an assessment
+    raise MoreThanOneValueInAssessmentVariants instead of aborting the process.
+    """
+
+    def __init__(self, config_file_path:str, participant_ids:Optional[Set[str]]=None, load_threads:Optional[int]=None,
+                 csv_engine:str='auto', index_strategy:str='sorted', log_memory:bool=False):
+        self.config_file_path = config_file_path
+        self.config = load_config(config_file_path)
+        load_start_time = time.time()
+        self.data_frames = load_and_index_csv_datafiles(config_file_path,log_memory=log_memory,participant_ids=participant_ids,
+                                                        load_threads=load_threads,csv_engine=csv_engine,index_strategy=index_strategy)
+        self.load_seconds = time.time() - load_start_time
+        logging.info(f"{len(self.data_frames)} datafiles loaded and indexed in {self.load_seconds} seconds.")
+
+    def presence(self, ids:List[str]) -> ParticipantPresence:
+        return ParticipantPresence(ids,self.data_frames)
+
+    def items(self, ids:Iterable[str]) -> Iterator[Tuple[str,dict]]:
+        """(participant id, CDF record) pairs of the given participants, in the given order (duplicated ids are generated once)."""
+        ids = list(dict.fromkeys(ids))
+        presence = self.presence(ids)
+        for participant_id in ids:
+            yield participant_id, generate_csd(participant_id,self.config,self.data_frames,presence.present_files(participant_id),abort_on_conflict=False)
+
+    def generate(self, ids:Iterable[str]) -> Iterator[dict]:
+        """CDF records of the given participants, in the given order."""
+        for _, record in self.items(ids):
+            yield record
+
+    def write(self, ids:Iterable[str], writer:OutputWriter) -> int:
+        """Generate the records of the given participants on the given writer. Returns the number of records."""
+        count = 0
+        for participant_id, record in self.items(ids):
+            writer.write(participant_id,record)
+            count += 1
+        return count
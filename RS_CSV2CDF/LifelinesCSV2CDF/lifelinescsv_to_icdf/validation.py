@@ -0,0 +1,249 @@
+import argparse
+import concurrent.futures
+import glob
+import logging
+import os
+import sys
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple
+from .cdfconfig import PSEUDO_ID_ASSESSMENT, config_schema, load_config
+from .compression import read_cdf_file
+from .manifest import write_metadata
+from .sparse import iter_dense_bundle
+
+
+#Validation of the CDF records against the shape expected by the CDF to FHIR mapping tool: every
+#configured variable (and only those), with exactly the configured assessments, string values, and the
+#participant id as {"project_pseudo_id": {"<id key>": "<id>"}} ("a1" on this generator, "1a" on the
+#records of rs_to_icdf).
+#
+#The configuration is compiled into a Python function specialized for its schema (unrolled checks of the
+#key sets and value types, with no walk over a generic schema), which only says whether a record is valid.
+#The (slow) diagnosis of the violations is done only for the invalid records. The violations are counted
+#per kind and variable/assessment (with a few example participants), and reports can be merged, so
+#validation can run inline in the generator (--validate) or as a parallel pass over an output folder:
+#
+#   python -m lifelinescsv_to_icdf.validation config.json <output folder> --workers 8
+
+#example participants kept per violation
+MAX_EXAMPLES = 5
+
+MISSING_VARIABLE = 'missing_variable'
+UNEXPECTED_VARIABLE = 'unexpected_variable'
+MISSING_ASSESSMENT = 'missing_assessment'
+UNEXPECTED_ASSESSMENT = 'unexpected_assessment'
+INVALID_VALUE = 'invalid_value'
+INVALID_PSEUDO_ID = 'invalid_pseudo_id'
+NOT_AN_OBJECT = 'not_an_object'
+
+Violation = Tuple[str,str]
+
+
+def compile_schema_check(schema:Dict[str,List[str]], id_key:str=PSEUDO_ID_ASSESSMENT) -> Callable[[dict],bool]:
+    """Function telling whether a record has exactly the given schema, generated for that schema."""
+    namespace = {'VARIABLES': frozenset(schema)}
+    checks = ['record.__class__ is dict', 'record.keys() == VARIABLES']
+    for number, (variable, assessments) in enumerate(schema.items()):
+        if variable == 'project_pseudo_id':
+            continue
+        namespace[f'ASSESSMENTS_{number}'] = frozenset(assessments)
+        value_checks = ''.join(f' and a[{assessment!r}].__class__ is str' for assessment in assessments)
+        checks.append(f'(a := record[{variable!r}]).__class__ is dict and a.keys() == ASSESSMENTS_{number}{value_checks}')
+    namespace['ID_KEYS'] = frozenset([id_key])
+    checks.append(f"(a := record['project_pseudo_id']).__class__ is dict and a.keys() == ID_KEYS "
+                  f"and a[{id_key!r}].__class__ is str and a[{id_key!r}] != ''")
+    source = 'def schema_check(record):\n    return (' + '\n            and '.join(checks) + ')\n'
+    exec(compile(source, '<cdf schema check>', 'exec'), namespace)
+    return namespace['schema_check']
+
+
+def diagnose(record, schema:Dict[str,List[str]], id_key:str=PSEUDO_ID_ASSESSMENT) -> List[Violation]:
+    """Violations of a record (generic, slow path)."""
+    if not isinstance(record, dict):
+        return [(NOT_AN_OBJECT, '')]
+    violations:List[Violation] = []
+    for variable in record:
+        if variable not in schema:
+            violations.append((UNEXPECTED_VARIABLE, variable))
+    for variable, assessments in schema.items():
+        if variable not in record:
+            violations.append((MISSING_VARIABLE, variable))
+            continue
+        values = record[variable]
+        if variable == 'project_pseudo_id':
+            if not isinstance(values, dict) or list(values.keys()) != [id_key] or not isinstance(values[id_key], str) or values[id_key] == '':
+                violations.append((INVALID_PSEUDO_ID, f'expected {{"{id_key}": "<id>"}}'))
+            continue
+        if not isinstance(values, dict):
+            violations.append((NOT_AN_OBJECT, variable))
+            continue
+        for assessment in assessments:
+            if assessment not in values:
+                violations.append((MISSING_ASSESSMENT, f'{variable}/{assessment}'))
+            elif not isinstance(values[assessment], str):
+                violations.append((INVALID_VALUE, f'{variable}/{assessment}'))
+        for assessment in values:
+            if assessment not in assessments:
+                violations.append((UNEXPECTED_ASSESSMENT, f'{variable}/{assessment}'))
+    return violations
+
+
+class ValidationReport:
+    """Aggregated violations of a set of records."""
+
+    def __init__(self):
+        self.records = 0
+        self.invalid_records = 0
+        #(kind, variable[/assessment]) -> records
+        self.violations:Counter = Counter()
+        self.examples:Dict[Violation,List[str]] = {}
+
+    def add(self, participant_id:str, violations:List[Violation]) -> None:
+        self.invalid_records += 1
+        for violation in violations:
+            self.violations[violation] += 1
+            examples = self.examples.setdefault(violation, [])
+            if len(examples) < MAX_EXAMPLES:
+                examples.append(participant_id)
+
+    def merge(self, other:'ValidationReport') -> 'ValidationReport':
+        self.records += other.records
+        self.invalid_records += other.invalid_records
+        self.violations.update(other.violations)
+        for violation, examples in other.examples.items():
+            self.examples[violation] = (self.examples.get(violation, []) + examples)[:MAX_EXAMPLES]
+        return self
+
+    def to_dict(self) -> dict:
+        violations:Dict[str,dict] = {}
+        for (kind, target), count in sorted(self.violations.items()):
+            violations.setdefault(kind, {})[target] = {'records': count, 'examples': self.examples.get((kind, target), [])}
+        return {'records': self.records, 'invalid_records': self.invalid_records, 'violations': violations}
+
+    @classmethod
+    def from_dict(cls, content:dict) -> 'ValidationReport':
+        report = cls()
+        report.records = content['records']
+        report.invalid_records = content['invalid_records']
+        for kind, targets in content['violations'].items():
+            for target, violation in targets.items():
+                report.violations[(kind, target)] += violation['records']
+                report.examples[(kind, target)] = list(violation['examples'])
+        return report
+
+    def summary(self) -> str:
+        if self.invalid_records == 0:
+            return f'{self.records} records validated, no violations'
+        kinds = Counter()
+        for (kind, _), count in self.violations.items():
+            kinds[kind] += count
+        return (f'{self.invalid_records} of {self.records} records have violations: '
+                + ', '.join(f'{kind} ({count})' for kind, count in sorted(kinds.items())))
+
+
+class RecordValidator:
+    """
+    Validator of the records of a configuration:
+
+        validator = RecordValidator(config)
+        for participant_id, record in records:
+            validator.validate(participant_id, record)
+        print(validator.report.summary())
+    """
+
+    def __init__(self, config:dict, id_key:str=PSEUDO_ID_ASSESSMENT):
+        self.schema = config_schema(config)
+        self.schema['project_pseudo_id'] = [id_key]
+        self.id_key = id_key
+        self.schema_check = compile_schema_check(self.schema, id_key)
+        self.report = ValidationReport()
+
+    def validate(self, participant_id:str, record) -> bool:
+        self.report.records += 1
+        if self.schema_check(record):
+            return True
+        self.report.add(participant_id, diagnose(record, self.schema, self.id_key))
+        return False
+
+
+def merge_validation_reports(reports:List[dict]) -> dict:
+    merged = ValidationReport()
+    for report in reports:
+        merged.merge(ValidationReport.from_dict(report))
+    return merged.to_dict()
+
+
+def record_participant_id(record, id_key:str) -> str:
+    try:
+        pseudo_id = record['project_pseudo_id']
+        #(under another key on records with an invalid pseudo id)
+        return str(pseudo_id[id_key] if id_key in pseudo_id else next(iter(pseudo_id.values())))
+    except (KeyError, TypeError, AttributeError, StopIteration):
+        return '?'
+
+
+def output_work_units(output_folder:str, files_per_unit:int=1000) -> List[List[str]]:
+    """Files of an output folder, grouped for the validation workers: a bundle per unit, or batches of record files."""
+    bundles = sorted(glob.glob(os.path.join(output_folder, '*.cdf.jsonl*')))
+    record_files = sorted(path for path in glob.glob(os.path.join(output_folder, '*.cdf.json*')) if '.cdf.jsonl' not in path)
+    return [[bundle] for bundle in bundles] + [record_files[start:start + files_per_unit] for start in range(0, len(record_files), files_per_unit)]
+
+
+_worker_validator:Optional[RecordValidator] = None
+
+
+def _init_worker(config:dict, id_key:str) -> None:
+    global _worker_validator
+    #the compiled check cannot be pickled: each worker compiles its own
+    _worker_validator = RecordValidator(config, id_key)
+
+
+def validate_files(paths:List[str]) -> ValidationReport:
+    validator = _worker_validator
+    validator.report = ValidationReport()
+    for path in paths:
+        if '.cdf.jsonl' in os.path.basename(path):
+            for record in iter_dense_bundle(path):
+                validator.validate(record_participant_id(record, validator.id_key), record)
+        else:
+            record = read_cdf_file(path)
+            validator.validate(record_participant_id(record, validator.id_key), record)
+    return validator.report
+
+
+def validate_output(config:dict, output_folder:str, id_key:str=PSEUDO_ID_ASSESSMENT, workers:int=1) -> ValidationReport:
+    """Validate all the records (files and bundles) of an output folder, using workers processes."""
+    units = output_work_units(output_folder)
+    report = ValidationReport()
+    if workers <= 1:
+        _init_worker(config, id_key)
+        for unit in units:
+            report.merge(validate_files(unit))
+        return report
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(config, id_key)) as executor:
+        for unit_report in executor.map(validate_files, units):
+            report.merge(unit_report)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Validate the CDF records of an output folder against the schema of a configuration.')
+    parser.add_argument('config_file', help='Path to the JSON configuration file used to generate the records.')
+    parser.add_argument('output_folder', help='Output folder with the records (json files or jsonl bundles).')
+    parser.add_argument('--id-key', default=PSEUDO_ID_ASSESSMENT, help=f"Key of the participant id on project_pseudo_id (default '{PSEUDO_ID_ASSESSMENT}'; '1a' for the records of rs_to_icdf).")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Number of worker processes (default: the number of CPUs).')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    start = time.perf_counter()
+    report = validate_output(load_config(args.config_file), args.output_folder, args.id_key, args.workers)
+    seconds = time.perf_counter() - start
+    path = write_metadata(args.output_folder, 'validation', report.to_dict())
+    logging.info(f'{report.summary()} ({report.records/max(seconds,1e-9):.0f} records/s). Report written to {path}')
+    if report.invalid_records > 0:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
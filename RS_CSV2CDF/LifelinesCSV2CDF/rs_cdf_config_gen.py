@@ -18,14 +18,17 @@ Notes
 - You can optionally include/exclude specific columns.
 """
 
+from __future__ import annotations
 import argparse
 import csv
 import json
 import os
 import sys
-from typing import List, Set
+from typing import TYPE_CHECKING, List, Set
 
-import pandas as pd
+# pandas is imported in main, once the arguments are valid (not for --help or usage errors)
+if TYPE_CHECKING:
+    import pandas as pd
 
 
 def infer_columns(df: pd.DataFrame,
@@ -111,6 +114,8 @@ def main():
                          "Default: <input_basename>_with_ppid.csv next to input.")
     args = ap.parse_args()
 
+    import pandas as pd
+
     # Read source CSV
     df = pd.read_csv(args.csv, sep=args.sep, encoding=args.encoding, dtype=str)
 
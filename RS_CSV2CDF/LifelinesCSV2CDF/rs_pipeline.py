@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Rotterdam Study pipeline: full RS CSV -> compact CSV -> ids/config -> CDF files [-> FHIR], run with the
+pipeline runner of lifelinescsv_to_icdf.pipeline. Stages whose inputs did not change since their last
+run are skipped, independent stages run concurrently, and a table with the time and peak memory of every
+stage is printed at the end (and saved on <work-dir>/pipeline-report.json).
+
+Usage (from the LifelinesCSV2CDF folder):
+  python rs_pipeline.py \
+      --in /home/hmo/RS_CSV2CDF/data_csv/RS_ergo_tabular_05032023.csv \
+      --codebook /home/hmo/RS_CSV2CDF/data_csv/rs_cvd_variables.xlsx \
+      --work-dir /home/hmo/RS_CSV2CDF/pipeline \
+      [--outcomes] [--mapping-tool /home/hmo/CDF2Medmij-Mapping-tool] [--cdf-args "--format jsonl"]
+
+Work folder layout:
+  compact.csv, compact_with_ppid.csv, ids.csv, config.json   intermediates
+  outcomes.csv                                               with --outcomes
+  cdf/                                                       CDF files
+  fhir/                                                      with --mapping-tool
+"""
+
+import argparse
+import logging
+import os
+import shlex
+import sys
+
+from lifelinescsv_to_icdf.pipeline import Pipeline, Stage, format_report
+
+LIFELINES_FOLDER = os.path.dirname(os.path.abspath(__file__))
+RS_FOLDER = os.path.dirname(LIFELINES_FOLDER)
+
+
+def rs_stages(args) -> list:
+    work = os.path.abspath(args.work_dir)
+    raw = os.path.abspath(args.inp)
+    compact = os.path.join(work, "compact.csv")
+    normalized = os.path.join(work, "compact_with_ppid.csv")
+    ids = os.path.join(work, "ids.csv")
+    config = os.path.join(work, "config.json")
+    cdf = os.path.join(work, "cdf") + os.sep
+
+    compact_script = os.path.join(RS_FOLDER, "rs_fl_variables_csv_gen.py")
+    compact_command = [sys.executable, compact_script, "--in", raw, "--out", compact, "--quiet"]
+    compact_inputs = [raw, compact_script]
+    if args.codebook:
+        compact_command += ["--codebook", os.path.abspath(args.codebook)]
+        compact_inputs.append(os.path.abspath(args.codebook))
+
+    config_script = os.path.join(LIFELINES_FOLDER, "rs_cdf_config_gen.py")
+    stages = [
+        Stage("compact", compact_command, compact_inputs, [compact]),
+        Stage("config",
+              [sys.executable, config_script, "--csv", compact, "--id-col", args.id_col, "--ids-out", ids,
+               "--config-out", config, "--assessment", "a1", "--csv-normalized-out", normalized],
+              [compact, config_script], [ids, config, normalized]),
+        Stage("cdf",
+              [sys.executable, "-m", "lifelinescsv_to_icdf.cdfgenerator", ids, config, cdf] + shlex.split(args.cdf_args),
+              [ids, config, normalized], [cdf], cwd=LIFELINES_FOLDER),
+    ]
+
+    if args.outcomes:
+        outcomes_script = os.path.join(RS_FOLDER, "rs_fl_variables_csv_gen_only_outcomes.py")
+        stages.append(Stage("outcomes", [sys.executable, outcomes_script, "--in", raw, "--out", os.path.join(work, "outcomes.csv")],
+                            [raw, outcomes_script], [os.path.join(work, "outcomes.csv")]))
+
+    if args.mapping_tool:
+        stages.append(Stage("fhir", ["npm", "run", "transform:rotterdam", "--", cdf, os.path.join(work, "fhir") + os.sep],
+                            [cdf], [os.path.join(work, "fhir") + os.sep], cwd=os.path.abspath(args.mapping_tool)))
+    return stages
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    ap = argparse.ArgumentParser(description="Run the RS CSV -> CDF (-> FHIR) pipeline, skipping the stages whose inputs did not change.")
+    ap.add_argument("--in", dest="inp", required=True, help="Path to the full RS CSV.")
+    ap.add_argument("--codebook", default="", help="Path to rs_cvd_variables.xlsx (Sheet2).")
+    ap.add_argument("--work-dir", required=True, help="Folder for the intermediate files, the outputs and the pipeline state.")
+    ap.add_argument("--id-col", default="ergoid", help="ID column of the RS CSV (default ergoid).")
+    ap.add_argument("--outcomes", action="store_true", help="Also generate the compact outcomes CSV (rs_fl_variables_csv_gen_only_outcomes.py).")
+    ap.add_argument("--mapping-tool", default=None, help="Path to CDF2Medmij-Mapping-tool, to also transform the CDF files to FHIR.")
+    ap.add_argument("--cdf-args", default="", help="Additional arguments for the CDF generator, e.g. \"--format jsonl --writer-threads 2\".")
+    ap.add_argument("--max-parallel", type=int, default=None, help="Maximum number of stages running at the same time (default: no limit).")
+    ap.add_argument("--force", action="store_true", help="Run all the stages, even when their inputs did not change.")
+    args = ap.parse_args()
+
+    if not os.path.isfile(args.inp):
+        raise SystemExit(f"[error] Input CSV '{args.inp}' not found.")
+
+    pipeline = Pipeline(rs_stages(args), args.work_dir, max_parallel=args.max_parallel)
+    results = pipeline.run(force=args.force)
+    print(format_report(results))
+    sys.exit(0 if all(result["status"] in ("ran", "skipped") for result in results.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
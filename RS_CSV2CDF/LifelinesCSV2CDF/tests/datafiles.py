@@ -0,0 +1,42 @@
+import unittest
+import os
+import json
+import tempfile
+
+
+class DatafilesTestCase(unittest.TestCase):
+    """
+    Two datafiles (file_a, with assessment variants, and file_b) and the configuration that uses them,
+    written on a temporary folder that is removed after each test. Test cases override the rows of the
+    datafiles (FILE_A, FILE_B) and the variables (datafiles_config) they need.
+    """
+
+    #participantA has two variants on file_a: the first date is used, var1 has a single non-empty value
+    FILE_A = ('project_pseudo_id,variant_id,date,var1,var2\n'
+              'participantB,vr1,2020-1,5,$5\n'
+              'participantA,vr2,2019-3,,\n'
+              'participantA,vr1,2019-4,1,$7\n'
+              'participantC,vr1,2021-1,"a, b",\n')
+    FILE_B = ('project_pseudo_id,var1\n'
+              'participantB,90\nparticipantC,$5\n')
+
+    def datafiles_config(self) -> dict:
+        return {'var1':[{"1a":self.file_a},{'1b':self.file_b}],'var2':[{"1a":self.file_a}],
+                'date':[{"1a":self.file_a}],'variant_id':[{"1a":self.file_a}]}
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.file_a = os.path.join(self.folder.name,'file_a.csv')
+        self.file_b = os.path.join(self.folder.name,'file_b.csv')
+        with open(self.file_a,'w') as f:
+            f.write(self.FILE_A)
+        with open(self.file_b,'w') as f:
+            f.write(self.FILE_B)
+
+        self.config = self.datafiles_config()
+        self.config_path = os.path.join(self.folder.name,'config.json')
+        with open(self.config_path,'w') as f:
+            json.dump(self.config,f)
+
+    def tearDown(self):
+        self.folder.cleanup()
@@ -0,0 +1,31 @@
+import unittest
+import os
+import tempfile
+from lifelinescsv_to_icdf import cdfstore
+from lifelinescsv_to_icdf import output_writers
+
+
+class SQLiteCDFStore(unittest.TestCase):
+
+    def record(self,pid,value='1'):
+        return {'project_pseudo_id':{"a1":pid},'var1':{"1a":value,"1b":""}}
+
+
+    def test_write_and_read_records(self):
+        ids = ['participantC','participantA','participantB']
+        with tempfile.TemporaryDirectory() as output_folder:
+            writer = output_writers.WriteBehindWriter(output_writers.create_output_writer('sqlite',output_folder,batch_size=2))
+            with writer:
+                for pid in ids:
+                    writer.write(pid,self.record(pid))
+                #replaced
+                writer.write('participantA',self.record('participantA','2'))
+
+            with cdfstore.CDFStore(os.path.join(output_folder,'cdf.sqlite')) as store:
+                self.assertEqual(len(store),3)
+                self.assertEqual(store.get('participantB'),self.record('participantB'))
+                self.assertEqual(store['participantA'],self.record('participantA','2'))
+                self.assertIsNone(store.get('participantD'))
+                self.assertNotIn('participantD',store)
+                self.assertEqual(list(store.ids()),sorted(ids))
+                self.assertEqual([pid for pid,_ in store.items(start='participantB')],['participantB','participantC'])
@@ -0,0 +1,57 @@
+import unittest
+import os
+import tempfile
+import importlib.util
+from lifelinescsv_to_icdf import compression
+from lifelinescsv_to_icdf import output_writers
+
+
+class CompressedOutputs(unittest.TestCase):
+
+    config = {'var1':[{"1a":'file_a'},{'1b':'file_b'},{'1c':'file_c'}],
+              'var2':[{"3a":'file_a'},{'3b':'file_b'}]}
+
+    def record(self,pid):
+        return {'project_pseudo_id':{"a1":pid},'var1':{"1a":"1","1b":"","1c":pid},'var2':{"3a":"","3b":"12"}}
+
+    def codecs(self):
+        codecs = ['gzip','zlib']
+        if importlib.util.find_spec('zstandard'):
+            codecs.append('zstd')
+        return codecs
+
+
+    def test_per_participant_files_round_trip(self):
+        dictionary = compression.build_preset_dictionary(self.config)
+        for codec_name in self.codecs():
+            with tempfile.TemporaryDirectory() as output_folder:
+                compression.write_preset_dictionary(output_folder,dictionary)
+                with output_writers.JSONFileWriter(output_folder,codec=compression.get_codec(codec_name,dictionary)) as writer:
+                    writer.write('participantA',self.record('participantA'))
+
+                path = os.path.join(output_folder,'participantA.cdf.json'+compression.CODECS[codec_name].extension)
+                #the dictionary is found next to the output
+                self.assertEqual(compression.read_cdf_file(path),self.record('participantA'),codec_name)
+
+
+    def test_bundles_round_trip(self):
+        dictionary = compression.build_preset_dictionary(self.config)
+        ids = [f'participant{i}' for i in range(250)]
+        for codec_name in self.codecs():
+            with tempfile.TemporaryDirectory() as output_folder:
+                codec = compression.get_codec(codec_name,dictionary)
+                with output_writers.JSONBundleWriter(output_folder,bundle_size=100,codec=codec) as writer:
+                    for pid in ids:
+                        writer.write(pid,self.record(pid))
+
+                records = [record for path in writer.bundle_paths for record in compression.iter_cdf_bundle(path,dictionary)]
+                self.assertEqual(records,[self.record(pid) for pid in ids],codec_name)
+
+
+    def test_preset_dictionary_improves_small_records(self):
+        dictionary = compression.build_preset_dictionary(self.config)
+        data = output_writers.JSONFileWriter('.').encode('participantA',self.record('participantA'))
+
+        with_dictionary = compression.get_codec('zlib',dictionary).compress(data)
+        without_dictionary = compression.get_codec('zlib').compress(data)
+        self.assertLess(len(with_dictionary),len(without_dictionary))
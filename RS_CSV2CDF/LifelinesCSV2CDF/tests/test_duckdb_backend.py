@@ -0,0 +1,38 @@
+import unittest
+import importlib.util
+from lifelinescsv_to_icdf import cdfgenerator
+from lifelinescsv_to_icdf.transformation_exceptions import MoreThanOneValueInAssessmentVariants
+from tests.datafiles import DatafilesTestCase
+
+
+@unittest.skipUnless(importlib.util.find_spec('duckdb'),'duckdb is not installed')
+class DuckDBExecutionBackend(DatafilesTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.ids = ['participantC','participantA','participantD','participantB']
+
+
+    def test_same_records_as_generate_csd(self):
+        from lifelinescsv_to_icdf.duckdb_backend import DuckDBBackend
+        data_frames = cdfgenerator.load_and_index_csv_datafiles(self.config_path)
+        backend = DuckDBBackend(self.config,fetch_size=2)
+        items = list(backend.items(self.ids))
+        backend.close()
+
+        self.assertEqual([pid for pid,_ in items],self.ids)
+        for pid, record in items:
+            self.assertEqual(record,cdfgenerator.generate_csd(pid,self.config,data_frames),pid)
+        self.assertEqual(dict(items)['participantA'],
+                         {'project_pseudo_id':{'a1':'participantA'},'var1':{'1a':'1','1b':''},'var2':{'1a':'$7'},
+                          'date':{'1a':'2019-3'},'variant_id':{'1a':'vr2'}})
+
+
+    def test_several_values_on_variants(self):
+        from lifelinescsv_to_icdf.duckdb_backend import DuckDBBackend
+        with open(self.file_a,'a') as f:
+            f.write('participantB,vr2,2020-2,6,\n')
+        backend = DuckDBBackend(self.config)
+        with self.assertRaises(MoreThanOneValueInAssessmentVariants):
+            list(backend.items(self.ids))
+        backend.close()
@@ -0,0 +1,71 @@
+import unittest
+import io
+import os
+import json
+import tempfile
+from lifelinescsv_to_icdf import fingerprint
+from lifelinescsv_to_icdf.manifest import write_metadata
+
+
+class RunFingerprints(unittest.TestCase):
+
+    records = {f'participant{i}':{'project_pseudo_id':{'a1':f'participant{i}'},'var1':{'1a':str(i),'1b':''}} for i in range(100)}
+
+    def run_fingerprint(self,participant_ids,buckets=16):
+        run = fingerprint.RunFingerprint(buckets)
+        for pid in participant_ids:
+            run.add(pid,self.records[pid])
+        return run.to_dict()
+
+
+    def test_independent_of_the_order_and_the_key_order(self):
+        ids = list(self.records)
+        expected = self.run_fingerprint(ids)
+        self.assertEqual(self.run_fingerprint(list(reversed(ids))),expected)
+        self.assertEqual(expected['records'],100)
+
+        reordered = {'var1':{'1b':'','1a':'0'},'project_pseudo_id':{'a1':'participant0'}}
+        self.assertEqual(fingerprint.record_hash(reordered),fingerprint.record_hash(self.records['participant0']))
+
+
+    def test_merged_shards_give_the_run_fingerprint(self):
+        ids = list(self.records)
+        shards = [self.run_fingerprint(ids[:30]),self.run_fingerprint(ids[30:]),self.run_fingerprint([])]
+        self.assertEqual(fingerprint.merge_fingerprints(shards),self.run_fingerprint(ids))
+
+
+    def test_differing_participants(self):
+        ids = list(self.records)
+        record_hashes = io.StringIO()
+        run = fingerprint.RunFingerprint(16,record_hashes)
+        for pid in ids:
+            run.add(pid,self.records[pid])
+        run_a = run.to_dict()
+
+        changed = dict(self.records)
+        changed['participant7'] = {'project_pseudo_id':{'a1':'participant7'},'var1':{'1a':'7','1b':'x'}}
+        with tempfile.TemporaryDirectory() as output_b:
+            run_b = fingerprint.RunFingerprint(16)
+            for pid in ids[:-1]:
+                run_b.add(pid,changed[pid])
+                with open(os.path.join(output_b,f'{pid}.cdf.json'),'w') as f:
+                    json.dump(changed[pid],f)
+            write_metadata(output_b,'fingerprint',run_b.to_dict())
+            run_b = fingerprint.load_run_fingerprint(output_b)
+
+            self.assertNotEqual(run_a['root'],run_b['root'])
+            buckets = set(fingerprint.differing_buckets(run_a,run_b))
+            self.assertEqual(buckets,{fingerprint.bucket_of('participant7',16),fingerprint.bucket_of('participant99',16)})
+
+            hashes_a = {pid:digest for pid, digest in (line.split('\t') for line in record_hashes.getvalue().splitlines())
+                        if fingerprint.bucket_of(pid,16) in buckets}
+            hashes_b = fingerprint.output_record_hashes(output_b,buckets,16)
+            self.assertEqual(fingerprint.differing_participants(hashes_a,hashes_b),['participant7','participant99'])
+            self.assertEqual(fingerprint.compare_participants(output_b,output_b,buckets,16),[])
+
+            #an output without record hashes nor per-participant files (e.g., 'jsonl' bundles) cannot be compared
+            with tempfile.TemporaryDirectory() as output_c:
+                with open(os.path.join(output_c,'bundle-00000.cdf.jsonl'),'w') as f:
+                    f.write(json.dumps(changed['participant7'])+'\n')
+                self.assertIsNone(fingerprint.output_record_hashes(output_c,buckets,16))
+                self.assertIsNone(fingerprint.compare_participants(output_b,output_c,buckets,16))
@@ -0,0 +1,105 @@
+import os
+import sys
+import json
+import subprocess
+import importlib.util
+from lifelinescsv_to_icdf import cdfgenerator
+from tests.datafiles import DatafilesTestCase
+
+
+class DatafilesLoading(DatafilesTestCase):
+
+    FILE_A = ('project_pseudo_id,variant_id,var1,var2,unused\n'
+              'participantB,vr1,"5,1",$5,x\n'
+              'participantA,vr1,,NA,x\n'
+              'participantA,vr2,1,,x\n')
+    FILE_B = ('project_pseudo_id,var1\n'
+              'participantC,90\n')
+
+    def datafiles_config(self):
+        return {'var1':[{"1a":self.file_a},{'1b':self.file_b}],'var2':[{"1a":self.file_a}]}
+
+    def test_concurrent_loading_in_a_fresh_interpreter(self):
+        #the reader threads are the first users of pandas (a lazy module) when nothing was imported before
+        config = {}
+        for i in range(8):
+            path = os.path.join(self.folder.name,f'file_{i}.csv')
+            with open(path,'w') as f:
+                f.write(f'project_pseudo_id,var{i}\nparticipantA,{i}\n')
+            config[f'var{i}'] = [{'1a':path}]
+        config_path = os.path.join(self.folder.name,'config8.json')
+        with open(config_path,'w') as f:
+            json.dump(config,f)
+
+        code = ('import sys\nfrom lifelinescsv_to_icdf import cdfgenerator\n'
+                f'data_frames = cdfgenerator.load_and_index_csv_datafiles({config_path!r},csv_engine="pandas",load_threads=8)\n'
+                'sys.exit(0 if len(data_frames) == 8 else 1)\n')
+        package_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        result = subprocess.run([sys.executable,'-c',code],cwd=package_folder,capture_output=True,text=True)
+        self.assertEqual(result.returncode,0,result.stderr[-2000:])
+
+
+    def engines(self):
+        return ['pandas','arrow'] if importlib.util.find_spec('pyarrow') else ['pandas']
+
+
+    def test_readers_give_the_same_values(self):
+        columns = {'project_pseudo_id','var1','var2'}
+        expected = cdfgenerator.read_csv_datafile(self.file_a,columns,csv_engine='pandas')
+        for engine in self.engines():
+            data_frame = cdfgenerator.read_csv_datafile(self.file_a,columns,csv_engine=engine)
+            self.assertEqual(sorted(data_frame.columns),sorted(columns),engine)
+            #empty values and 'NA' are kept as strings
+            self.assertEqual(data_frame[sorted(columns)].values.tolist(),expected[sorted(columns)].values.tolist(),engine)
+            self.assertEqual(data_frame['var2'].tolist(),['$5','NA',''],engine)
+
+            filtered = cdfgenerator.read_csv_datafile(self.file_a,columns,{'participantA'},csv_engine=engine)
+            self.assertEqual(filtered['project_pseudo_id'].tolist(),['participantA','participantA'],engine)
+
+
+    def test_concurrent_loading(self):
+        for engine in self.engines():
+            data_frames = cdfgenerator.load_and_index_csv_datafiles(self.config_path,load_threads=2,csv_engine=engine)
+            self.assertEqual(set(data_frames.keys()),{self.file_a,self.file_b})
+            self.assertEqual(cdfgenerator.generate_csd('participantA',self.config,data_frames),
+                             {'project_pseudo_id':{'a1':'participantA'},'var1':{'1a':'1','1b':''},'var2':{'1a':'NA'}})
+            self.assertEqual(cdfgenerator.generate_csd('participantB',self.config,data_frames),
+                             {'project_pseudo_id':{'a1':'participantB'},'var1':{'1a':'5,1','1b':''},'var2':{'1a':''}})
+
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            cdfgenerator.load_and_index_csv_datafiles(self.config_path,csv_engine='polars')
+
+
+    def test_index_strategies(self):
+        expected = None
+        for strategy in cdfgenerator.INDEX_STRATEGIES:
+            data_frames = cdfgenerator.load_and_index_csv_datafiles(self.config_path,index_strategy=strategy)
+            records = [cdfgenerator.generate_csd(pid,self.config,data_frames) for pid in ['participantA','participantB','participantC']]
+            expected = expected or records
+            self.assertEqual(records,expected,strategy)
+
+        #sorted index: stable, the rows of a participant keep the order of the file
+        data_frames = cdfgenerator.load_and_index_csv_datafiles(self.config_path,index_strategy='sorted')
+        self.assertTrue(data_frames[self.file_a].index.is_monotonic_increasing)
+        self.assertEqual(data_frames[self.file_a].loc['participantA']['var1'].tolist(),['','1'])
+
+        with self.assertRaises(ValueError):
+            cdfgenerator.load_and_index_csv_datafiles(self.config_path,index_strategy='btree')
+
+
+    def test_projection_of_the_configuration(self):
+        from lifelinescsv_to_icdf.cdfconfig import select_config
+        selected = select_config(self.config,variables=['var1'],assessments=['1b'])
+        self.assertEqual(selected,{'var1':[{'1b':self.file_b}]})
+        #file_a is no longer referenced, so it is not read
+        data_frames = cdfgenerator.load_and_index_csv_datafiles(self.config_path,config=selected)
+        self.assertEqual(list(data_frames.keys()),[self.file_b])
+        self.assertEqual(cdfgenerator.generate_csd('participantC',selected,data_frames),
+                         {'project_pseudo_id':{'a1':'participantC'},'var1':{'1b':'90'}})
+
+        with self.assertRaises(ValueError):
+            select_config(self.config,variables=['var3'])
+        with self.assertRaises(ValueError):
+            select_config(self.config,assessments=['2a'])
@@ -0,0 +1,73 @@
+import os
+from lifelinescsv_to_icdf import cdfgenerator
+from lifelinescsv_to_icdf import mmapstore
+from lifelinescsv_to_icdf.prejoin import ParticipantPresence
+from lifelinescsv_to_icdf.transformation_exceptions import MissingParticipantRowException
+from tests.datafiles import DatafilesTestCase
+
+
+class MemoryMappedStore(DatafilesTestCase):
+
+    FILE_A = ('project_pseudo_id,variant_id,var1\n'
+              'participantB,vr1,5\nparticipantA,vr1,\nparticipantA,vr2,1\nparticipantÄ,vr1,ü\n')
+
+    def datafiles_config(self):
+        return {'var1':[{"1a":self.file_a},{'1b':self.file_b}],'variant_id':[{"1a":self.file_a}]}
+
+    def setUp(self):
+        super().setUp()
+        self.store_folder = os.path.join(self.folder.name,'store')
+        self.ids = ['participantA','participantB','participantC','participantD','participantÄ']
+
+    def load(self):
+        return cdfgenerator.load_and_index_csv_datafiles(self.config_path)
+
+
+    def test_same_records_as_the_frames(self):
+        data_frames = self.load()
+        store = mmapstore.open_or_build_store(self.store_folder,self.config_path,self.load)
+        self.assertEqual(store[self.file_a].lookup('participantB','var1'),'5')
+        self.assertEqual(store[self.file_a].lookup('participantA','var1').tolist(),['','1'])
+        with self.assertRaises(MissingParticipantRowException):
+            store[self.file_b].lookup('participantA','var1')
+
+        frames_presence = ParticipantPresence(self.ids,data_frames)
+        store_presence = ParticipantPresence(self.ids,store)
+        for pid in self.ids:
+            self.assertEqual(cdfgenerator.generate_csd(pid,self.config,store,store_presence.present_files(pid)),
+                             cdfgenerator.generate_csd(pid,self.config,data_frames,frames_presence.present_files(pid)),pid)
+        for datafile in store.values():
+            datafile.close()
+
+
+    def test_contains_without_the_index(self):
+        store = mmapstore.open_or_build_store(self.store_folder,self.config_path,self.load)
+        self.assertFalse(hasattr(store[self.file_a],'index'))
+        #merge pass (as many participants as rows)
+        self.assertEqual(store[self.file_a].contains(self.ids),[True,True,False,False,True])
+        self.assertEqual(store[self.file_b].contains(self.ids[::-1]),[False,False,True,True,False])
+        #binary searches (a single participant)
+        self.assertEqual(store[self.file_a].contains(['participantÄ']),[True])
+        self.assertEqual(store[self.file_b].contains(['participantA']),[False])
+        self.assertEqual(store[self.file_b].contains([]),[])
+        for datafile in store.values():
+            datafile.close()
+
+
+    def test_rebuilt_when_a_datafile_changes(self):
+        required_columns = {self.file_a:{'project_pseudo_id','var1','variant_id'},self.file_b:{'project_pseudo_id','var1'}}
+        self.assertEqual(sorted(mmapstore.stale_datafiles(self.store_folder,required_columns)),sorted(required_columns))
+        mmapstore.open_or_build_store(self.store_folder,self.config_path,self.load)
+        self.assertEqual(mmapstore.stale_datafiles(self.store_folder,required_columns),[])
+
+        with open(self.file_b,'a') as f:
+            f.write('participantD,7\n')
+        os.utime(self.file_b,ns=(0,0))
+        self.assertEqual(mmapstore.stale_datafiles(self.store_folder,required_columns),[self.file_b])
+
+        store = mmapstore.open_or_build_store(self.store_folder,self.config_path,self.load)
+        self.assertEqual(store[self.file_b].lookup('participantD','var1'),'7')
+        #columns not on the store
+        self.assertEqual(mmapstore.stale_datafiles(self.store_folder,{self.file_b:{'project_pseudo_id','var2'}}),[self.file_b])
+        for datafile in store.values():
+            datafile.close()
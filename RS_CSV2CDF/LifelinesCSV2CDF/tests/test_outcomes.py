@@ -0,0 +1,148 @@
+import unittest
+import os
+import io
+import contextlib
+import importlib.util
+import pandas as pd
+
+
+def load_rs_outcomes():
+    path = os.path.join(os.path.dirname(__file__),'..','..','rs_fl_variables_csv_gen_only_outcomes.py')
+    spec = importlib.util.spec_from_file_location('rs_fl_variables_csv_gen_only_outcomes',path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class RSOutcomes(unittest.TestCase):
+
+    #one participant per case: the survival columns of every outcome are checked against a row-wise reference
+    ROWS = [
+        #MI before censoring (death)
+        {'ergoid':'1','date_int_cen':'1995-01-01','prev_MI':'0','prev_CVATIA':'0','prev_HF':'0','inc_MI':'1','enddat_MI':'2000-01-01',
+         'stroke_date':'','inc_hf_2018':'0','enddat_hf':'2004-01-01','fp_mortdat':'2005-01-01','fp_censordate':'2012-01-01','fp_date_lastcontact':''},
+        #no event: censored on the earliest of death, overall censoring and last contact
+        {'ergoid':'2','date_int_cen':'1995-01-01','prev_MI':'nee','prev_CVATIA':'nee','prev_HF':'nee','inc_MI':'nee','enddat_MI':'2010-01-01',
+         'stroke_date':'','inc_hf_2018':'no','enddat_hf':'2010-01-01','fp_mortdat':'','fp_censordate':'2012-01-01','fp_date_lastcontact':'2011-06-30'},
+        #HF dated before baseline: negative follow-up, left empty
+        {'ergoid':'3','date_int_cen':'2000-01-01','prev_MI':'0','prev_CVATIA':'0','prev_HF':'0','inc_MI':'0','enddat_MI':'2010-01-01',
+         'stroke_date':'','inc_hf_2018':'ja','enddat_hf':'1999-01-01','fp_mortdat':'','fp_censordate':'2012-01-01','fp_date_lastcontact':''},
+        #missing baseline: the stroke is incident, but no follow-up time can be computed
+        {'ergoid':'4','date_int_cen':'','prev_MI':'0','prev_CVATIA':'0','prev_HF':'0','inc_MI':'0','enddat_MI':'',
+         'stroke_date':'2001-01-01','inc_hf_2018':'0','enddat_hf':'','fp_mortdat':'','fp_censordate':'2012-01-01','fp_date_lastcontact':''},
+        #MI without an event date
+        {'ergoid':'5','date_int_cen':'1995-01-01','prev_MI':'0','prev_CVATIA':'0','prev_HF':'0','inc_MI':'1','enddat_MI':'',
+         'stroke_date':'','inc_hf_2018':'','enddat_hf':'','fp_mortdat':'','fp_censordate':'2012-01-01','fp_date_lastcontact':''},
+        #prevalent stroke/TIA: a later stroke is not incident
+        {'ergoid':'6','date_int_cen':'1995-01-01','prev_MI':'0','prev_CVATIA':'1','prev_HF':'0','inc_MI':'0','enddat_MI':'2012-01-01',
+         'stroke_date':'2003-05-01','inc_hf_2018':'0','enddat_hf':'2012-01-01','fp_mortdat':'','fp_censordate':'2012-01-01','fp_date_lastcontact':''},
+        #stroke before baseline
+        {'ergoid':'7','date_int_cen':'1995-01-01','prev_MI':'0','prev_CVATIA':'0','prev_HF':'0','inc_MI':'0','enddat_MI':'2012-01-01',
+         'stroke_date':'1994-05-01','inc_hf_2018':'0','enddat_hf':'2012-01-01','fp_mortdat':'','fp_censordate':'2012-01-01','fp_date_lastcontact':''},
+        #stroke and HF: the composite takes the earliest
+        {'ergoid':'8','date_int_cen':'1995-01-01','prev_MI':'0','prev_CVATIA':'0','prev_HF':'0','inc_MI':'0','enddat_MI':'2012-01-01',
+         'stroke_date':'2006-02-03','inc_hf_2018':'1','enddat_hf':'2004-07-08','fp_mortdat':'','fp_censordate':'2012-01-01','fp_date_lastcontact':''},
+        #no censoring dates
+        {'ergoid':'9','date_int_cen':'1995-01-01','prev_MI':'0','prev_CVATIA':'0','prev_HF':'0','inc_MI':'0','enddat_MI':'',
+         'stroke_date':'','inc_hf_2018':'0','enddat_hf':'','fp_mortdat':'','fp_censordate':'','fp_date_lastcontact':''},
+    ]
+
+    def setUp(self):
+        self.rs = load_rs_outcomes()
+        self.df = pd.DataFrame(self.ROWS,dtype=str)
+        with contextlib.redirect_stdout(io.StringIO()) as self.log:
+            self.out = self.rs.transform_df(self.df,self.rs.COLUMN_NAMES).set_index('ergoid')
+
+    def reference(self, row:dict) -> dict:
+        """Row-wise derivation (as before the vectorized rewrite), with prevalent stroke/TIA excluded."""
+        def date(value):
+            return pd.Timestamp(value) if value else None
+        def flag(value):
+            return bool(self.rs.to_bool(value))
+        baseline = date(row['date_int_cen'])
+        stroke = date(row['stroke_date'])
+        events = {
+            'mi': (flag(row['inc_MI']),date(row['enddat_MI'])),
+            'stroke': (stroke is not None and (baseline is None or stroke > baseline) and not flag(row['prev_CVATIA']),stroke),
+            'hf': (flag(row['inc_hf_2018']),date(row['enddat_hf'])),
+        }
+        events = {name: (event,event_date if event else None) for name,(event,event_date) in events.items()}
+        dates = [event_date for _,event_date in events.values() if event_date is not None]
+        events['cvd'] = (any(event for event,_ in events.values()),min(dates) if dates else None)
+        censor_dates = [date(row[c]) for c in ['fp_mortdat','fp_censordate','fp_date_lastcontact'] if row[c]]
+        censor = min(censor_dates) if censor_dates else None
+
+        expected = {}
+        for name,(event,event_date) in events.items():
+            end = event_date if event else censor
+            days = (end - baseline).days if end is not None and baseline is not None else None
+            if days is not None and days < 0:
+                days = None
+            expected[name] = {'event':int(event),'end':end.date() if end is not None else None,'days':days,
+                              'years':round(days / 365.25,4) if days is not None else None}
+        return expected
+
+    def observed(self, ergoid:str, name:str) -> dict:
+        row = self.out.loc[ergoid]
+        def value(v):
+            return None if pd.isna(v) else v
+        return {'event':int(row[f'{name}_event']),'end':value(row[f'{name}_followup_end']),
+                'days':None if pd.isna(row[f'{name}_followup_days']) else int(row[f'{name}_followup_days']),
+                'years':value(row[f'{name}_followup_years'])}
+
+
+    def test_same_as_row_wise_derivation(self):
+        for row in self.ROWS:
+            for name,expected in self.reference(row).items():
+                self.assertEqual(self.observed(row['ergoid'],name),expected,(row['ergoid'],name))
+
+    def test_event_before_censoring(self):
+        self.assertEqual(self.observed('1','mi'),{'event':1,'end':pd.Timestamp('2000-01-01').date(),'days':1826,'years':4.9993})
+        #the other outcomes are censored on the death date
+        self.assertEqual(self.observed('1','hf')['end'],pd.Timestamp('2005-01-01').date())
+        self.assertEqual(self.observed('1','hf')['event'],0)
+
+    def test_censoring_without_event(self):
+        for name in ['mi','stroke','hf','cvd']:
+            self.assertEqual(self.observed('2',name),{'event':0,'end':pd.Timestamp('2011-06-30').date(),'days':6024,'years':16.4928})
+        self.assertEqual(self.observed('9','cvd'),{'event':0,'end':None,'days':None,'years':None})
+
+    def test_event_before_baseline(self):
+        self.assertEqual(self.observed('3','hf'),{'event':1,'end':pd.Timestamp('1999-01-01').date(),'days':None,'years':None})
+        self.assertIn('[WARN] hf: 1 follow-up times before baseline set to missing',self.log.getvalue())
+        self.assertIn('[WARN] cvd: 1 follow-up times before baseline set to missing',self.log.getvalue())
+
+    def test_missing_dates(self):
+        self.assertTrue(self.out.loc['4','incident_stroke'])
+        self.assertEqual(self.observed('4','stroke'),{'event':1,'end':pd.Timestamp('2001-01-01').date(),'days':None,'years':None})
+        self.assertEqual(self.observed('4','mi'),{'event':0,'end':pd.Timestamp('2012-01-01').date(),'days':None,'years':None})
+        self.assertEqual(self.observed('5','mi'),{'event':1,'end':None,'days':None,'years':None})
+        self.assertTrue(pd.isna(self.out.loc['5','incident_cvd_date']))
+
+    def test_incident_stroke(self):
+        self.assertEqual(self.out['incident_stroke'].to_dict(),
+                         {'1':False,'2':False,'3':False,'4':True,'5':False,'6':False,'7':False,'8':True,'9':False})
+        #prevalent stroke/TIA: the rule used to keep it (~ on the object flags is always truthy)
+        self.assertTrue(pd.isna(self.out.loc['6','incident_stroke_date']))
+        self.assertEqual(self.observed('6','stroke')['event'],0)
+
+    def test_composite(self):
+        self.assertTrue(self.out.loc['8','incident_cvd_composite'])
+        self.assertEqual(self.out.loc['8','incident_cvd_date'],pd.Timestamp('2004-07-08').date())
+        self.assertEqual(self.observed('8','cvd')['days'],(pd.Timestamp('2004-07-08') - pd.Timestamp('1995-01-01')).days)
+
+    def test_survival_columns_counts_negative_times(self):
+        index = pd.RangeIndex(3)
+        baseline = pd.Series(pd.to_datetime(['2000-01-01','2000-01-01',None]),index=index)
+        event = pd.Series([True,False,None],index=index,dtype=object)
+        event_date = pd.Series(pd.to_datetime(['1999-12-31','2001-01-01','2001-01-01']),index=index)
+        censor_date = pd.Series(pd.to_datetime(['2010-01-01','2000-07-01','2010-01-01']),index=index)
+        survival, negative = self.rs.survival_columns(baseline,event,event_date,censor_date,'x')
+        self.assertEqual(negative,1)
+        self.assertEqual(survival['x_event'].tolist(),[1,0,0])
+        self.assertEqual(survival['x_followup_days'].isna().tolist(),[True,False,True])
+        self.assertEqual(survival.loc[1,'x_followup_days'],182)
+
+
+if __name__ == '__main__':
+    unittest.main()
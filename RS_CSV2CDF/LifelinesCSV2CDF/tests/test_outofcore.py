@@ -0,0 +1,51 @@
+import os
+import json
+from lifelinescsv_to_icdf import cdfgenerator
+from lifelinescsv_to_icdf.outofcore import OutOfCoreBackend, file_config
+from tests.datafiles import DatafilesTestCase
+
+
+class FileAtATimeGeneration(DatafilesTestCase):
+
+    FILE_A = ('project_pseudo_id,variant_id,date,var1,var2\n'
+              'participantB,vr1,2020-1,5,$5\n'
+              'participantA,vr2,2019-3,,\n'
+              'participantA,vr1,2019-4,1,$7\n'
+              'participantÄ,vr1,2021-1,"a, b",\n')
+    FILE_B = ('project_pseudo_id,var1,var3\n'
+              'participantB,90,x\nparticipantC,$5,y\n')
+
+    def datafiles_config(self):
+        return {'var1':[{"1a":self.file_a},{'1b':self.file_b}],'var2':[{"1a":self.file_a}],
+                'var3':[{"1b":self.file_b}],'date':[{"1a":self.file_a}],'variant_id':[{"1a":self.file_a}]}
+
+    def setUp(self):
+        super().setUp()
+        self.spill_directory = os.path.join(self.folder.name,'spill')
+        os.makedirs(self.spill_directory)
+        self.loaded = []
+
+    def load_datafile(self,file,columns,participant_ids):
+        self.loaded.append(file)
+        return cdfgenerator.index_datafile(cdfgenerator.read_csv_datafile(file,columns,participant_ids))
+
+
+    def test_same_records_as_generate_csd(self):
+        data_frames = cdfgenerator.load_and_index_csv_datafiles(self.config_path)
+        backend = OutOfCoreBackend(self.config,self.load_datafile,spill_directory=self.spill_directory)
+        ids = ['participantD','participantÄ','participantB','participantA','participantC']
+        items = list(backend.items(ids))
+
+        self.assertEqual([pid for pid,_ in items],sorted(ids))
+        for pid, record in items:
+            expected = cdfgenerator.generate_csd(pid,self.config,data_frames)
+            self.assertEqual(record,expected,pid)
+            #same order of variables and assessments
+            self.assertEqual(json.dumps(record),json.dumps(expected),pid)
+        self.assertEqual(self.loaded,[self.file_a,self.file_b])
+        #the fragments are removed
+        self.assertEqual(os.listdir(self.spill_directory),[])
+
+
+    def test_file_config(self):
+        self.assertEqual(file_config(self.config,self.file_b),{'var1':[{'1b':self.file_b}],'var3':[{'1b':self.file_b}]})
@@ -0,0 +1,112 @@
+import unittest
+import os
+import sys
+import json
+import subprocess
+import tempfile
+from lifelinescsv_to_icdf import serializers
+from lifelinescsv_to_icdf import output_writers
+
+
+class OutputWriters(unittest.TestCase):
+
+    record = {
+        'project_pseudo_id':{"a1":'participantA'},
+        'var1':{"1a":"1","1b":"","1c":"café \"quoted\""},
+        'var2':{"3a":"2","3b":"12","3c":"\n"}
+    }
+
+    def test_serializers_produce_the_same_bytes(self):
+        #default: the bytes of json.dump (the original output)
+        expected = json.dumps(self.record).encode('utf-8')
+        self.assertEqual(serializers.get_serializer('json').dumps(self.record),expected)
+        self.assertEqual(serializers.get_serializer('auto').dumps(self.record),expected)
+        self.assertRaises(ValueError,serializers.get_serializer,'orjson')
+
+        expected = json.dumps(self.record,separators=(',',':'),ensure_ascii=False).encode('utf-8')
+        self.assertEqual(serializers.get_serializer('json',compact=True).dumps(self.record),expected)
+        try:
+            self.assertEqual(serializers.get_serializer('orjson',compact=True).dumps(self.record),expected)
+        except ImportError:
+            pass
+        self.assertEqual(serializers.get_serializer('auto',compact=True).dumps(self.record),expected)
+
+
+    def test_file_writer_writes_each_record_at_once(self):
+        with tempfile.TemporaryDirectory() as output_folder:
+            with output_writers.JSONFileWriter(output_folder) as writer:
+                writer.write('participantA',self.record)
+                self.assertEqual(os.listdir(output_folder),['participantA.cdf.json'])
+                writer.write('participantB',self.record)
+
+            self.assertEqual(sorted(os.listdir(output_folder)),['participantA.cdf.json','participantB.cdf.json'])
+            with open(os.path.join(output_folder,'participantA.cdf.json')) as f:
+                self.assertEqual(json.load(f),self.record)
+
+
+    def test_bundle_writer_splits_records_in_bundles(self):
+        with tempfile.TemporaryDirectory() as output_folder:
+            with output_writers.JSONBundleWriter(output_folder,bundle_size=2) as writer:
+                for pid in ['p1','p2','p3']:
+                    writer.write(pid,self.record)
+
+            self.assertEqual(sorted(os.listdir(output_folder)),['bundle-00000.cdf.jsonl','bundle-00001.cdf.jsonl'])
+            with open(os.path.join(output_folder,'bundle-00000.cdf.jsonl')) as f:
+                lines = f.read().splitlines()
+            self.assertEqual([json.loads(line) for line in lines],[self.record,self.record])
+
+
+    def test_write_behind_writer_writes_all_records(self):
+        with tempfile.TemporaryDirectory() as output_folder:
+            writer = output_writers.WriteBehindWriter(output_writers.JSONFileWriter(output_folder),writer_threads=4,queue_size=2)
+            with writer:
+                for i in range(50):
+                    writer.write(f'p{i}',self.record)
+
+            self.assertEqual(len(os.listdir(output_folder)),50)
+            self.assertEqual(writer.stats.records,50)
+
+
+    def test_write_behind_writer_reports_writer_errors(self):
+        writer = output_writers.WriteBehindWriter(output_writers.JSONFileWriter('/nonexistent-folder'))
+        writer.write('participantA',self.record)
+        with self.assertRaises(FileNotFoundError):
+            writer.close()
+
+
+    def test_merging_writer_updates_existing_records(self):
+        from lifelinescsv_to_icdf.cdfstore import CDFStore
+        update = {'project_pseudo_id':{"a1":'participantA'},'var2':{"3b":"13"},'var3':{"1a":"x"}}
+        expected = {'project_pseudo_id':{"a1":'participantA'},
+                    'var1':{"1a":"1","1b":"","1c":"café \"quoted\""},
+                    'var2':{"3a":"2","3b":"13","3c":"\n"},'var3':{"1a":"x"}}
+        with tempfile.TemporaryDirectory() as output_folder:
+            for output_format in ['json','sqlite']:
+                with output_writers.create_output_writer(output_format,output_folder) as writer:
+                    writer.write('participantA',self.record)
+                with output_writers.MergingWriter(output_writers.create_output_writer(output_format,output_folder)) as writer:
+                    writer.write('participantA',update)
+                    writer.write('participantB',update)
+                    self.assertEqual(writer.merged,1)
+
+                if output_format == 'json':
+                    with open(os.path.join(output_folder,'participantA.cdf.json')) as f:
+                        self.assertEqual(json.load(f),expected)
+                else:
+                    with CDFStore(os.path.join(output_folder,'cdf.sqlite')) as store:
+                        self.assertEqual(store['participantA'],expected)
+                        self.assertEqual(store['participantB'],update)
+
+        with self.assertRaises(TypeError):
+            output_writers.MergingWriter(output_writers.JSONBundleWriter(output_folder))
+
+
+    def test_unsupported_options_rejected_when_parsing(self):
+        package_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        for options, message in [(['--format','jsonl','--merge-existing'],'--merge-existing'),(['--sparse'],'--sparse'),
+                                 (['--format','sqlite','--compression','zlib'],'--compression')]:
+            #(rejected before the ids and configuration files are read)
+            result = subprocess.run([sys.executable,'-m','lifelinescsv_to_icdf.cdfgenerator','ids.csv','config.json','output']+options,
+                                    cwd=package_folder,capture_output=True,text=True)
+            self.assertEqual(result.returncode,2,options)
+            self.assertIn(message,result.stderr)
@@ -0,0 +1,35 @@
+import unittest
+import tempfile
+import importlib.util
+from lifelinescsv_to_icdf import parquet_output
+
+
+@unittest.skipUnless(importlib.util.find_spec('pyarrow'),'pyarrow is not installed')
+class ParquetOutput(unittest.TestCase):
+
+    def record(self,pid):
+        return {'project_pseudo_id':{"a1":pid},'var1':{"1a":pid+"-1","1b":""},'var2':{"3a":"2"}}
+
+
+    def test_long_table_partitioned_by_participant(self):
+        import pyarrow.parquet as pq
+
+        ids = sorted(f'participant{i:03d}' for i in range(200))
+        with tempfile.TemporaryDirectory() as output_folder:
+            with parquet_output.ParquetWriter(output_folder,partitions=4,row_group_size=30) as writer:
+                for pid in ids:
+                    writer.write(pid,self.record(pid))
+
+            self.assertEqual(len(writer.bundle_paths),4)
+            table = pq.read_table(output_folder)
+            self.assertEqual(table.num_rows,200*3)
+
+            selected = pq.read_table(output_folder,filters=[('project_pseudo_id','=','participant042')]).to_pylist()
+            self.assertEqual(sorted((row['variable'],row['assessment'],row['value']) for row in selected),
+                             [('var1','1a','participant042-1'),('var1','1b',''),('var2','3a','2')])
+
+            #row groups are sorted, and cover disjoint ranges of ids
+            metadata = pq.ParquetFile(writer.bundle_paths[0]).metadata
+            ranges = [(metadata.row_group(i).column(0).statistics.min,metadata.row_group(i).column(0).statistics.max) for i in range(metadata.num_row_groups)]
+            self.assertGreater(len(ranges),1)
+            self.assertTrue(all(previous[1] < following[0] for previous,following in zip(ranges,ranges[1:])))
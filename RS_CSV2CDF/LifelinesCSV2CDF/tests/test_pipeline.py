@@ -0,0 +1,77 @@
+import unittest
+import os
+import sys
+import tempfile
+from lifelinescsv_to_icdf import pipeline
+
+
+def copy_stage(name,source,target):
+    #copies source into target, appending the stage name
+    script = f"import sys; data=open(sys.argv[1]).read(); open(sys.argv[2],'w').write(data+'{name}')"
+    return pipeline.Stage(name,[sys.executable,'-c',script,source,target],[source],[target])
+
+
+class PipelineRunner(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.source = self.path('source.txt')
+        with open(self.source,'w') as f:
+            f.write('data-')
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def path(self,name):
+        return os.path.join(self.folder.name,name)
+
+    def stages(self):
+        #'left' and 'right' are independent, 'join' depends on both
+        join_script = "import sys; open(sys.argv[3],'w').write(open(sys.argv[1]).read()+'+'+open(sys.argv[2]).read())"
+        return [pipeline.Stage('join',[sys.executable,'-c',join_script,self.path('left.txt'),self.path('right.txt'),self.path('out/join.txt')],
+                               [self.path('left.txt'),self.path('right.txt')],[self.path('out/join.txt')]),
+                copy_stage('left',self.source,self.path('left.txt')),
+                copy_stage('right',self.source,self.path('right.txt'))]
+
+
+    def test_dependencies_and_skipping(self):
+        runner = pipeline.Pipeline(self.stages(),self.path('state'))
+        self.assertEqual(runner.dependencies,{'join':['left','right'],'left':[],'right':[]})
+
+        results = runner.run()
+        self.assertEqual({name:result['status'] for name,result in results.items()},{'join':'ran','left':'ran','right':'ran'})
+        with open(self.path('out/join.txt')) as f:
+            self.assertEqual(f.read(),'data-left+data-right')
+        self.assertIn('peak RSS',pipeline.format_report(results))
+
+        #nothing changed
+        results = pipeline.Pipeline(self.stages(),self.path('state')).run()
+        self.assertEqual({result['status'] for result in results.values()},{'skipped'})
+
+        #changed input: everything downstream runs again
+        with open(self.source,'w') as f:
+            f.write('new-')
+        results = pipeline.Pipeline(self.stages(),self.path('state')).run()
+        self.assertEqual({result['status'] for result in results.values()},{'ran'})
+        with open(self.path('out/join.txt')) as f:
+            self.assertEqual(f.read(),'new-left+new-right')
+
+        #missing output
+        os.remove(self.path('out/join.txt'))
+        results = pipeline.Pipeline(self.stages(),self.path('state')).run()
+        self.assertEqual({name:result['status'] for name,result in results.items()},{'join':'ran','left':'skipped','right':'skipped'})
+
+
+    def test_failed_stage_blocks_dependents(self):
+        stages = self.stages()
+        stages[1] = pipeline.Stage('left',[sys.executable,'-c','import sys; sys.exit(3)'],[self.source],[self.path('left.txt')])
+        results = pipeline.Pipeline(stages,self.path('state')).run()
+        self.assertEqual({name:result['status'] for name,result in results.items()},{'join':'blocked','left':'failed','right':'ran'})
+        self.assertEqual(results['left']['returncode'],3)
+
+
+    def test_invalid_pipelines(self):
+        with self.assertRaises(pipeline.PipelineError):
+            pipeline.Pipeline([copy_stage('a',self.path('x'),self.path('y')),copy_stage('b',self.path('y'),self.path('x'))],self.path('state'))
+        with self.assertRaises(pipeline.PipelineError):
+            pipeline.Pipeline([copy_stage('a',self.source,self.path('y')),copy_stage('b',self.source,self.path('y'))],self.path('state'))
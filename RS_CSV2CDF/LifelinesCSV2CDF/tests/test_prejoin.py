@@ -0,0 +1,51 @@
+import unittest
+import os
+import tempfile
+import pandas as pd
+from lifelinescsv_to_icdf import cdfgenerator
+from lifelinescsv_to_icdf import prejoin
+from typing import Dict
+
+
+class ParticipantsPreJoin(unittest.TestCase):
+
+    def setUp(self):
+        file_a = {'project_pseudo_id':  ['participantA','participantA','participantB'],
+                         'variant_id':  ['vr1'         ,'vr2'         ,'vr1'],
+                               'var1':  [''            ,'1'           ,'5']}
+        file_b = {'project_pseudo_id':  ['participantB','participantC'],
+                               'var1':  ['90'          ,'$5']}
+
+        self.df_dict:Dict[str,pd.core.frame.DataFrame]=dict()
+        self.df_dict['file_a'] = pd.DataFrame(data=file_a).set_index('project_pseudo_id')
+        self.df_dict['file_b'] = pd.DataFrame(data=file_b).set_index('project_pseudo_id')
+
+        self.config = {'var1':[{"1a":'file_a'},{'1b':'file_b'}]}
+        self.ids = ['participantA','participantB','participantC','participantD']
+
+
+    def test_presence_matrix(self):
+        presence = prejoin.ParticipantPresence(self.ids,self.df_dict)
+
+        self.assertEqual(presence.present_files('participantA'),{'file_a'})
+        self.assertEqual(presence.present_files('participantB'),{'file_a','file_b'})
+        self.assertEqual(presence.present_files('participantD'),set())
+        self.assertEqual(presence.summary()['files']['file_b'],{'present':2,'absent':2})
+        self.assertEqual(presence.summary()['participants_in_no_file'],1)
+
+
+    def test_generation_with_presence_gives_the_same_output(self):
+        presence = prejoin.ParticipantPresence(self.ids,self.df_dict)
+
+        for pid in self.ids:
+            self.assertEqual(cdfgenerator.generate_csd(pid,self.config,self.df_dict,presence.present_files(pid)),
+                             cdfgenerator.generate_csd(pid,self.config,self.df_dict))
+
+
+    def test_duplicated_ids_are_dropped(self):
+        with tempfile.TemporaryDirectory() as folder:
+            ids_file = os.path.join(folder,'ids.csv')
+            with open(ids_file,'w') as f:
+                f.write('project_pseudo_id\nparticipantB\nparticipantA\nparticipantB\n')
+
+            self.assertEqual(cdfgenerator.load_ids(ids_file),['participantB','participantA'])
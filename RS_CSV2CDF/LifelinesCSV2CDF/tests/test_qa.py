@@ -0,0 +1,63 @@
+import os
+from lifelinescsv_to_icdf import cdfgenerator
+from lifelinescsv_to_icdf import mmapstore
+from lifelinescsv_to_icdf.cdfconfig import config_schema
+from lifelinescsv_to_icdf.prejoin import ParticipantPresence
+from lifelinescsv_to_icdf.qa import QASummary, merge_qa_summaries
+from tests.datafiles import DatafilesTestCase
+
+
+class QACounters(DatafilesTestCase):
+
+    FILE_A = ('project_pseudo_id,variant_id,var1,var2\n'
+              'participantB,vr1,5,$5\n'
+              'participantA,vr1,,\n'
+              'participantA,vr2,1,$7\n'
+              'participantE,vr1,$5,$5\n')
+
+    def datafiles_config(self):
+        return {'var1':[{"1a":self.file_a},{'1b':self.file_b}],'var2':[{"1a":self.file_a}]}
+
+    def summary(self,ids,data_frames):
+        summary = QASummary(config_schema(self.config))
+        summary.add_presence(ParticipantPresence(ids,data_frames))
+        summary.add_missing_codes(data_frames,ids)
+        for pid in ids:
+            summary.add(cdfgenerator.generate_csd(pid,self.config,data_frames))
+        return summary.to_dict()
+
+
+    def test_counters(self):
+        data_frames = cdfgenerator.load_and_index_csv_datafiles(self.config_path)
+        summary = self.summary(['participantA','participantB','participantC','participantD'],data_frames)
+
+        self.assertEqual(summary['records'],4)
+        self.assertEqual(summary['variables']['var1'],{'1a':{'non_missing':2,'rate':0.5},'1b':{'non_missing':1,'rate':0.25}})
+        #'$7' is kept on multiple rows (see get_single_non_empty_value)
+        self.assertEqual(summary['variables']['var2'],{'1a':{'non_missing':1,'rate':0.25}})
+        self.assertEqual(summary['missing_rows'],{self.file_a:{'participants':2,'rate':0.5},self.file_b:{'participants':2,'rate':0.5}})
+        #participantE is not one of the participants
+        self.assertEqual(summary['missing_codes'],{self.file_a:{'var2':{'$5':1,'$7':1}},self.file_b:{'var1':{'$5':1}}})
+        self.assertEqual(summary['missing_codes_unavailable'],[])
+
+
+    def test_missing_codes_unavailable(self):
+        store_folder = os.path.join(self.folder.name,'store')
+        store = mmapstore.open_or_build_store(store_folder,self.config_path,lambda: cdfgenerator.load_and_index_csv_datafiles(self.config_path))
+        summary = QASummary(config_schema(self.config))
+        with self.assertLogs(level='WARNING'):
+            summary.add_missing_codes(store,['participantA','participantB'])
+        #marked as unavailable, not as without codes
+        self.assertEqual(summary.to_dict()['missing_codes'],{})
+        self.assertEqual(summary.to_dict()['missing_codes_unavailable'],sorted([self.file_a,self.file_b]))
+        merged = merge_qa_summaries([summary.to_dict(),self.summary(['participantC'],cdfgenerator.load_and_index_csv_datafiles(self.config_path))])
+        self.assertEqual(merged['missing_codes_unavailable'],sorted([self.file_a,self.file_b]))
+        for datafile in store.values():
+            datafile.close()
+
+
+    def test_merged_shards_give_the_totals(self):
+        data_frames = cdfgenerator.load_and_index_csv_datafiles(self.config_path)
+        ids = ['participantA','participantB','participantC','participantD','participantE']
+        merged = merge_qa_summaries([self.summary(ids[:2],data_frames),self.summary(ids[2:],data_frames)])
+        self.assertEqual(merged,self.summary(ids,data_frames))
@@ -0,0 +1,92 @@
+import unittest
+from lifelinescsv_to_icdf import sharding
+from lifelinescsv_to_icdf import merge_shards
+
+
+class Sharding(unittest.TestCase):
+
+    ids = [f'participant{i}' for i in range(1000)]
+
+    def test_shards_partition_the_ids(self):
+        shards = [sharding.select_shard_ids(self.ids,sharding.Shard(i,4)) for i in range(4)]
+
+        self.assertEqual(sorted(pid for shard in shards for pid in shard),sorted(self.ids))
+        #deterministic across calls (and processes)
+        self.assertEqual(sharding.select_shard_ids(self.ids,sharding.Shard(2,4)),shards[2])
+        self.assertTrue(all(len(shard) > 150 for shard in shards))
+
+
+    def test_shard_specification(self):
+        self.assertEqual(sharding.parse_shard('3/16'),sharding.Shard(3,16))
+        self.assertRaises(ValueError,sharding.parse_shard,'16/16')
+        self.assertRaises(ValueError,sharding.parse_shard,'a/b')
+
+        self.assertIsNone(sharding.shard_from_environment({}))
+        self.assertEqual(sharding.shard_from_environment({'SLURM_ARRAY_TASK_ID':'5','SLURM_ARRAY_TASK_COUNT':'8'}),sharding.Shard(5,8))
+        self.assertEqual(sharding.shard_from_environment({'SLURM_ARRAY_TASK_ID':'8','SLURM_ARRAY_TASK_MIN':'1','SLURM_ARRAY_TASK_COUNT':'8'}),sharding.Shard(7,8))
+
+
+    def test_shard_of_slurm_arrays(self):
+        def environment(task_id,count,task_min,task_max,step=None):
+            environ = {'SLURM_ARRAY_TASK_ID':str(task_id),'SLURM_ARRAY_TASK_COUNT':str(count),
+                       'SLURM_ARRAY_TASK_MIN':str(task_min),'SLURM_ARRAY_TASK_MAX':str(task_max)}
+            if step is not None:
+                environ['SLURM_ARRAY_TASK_STEP'] = str(step)
+            return environ
+
+        #--array=1-16
+        self.assertEqual([sharding.shard_from_environment(environment(task_id,16,1,16)) for task_id in range(1,17)],
+                         [sharding.Shard(index,16) for index in range(16)])
+        #--array=0-9:2 (tasks 0,2,4,6,8)
+        self.assertEqual([sharding.shard_from_environment(environment(task_id,5,0,8,2)) for task_id in range(0,9,2)],
+                         [sharding.Shard(index,5) for index in range(5)])
+        #--array=1,3,7: not a range
+        with self.assertRaisesRegex(ValueError,'is not a range'):
+            sharding.shard_from_environment(environment(3,3,1,7))
+        #--array=0-9:2 without SLURM_ARRAY_TASK_STEP: the tasks do not fill the range
+        with self.assertRaisesRegex(ValueError,'is not a range'):
+            sharding.shard_from_environment(environment(2,5,0,8))
+        with self.assertRaisesRegex(ValueError,'SLURM_ARRAY_TASK_COUNT is not set'):
+            sharding.shard_from_environment({'SLURM_ARRAY_TASK_ID':'3'})
+        with self.assertRaisesRegex(ValueError,"Invalid SLURM_ARRAY_TASK_COUNT 'x'"):
+            sharding.shard_from_environment({'SLURM_ARRAY_TASK_ID':'3','SLURM_ARRAY_TASK_COUNT':'x'})
+
+
+    def test_merge_manifests(self):
+        def manifest(index,participants):
+            return {'shard':{'index':index,'count':3},'ids_file':'ids.csv','config_file':'config.json','output_format':'jsonl',
+                    'participants':participants,'bundles':[f'bundle-{index}.cdf.jsonl'],
+                    'metrics':{'load_seconds':1.0,'generation_seconds':2.0,'assembly':{'records':participants}}}
+
+        merged = merge_shards.merge_manifests([manifest(2,20),manifest(0,10)])
+
+        self.assertEqual(merged['participants'],30)
+        self.assertEqual(merged['missing_shards'],[1])
+        self.assertEqual(merged['bundles'],['bundle-0.cdf.jsonl','bundle-2.cdf.jsonl'])
+        self.assertEqual(merged['metrics']['assembly']['records'],30)
+        self.assertEqual(merged['max_shard_seconds'],3.0)
+
+        #manifest of a run that was not sharded
+        unsharded = dict(manifest(1,10),shard=None)
+        self.assertRaisesRegex(ValueError,'without shard',merge_shards.merge_manifests,[unsharded,manifest(0,10)])
+        self.assertRaisesRegex(ValueError,'without shard',merge_shards.merge_manifests,[manifest(0,10),unsharded])
+
+
+    def test_deterministic_samples(self):
+        sample = sharding.sample_ids(self.ids,fraction=0.1,seed=3)
+        self.assertTrue(50 < len(sample) < 150)
+        #same seed, same participants (also when the list of ids changes), in the order of the ids
+        self.assertEqual(sharding.sample_ids(list(reversed(self.ids)),fraction=0.1,seed=3),list(reversed(sample)))
+        self.assertEqual(sharding.sample_ids(self.ids[:500],fraction=0.1,seed=3),[pid for pid in sample if pid in self.ids[:500]])
+        self.assertNotEqual(sharding.sample_ids(self.ids,fraction=0.1,seed=4),sample)
+        #larger samples contain the smaller ones
+        self.assertTrue(set(sample) <= set(sharding.sample_ids(self.ids,fraction=0.5,seed=3)))
+
+        sample_n = sharding.sample_ids(self.ids,size=40,seed=3)
+        self.assertEqual(len(sample_n),40)
+        self.assertTrue(set(sample_n) <= set(sharding.sample_ids(self.ids,size=80,seed=3)))
+        self.assertEqual(sharding.sample_ids(self.ids,size=2000),self.ids)
+
+        self.assertRaises(ValueError,sharding.sample_ids,self.ids,fraction=0)
+        self.assertEqual(sharding.sample_name(fraction=0.01,seed=2),'sample-0.01-seed-2')
+        self.assertEqual(sharding.sample_name(size=100),'sample-n100-seed-0')
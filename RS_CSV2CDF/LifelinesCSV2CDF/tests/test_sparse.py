@@ -0,0 +1,46 @@
+import unittest
+import tempfile
+from lifelinescsv_to_icdf import output_writers
+from lifelinescsv_to_icdf.compression import get_codec, iter_cdf_bundle
+from lifelinescsv_to_icdf.cdfconfig import config_schema
+from lifelinescsv_to_icdf.sparse import sparsify, densify, iter_dense_bundle
+
+
+class SparseRecords(unittest.TestCase):
+
+    config = {'var1':[{"1a":"file_a.csv"},{"1b":"file_b.csv"}],'var2':[{"1a":"file_a.csv"}]}
+
+    records = [
+        {'project_pseudo_id':{"a1":'participantA'},'var1':{"1a":"1","1b":""},'var2':{"1a":""}},
+        {'project_pseudo_id':{"a1":'participantB'},'var1':{"1a":"","1b":""},'var2':{"1a":"0"}},
+        {'project_pseudo_id':{"a1":'participantC'},'var1':{"1a":"","1b":""},'var2':{"1a":""}},
+    ]
+
+    def test_sparsify_and_densify(self):
+        schema = config_schema(self.config)
+        self.assertEqual(sparsify(self.records[0]),{'project_pseudo_id':{"a1":'participantA'},'var1':{"1a":"1"}})
+        self.assertEqual(sparsify(self.records[2]),{'project_pseudo_id':{"a1":'participantC'}})
+        for record in self.records:
+            #same values, in the same order
+            self.assertEqual(list(densify(sparsify(record),schema).items()),list(record.items()))
+
+
+    def test_sparse_bundles_read_as_dense_records(self):
+        schema = config_schema(self.config)
+        for codec_name in ['none','gzip']:
+            with tempfile.TemporaryDirectory() as output_folder:
+                with output_writers.JSONBundleWriter(output_folder,bundle_size=2,codec=get_codec(codec_name),schema=schema) as writer:
+                    for record in self.records:
+                        writer.write(record['project_pseudo_id']['a1'],record)
+
+                self.assertEqual(len(writer.bundle_paths),2)
+                #the schema is on the first line of every bundle
+                for path in writer.bundle_paths:
+                    self.assertEqual(next(iter_cdf_bundle(path)),{'cdf_schema':schema},codec_name)
+                self.assertEqual([record for path in writer.bundle_paths for record in iter_dense_bundle(path)],self.records,codec_name)
+
+                #dense bundles are returned as they are
+                with output_writers.JSONBundleWriter(output_folder,prefix='dense',codec=get_codec(codec_name)) as writer:
+                    for record in self.records:
+                        writer.write(record['project_pseudo_id']['a1'],record)
+                self.assertEqual(list(iter_dense_bundle(writer.bundle_paths[0])),self.records,codec_name)
@@ -0,0 +1,8 @@
+import unittest
+from benchmarks import bench_startup
+
+
+class StartupImports(unittest.TestCase):
+
+    def test_heavy_modules_are_not_imported_eagerly(self):
+        self.assertEqual(bench_startup.eagerly_imported_modules('lifelinescsv_to_icdf.cdfgenerator'),[])
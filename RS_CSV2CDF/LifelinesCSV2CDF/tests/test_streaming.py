@@ -0,0 +1,66 @@
+import os
+import sys
+import subprocess
+from lifelinescsv_to_icdf import cdfgenerator
+from lifelinescsv_to_icdf.streaming import stream_records
+from lifelinescsv_to_icdf.transformation_exceptions import OutOfOrderInputException, MoreThanOneValueInAssessmentVariants
+from tests.datafiles import DatafilesTestCase
+
+
+class StreamingMergeJoin(DatafilesTestCase):
+
+    #sorted by project_pseudo_id
+    FILE_A = ('project_pseudo_id,variant_id,date,var1,var2\n'
+              'participantA,vr2,2019-3,,\n'
+              'participantA,vr1,2019-4,1,$7\n'
+              'participantB,vr1,2020-1,5,$5\n'
+              'participantC,vr1,2021-1,"a, b",\n')
+    FILE_B = ('project_pseudo_id,var1\n'
+              'participantB,90\nparticipantC,$5\nparticipantE,3\n')
+
+
+    def test_same_records_as_generate_csd(self):
+        data_frames = cdfgenerator.load_and_index_csv_datafiles(self.config_path)
+        items = list(stream_records(self.config,['participantD','participantC','participantA','participantB','participantE']))
+
+        self.assertEqual([pid for pid,_ in items],['participantA','participantB','participantC','participantD','participantE'])
+        for pid, record in items:
+            self.assertEqual(record,cdfgenerator.generate_csd(pid,self.config,data_frames),pid)
+
+
+    def test_all_participants_of_the_datafiles(self):
+        self.assertEqual([pid for pid,_ in stream_records(self.config)],['participantA','participantB','participantC','participantE'])
+
+
+    def test_out_of_order_input(self):
+        with open(self.file_b,'a') as f:
+            f.write('participantD,4\n')
+        with self.assertRaises(OutOfOrderInputException) as context:
+            list(stream_records(self.config))
+        self.assertEqual((context.exception.file,context.exception.line),(self.file_b,5))
+
+
+    def test_nothing_written_from_out_of_order_input(self):
+        #file_a is only out of order after the first participants
+        with open(self.file_a,'a') as f:
+            f.write('participantB,vr2,2020-2,,\n')
+        with self.assertRaises(OutOfOrderInputException):
+            next(stream_records(self.config))
+
+        ids_path = os.path.join(self.folder.name,'ids.csv')
+        with open(ids_path,'w') as f:
+            f.write('project_pseudo_id\nparticipantA\nparticipantB\nparticipantC\n')
+        output_folder = os.path.join(self.folder.name,'output')
+        os.makedirs(output_folder)
+        package_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        result = subprocess.run([sys.executable,'-m','lifelinescsv_to_icdf.cdfgenerator',ids_path,self.config_path,output_folder,'--backend','streaming'],
+                                cwd=package_folder,capture_output=True,text=True)
+        self.assertEqual(result.returncode,1,result.stderr[-2000:])
+        self.assertEqual([name for name in os.listdir(output_folder) if name.endswith('.json')],[])
+
+
+    def test_several_values_on_variants(self):
+        with open(self.file_a,'a') as f:
+            f.write('participantC,vr2,2021-2,6,\n')
+        with self.assertRaises(MoreThanOneValueInAssessmentVariants):
+            list(stream_records(self.config))
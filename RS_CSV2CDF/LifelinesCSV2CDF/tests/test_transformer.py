@@ -0,0 +1,99 @@
+import unittest
+import os
+import json
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+from lifelinescsv_to_icdf import cdfgenerator
+from lifelinescsv_to_icdf import server
+from lifelinescsv_to_icdf.output_writers import create_output_writer
+from lifelinescsv_to_icdf.transformation_exceptions import MoreThanOneValueInAssessmentVariants
+from lifelinescsv_to_icdf.transformer import CDFTransformer
+
+
+class InProcessTransformation(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        file_a = os.path.join(self.folder.name,'file_a.csv')
+        file_b = os.path.join(self.folder.name,'file_b.csv')
+        with open(file_a,'w') as f:
+            f.write('project_pseudo_id,variant_id,var1\n')
+            f.write('participantA,vr1,\nparticipantA,vr2,1\nparticipantB,vr1,5\n')
+            #conflicting values on the variants
+            f.write('participantE,vr1,3\nparticipantE,vr2,4\n')
+        with open(file_b,'w') as f:
+            f.write('project_pseudo_id,var1\n')
+            f.write('participantB,90\nparticipantC,$5\n')
+
+        self.config = {'var1':[{"1a":file_a},{'1b':file_b}]}
+        self.config_path = os.path.join(self.folder.name,'config.json')
+        with open(self.config_path,'w') as f:
+            json.dump(self.config,f)
+        self.transformer = CDFTransformer(self.config_path)
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def expected(self,pid):
+        data_frames = cdfgenerator.load_and_index_csv_datafiles(self.config_path)
+        return cdfgenerator.generate_csd(pid,self.config,data_frames)
+
+
+    def test_generate_batches(self):
+        self.assertEqual(list(self.transformer.generate(['participantA','participantD'])),[self.expected('participantA'),self.expected('participantD')])
+        #the same loaded frames serve the next batches
+        self.assertEqual(list(self.transformer.generate(['participantC','participantB','participantC'])),[self.expected('participantC'),self.expected('participantB')])
+
+
+    def test_write(self):
+        with tempfile.TemporaryDirectory() as output_folder:
+            with create_output_writer('json',output_folder) as writer:
+                self.assertEqual(self.transformer.write(['participantA','participantB'],writer),2)
+            with open(os.path.join(output_folder,'participantB.cdf.json')) as f:
+                self.assertEqual(json.load(f),self.expected('participantB'))
+
+
+    def test_conflicting_values_raise(self):
+        with self.assertRaises(MoreThanOneValueInAssessmentVariants) as error:
+            list(self.transformer.generate(['participantB','participantE']))
+        self.assertIn("'participantE'",error.exception.message)
+
+
+    def test_local_server(self):
+        http_server = server.create_server(self.transformer,port=0)
+        thread = threading.Thread(target=http_server.serve_forever,daemon=True)
+        thread.start()
+        url = f'http://{http_server.server_address[0]}:{http_server.server_address[1]}'
+
+        def post(path,content):
+            request = urllib.request.Request(url+path,data=json.dumps(content).encode('utf-8'),method='POST')
+            with urllib.request.urlopen(request) as response:
+                return response.read()
+
+        try:
+            with urllib.request.urlopen(url+'/health') as response:
+                self.assertEqual(json.loads(response.read())['datafiles'],2)
+
+            lines = post('/generate',{'ids':['participantB','participantC']}).splitlines()
+            self.assertEqual([json.loads(line) for line in lines],[self.expected('participantB'),self.expected('participantC')])
+
+            with tempfile.TemporaryDirectory() as output_folder:
+                result = json.loads(post('/write',{'ids':['participantA','participantB'],'output_folder':output_folder,'format':'jsonl'}))
+                self.assertEqual(result,{'participants':2,'bundles':['bundle-00000.cdf.jsonl']})
+
+            with self.assertRaises(urllib.error.HTTPError) as error:
+                post('/generate',{'participants':[]})
+            self.assertEqual(error.exception.code,400)
+
+            #the server keeps running after a participant with conflicting values
+            with self.assertRaises(urllib.error.HTTPError) as error:
+                post('/generate',{'ids':['participantE']})
+            self.assertEqual(error.exception.code,422)
+            self.assertIn('var1',json.loads(error.exception.read())['error'])
+            lines = post('/generate',{'ids':['participantB']}).splitlines()
+            self.assertEqual([json.loads(line) for line in lines],[self.expected('participantB')])
+        finally:
+            http_server.shutdown()
+            http_server.server_close()
@@ -0,0 +1,112 @@
+import unittest
+import os
+import datetime
+import tempfile
+import importlib.util
+import pandas as pd
+from lifelinescsv_to_icdf import cdfgenerator
+
+
+class TypedValuesFormatting(unittest.TestCase):
+
+    def test_cdf_values(self):
+        self.assertEqual(cdfgenerator.cdf_value('12'),'12')
+        self.assertEqual(cdfgenerator.cdf_value(datetime.date(2010,6,5)),'05-06-2010')
+        self.assertEqual(cdfgenerator.cdf_value(pd.Timestamp('2010-06-05')),'05-06-2010')
+        self.assertEqual(cdfgenerator.cdf_value(True),'True')
+        self.assertEqual(cdfgenerator.cdf_value(pd.array([False],dtype='boolean')[0]),'False')
+        self.assertEqual(cdfgenerator.cdf_value(2.5),'2.5')
+        #as DataFrame.to_csv writes the floats
+        self.assertEqual(cdfgenerator.cdf_value(88.0),'88.0')
+        self.assertEqual(cdfgenerator.cdf_value(0.1+0.2),'0.30000000000000004')
+        self.assertEqual(cdfgenerator.cdf_value(pd.array([120],dtype='Int64')[0]),'120')
+        for missing in [None,pd.NA,pd.NaT,float('nan')]:
+            self.assertEqual(cdfgenerator.cdf_value(missing),'')
+
+
+@unittest.skipUnless(importlib.util.find_spec('pyarrow'),'pyarrow is not installed')
+class ParquetDatafiles(unittest.TestCase):
+
+    def test_generation_from_typed_datafile(self):
+        data = pd.DataFrame({'project_pseudo_id': ['participantA','participantB'],
+                             'date_int_cen':      [datetime.date(1995,2,1),None],
+                             'incident_mi_bool':  pd.array([True,None],dtype='boolean'),
+                             'LDL_mmol_chosen':   [3.35,float('nan')],
+                             'sex_mapped':        pd.Categorical(['female','male'])})
+
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder,'compact.parquet')
+            data.to_parquet(path,index=False)
+            config = {variable:[{'a1':path}] for variable in ['date_int_cen','incident_mi_bool','LDL_mmol_chosen','sex_mapped']}
+            config_path = os.path.join(folder,'config.json')
+            pd.Series(config).to_json(config_path)
+
+            data_frames = cdfgenerator.load_and_index_csv_datafiles(config_path)
+            self.assertEqual(cdfgenerator.generate_csd('participantA',config,data_frames),
+                             {'project_pseudo_id':{'a1':'participantA'},'date_int_cen':{'a1':'01-02-1995'},'incident_mi_bool':{'a1':'True'},
+                              'LDL_mmol_chosen':{'a1':'3.35'},'sex_mapped':{'a1':'female'}})
+            self.assertEqual(cdfgenerator.generate_csd('participantB',config,data_frames),
+                             {'project_pseudo_id':{'a1':'participantB'},'date_int_cen':{'a1':''},'incident_mi_bool':{'a1':''},
+                              'LDL_mmol_chosen':{'a1':''},'sex_mapped':{'a1':'male'}})
+
+            #only the rows of the given participants
+            data_frames = cdfgenerator.load_and_index_csv_datafiles(config_path,participant_ids={'participantB'})
+            self.assertEqual(data_frames[path].index.tolist(),['participantB'])
+
+
+@unittest.skipUnless(importlib.util.find_spec('pyarrow'),'pyarrow is not installed')
+class CompactCSVAndParquetRecords(unittest.TestCase):
+
+    def load_rs_fl_variables_csv_gen(self):
+        path = os.path.join(os.path.dirname(__file__),'..','..','rs_fl_variables_csv_gen.py')
+        spec = importlib.util.spec_from_file_location('rs_fl_variables_csv_gen',path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+
+    def test_same_records_from_both_formats(self):
+        rs = self.load_rs_fl_variables_csv_gen()
+        col = rs.COL
+        data = pd.DataFrame({col['id']:['1001','1002','1003'],col['baseline_date']:['1995-02-01','01-03-1996','1997-04-05'],
+                             col['birth_date']:['1930-01-01','1940-06-15',None],col['sex']:['0','1','1'],col['age']:['65','55','70'],
+                             col['sbp']:['120','135',None],col['dbp']:['80',None,'75'],col['hdl']:['1.250','0.9','n/a'],
+                             col['ldl_priority'][0]:[None,'3.35','3'],col['ldl_priority'][1]:['3.1',None,None],
+                             col['tchol']:['5.0','6.25','4'],col['egfr']:['71.5','88','90.25'],col['smoking']:['2','0',None],
+                             col['prev_dm']:['0','2','1'],col['prev_stroke_tia']:['0','1','0'],
+                             col['inc_mi_flag']:['1','0','0'],col['inc_mi_date_or_censor']:['2001-05-06','2010-01-01','2011-02-03'],
+                             col['stroke_date']:[None,'1999-09-09','2003-03-03']})
+        self.assertEqual(self.records(rs,data),self.records(rs,data,typed=True))
+        records = self.records(rs,data,typed=True)
+        #original values keep their text
+        self.assertEqual([record[col['hdl']] for record in records],[{'a1':'1.250'},{'a1':'0.9'},{'a1':'n/a'}])
+        self.assertEqual(records[0][col['tchol']],{'a1':'5.0'})
+        self.assertEqual(records[0][col['sbp']],{'a1':'120'})
+        #derived values are formatted as on the CSV file
+        self.assertEqual([record['LDL_mmol_chosen'] for record in records],[{'a1':'3.1'},{'a1':'3.35'},{'a1':'3.0'}])
+        self.assertEqual(records[0][col['age']],{'a1':'65'})
+        self.assertEqual(records[0]['age_at_baseline_years'],{'a1':'65'})
+        self.assertEqual(records[0]['age_at_baseline_years_derived'],{'a1':'65.08'})
+
+        #with a missing age, age_at_baseline_years is a float column in both formats
+        data.loc[2,col['age']] = None
+        self.assertEqual(self.records(rs,data),self.records(rs,data,typed=True))
+        self.assertEqual(self.records(rs,data,typed=True)[0]['age_at_baseline_years'],{'a1':'65.0'})
+
+
+    def records(self,rs,data,typed=False):
+        col = rs.COL
+        with tempfile.TemporaryDirectory() as folder:
+            compact = rs.transform(data.copy(),{},{},False,quiet=True,typed=typed)
+            if typed:
+                path = os.path.join(folder,'compact.parquet')
+                rs.write_typed_parquet(compact,path)
+            else:
+                path = os.path.join(folder,'compact.csv')
+                compact.insert(0,'project_pseudo_id',compact[col['id']])
+                compact.to_csv(path,index=False)
+            variables = [c for c in compact.columns if c != 'project_pseudo_id']
+            config = {variable:[{'a1':path}] for variable in variables}
+            config_path = os.path.join(folder,'config.json')
+            pd.Series(config).to_json(config_path)
+            data_frames = cdfgenerator.load_and_index_csv_datafiles(config_path)
+            return [cdfgenerator.generate_csd(pid,config,data_frames) for pid in data[col['id']]]
@@ -0,0 +1,67 @@
+import unittest
+import os
+import json
+import tempfile
+from lifelinescsv_to_icdf import output_writers
+from lifelinescsv_to_icdf.cdfconfig import config_schema
+from lifelinescsv_to_icdf.validation import RecordValidator, validate_output, merge_validation_reports
+
+
+class RecordValidation(unittest.TestCase):
+
+    config = {'var1':[{"1a":"file_a.csv"},{"1b":"file_b.csv"}],'var2':[{"1a":"file_a.csv"}]}
+
+    def record(self,participant_id,id_key='a1'):
+        return {'project_pseudo_id':{id_key:participant_id},'var1':{'1a':'1','1b':''},'var2':{'1a':''}}
+
+
+    def test_valid_records(self):
+        validator = RecordValidator(self.config)
+        self.assertTrue(validator.validate('participantA',self.record('participantA')))
+        #rs_to_icdf records
+        self.assertTrue(RecordValidator(self.config,id_key='1a').validate('participantA',self.record('participantA','1a')))
+        self.assertEqual(validator.report.invalid_records,0)
+
+
+    def test_violations_are_aggregated(self):
+        validator = RecordValidator(self.config)
+        missing_assessment = self.record('participantA')
+        del missing_assessment['var1']['1b']
+        unexpected = self.record('participantB')
+        unexpected['var3'] = {'1a':'x'}
+        unexpected['var2']['2a'] = ''
+        invalid = self.record('participantC','1a')
+        invalid['var1']['1a'] = 1
+        del invalid['var2']
+
+        for participant_id, record in [('participantA',missing_assessment),('participantB',unexpected),('participantC',invalid),
+                                       ('participantD',self.record('participantD')),('participantE',[])]:
+            validator.validate(participant_id,record)
+
+        report = validator.report.to_dict()
+        self.assertEqual((report['records'],report['invalid_records']),(5,4))
+        self.assertEqual(report['violations'],{
+            'invalid_pseudo_id':{'expected {"a1": "<id>"}':{'records':1,'examples':['participantC']}},
+            'invalid_value':{'var1/1a':{'records':1,'examples':['participantC']}},
+            'missing_assessment':{'var1/1b':{'records':1,'examples':['participantA']}},
+            'missing_variable':{'var2':{'records':1,'examples':['participantC']}},
+            'not_an_object':{'':{'records':1,'examples':['participantE']}},
+            'unexpected_assessment':{'var2/2a':{'records':1,'examples':['participantB']}},
+            'unexpected_variable':{'var3':{'records':1,'examples':['participantB']}},
+        })
+        self.assertEqual(merge_validation_reports([report,report])['violations']['missing_assessment']['var1/1b'],
+                         {'records':2,'examples':['participantA','participantA']})
+
+
+    def test_output_folder_pass(self):
+        with tempfile.TemporaryDirectory() as output_folder:
+            with output_writers.JSONBundleWriter(output_folder,bundle_size=3,schema=config_schema(self.config)) as writer:
+                for i in range(7):
+                    writer.write(f'participant{i}',self.record(f'participant{i}'))
+            with output_writers.JSONFileWriter(output_folder) as writer:
+                writer.write('participantX',{'project_pseudo_id':{'a1':'participantX'},'var1':{'1a':'1'}})
+
+            for workers in [1,2]:
+                report = validate_output(self.config,output_folder,workers=workers).to_dict()
+                self.assertEqual((report['records'],report['invalid_records']),(8,1),workers)
+                self.assertEqual(sorted(report['violations']),['missing_assessment','missing_variable'],workers)
@@ -0,0 +1,32 @@
+#!/bin/bash
+#SBATCH --job-name=CSV2CDF
+#SBATCH --output=csv2cdf_%a.out
+#SBATCH --error=csv2cdf_%a.err
+#SBATCH --time=00:59:00
+#SBATCH --cpus-per-task=1
+#SBATCH --mem=4gb
+#SBATCH --nodes=1
+#SBATCH --array=0-15
+#SBATCH --open-mode=append
+#SBATCH --export=NONE
+#SBATCH --get-user-env=L60
+
+# Each task of the array processes its own shard of the participants (taken from SLURM_ARRAY_TASK_ID and
+# SLURM_ARRAY_TASK_COUNT), loading only their rows. Note that this happens for every array job, also when
+# --shard is not given: array jobs that already split the participants themselves (e.g., one ids file per
+# task) must pass --no-auto-shard, otherwise each task only processes a 1/N fraction of its own ids.
+# The array must be a range (e.g., 0-15, 1-16 or 0-30:2): lists of task ids such as 1,3,7 are rejected, as
+# they cannot be mapped to shards without leaving participants out.
+# Once all the tasks are done, merge the shard manifests:
+#
+#   JOBID=$(sbatch --parsable transform_slurm_array_script.sh)
+#   sbatch --dependency=afterok:$JOBID --wrap "python -m lifelinescsv_to_icdf.merge_shards /home/umcg-hcadavid/temporal-data/pheno_lifelines_csd_out"
+#
+# With --mmap-store <folder>, the tasks share a memory-mapped copy of the datafiles instead of loading them.
+# Build it once before submitting the array (the tasks would otherwise race to build it):
+#
+#   python -m lifelinescsv_to_icdf.mmapstore /home/umcg-hcadavid/temporal-data/csv2csd/csv2csdconfig.json /home/umcg-hcadavid/temporal-data/csv2csd/store
+
+module load Python/3.9.1-GCCcore-7.3.0-bare
+module list
+python -m lifelinescsv_to_icdf.cdfgenerator /home/umcg-hcadavid/temporal-data/csv2csd/ids.csv /home/umcg-hcadavid/temporal-data/csv2csd/csv2csdconfig.json /home/umcg-hcadavid/temporal-data/pheno_lifelines_csd_out
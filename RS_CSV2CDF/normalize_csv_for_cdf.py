@@ -1,5 +1,5 @@
 #!/usr/bin/env python3
-import argparse, pandas as pd, sys, os
+import argparse, sys, os
 
 def sniff_sep(path):
     # Simple sniff: count ; and , in the header line
@@ -14,6 +14,9 @@ def main():
     ap.add_argument('--id-col', required=True, help='Current ID column name in the original CSV (e.g., ergoid or project_pseudo_id)')
     args = ap.parse_args()
 
+    # pandas is imported once the arguments are valid (not for --help or usage errors)
+    import pandas as pd
+
     sep = sniff_sep(args.inp)
     df = pd.read_csv(args.inp, sep=sep, dtype=str, encoding='utf-8', engine='python')
 
@@ -8,6 +8,9 @@ Key features:
 - Dates parsed from: DD-MM-YYYY, M/D/YYYY, YYYY-MM-DD, Excel serial numbers.
 - Incident codes discovered from Sheet2 labels; CLI overrides; optional --force-incident-if-date-present.
 - All output date-like columns formatted as DD-MM-YYYY.
+- Optional typed output (--format parquet): date32 dates, nullable booleans, numeric derived values,
+  categorical sex/smoking; the original RS columns (e.g., the lab values) keep their text. The CDF
+  generator reads it directly and formats the values itself.
 - Diagnostics printed to help verify population.
 
 Usage example:
@@ -17,10 +20,13 @@ Usage example:
     --codebook rs_cvd_variables.xlsx \
     --true-codes "inc_MI=1;inc_hf_2018=1" \
     --force-incident-if-date-present
+
+  Typed output (requires pyarrow):
+    ... --out RS_compact.parquet --format parquet
 """
 
 import argparse
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 import pandas as pd
 import numpy as np
 import re
@@ -203,16 +209,59 @@ def to_datetime_series(series: Optional[pd.Series]) -> pd.Series:
 def fmt_dd_mm_yyyy(dt_series: pd.Series) -> pd.Series:
     return dt_series.dt.strftime("%d-%m-%Y").where(dt_series.notna(), "")
 
+# ----------------------------
+# Numeric kernel
+# ----------------------------
+# Lab/measurement columns coerced together (LDL priority order first)
+LAB_COLS = [*COL["ldl_priority"], COL["hdl"], COL["tchol"], COL["creat_umol"], COL["egfr"], COL["sbp"], COL["dbp"]]
+
+def coerce_numeric_block(df: pd.DataFrame, cols: List[str]) -> Tuple[np.ndarray, Dict[str, int]]:
+    """
+    Coerce a block of columns to a float64 (rows x cols) array with a single pd.to_numeric call.
+    Columns not in df are all-NaN. Also returns, per column, the number of non-empty values that
+    could not be parsed.
+    """
+    block = np.full((len(df), len(cols)), np.nan, dtype="float64")
+    unparseable = {c: 0 for c in cols}
+    present = [i for i, c in enumerate(cols) if c in df.columns]
+    if not present or len(df) == 0:
+        return block, unparseable
+
+    # column-major ravel: each column is a contiguous run of the flat array
+    raw = pd.Series(df[[cols[i] for i in present]].to_numpy(dtype=object).ravel(order="F"))
+    values = pd.to_numeric(raw, errors="coerce").to_numpy(dtype="float64")
+    given = (raw.notna() & (raw.astype(str).str.strip() != "")).to_numpy()
+
+    block[:, present] = values.reshape(len(present), len(df)).T
+    bad_counts = (given & np.isnan(values)).reshape(len(present), len(df)).sum(axis=1)
+    for i, count in zip(present, bad_counts):
+        unparseable[cols[i]] = int(count)
+    return block, unparseable
+
+def numeric_column(raw: pd.Series, values: np.ndarray) -> pd.Series:
+    """
+    Column of coerced values with the dtype pd.to_numeric would give it: int64 when every value is an
+    integer literal (so the CSV output keeps 63, not 63.0), float64 otherwise.
+    """
+    column = pd.Series(values, index=raw.index, dtype="float64")
+    if len(raw) and not np.isnan(values).any() and raw.astype(str).str.strip().str.fullmatch(r"[+-]?\d+").all():
+        return column.astype("int64")
+    return column
+
+def coalesce_first_nonnull(block: np.ndarray) -> np.ndarray:
+    """Row-wise first non-NaN value of the block (columns in priority order), NaN if there is none."""
+    if block.shape[1] == 0:
+        return np.full(block.shape[0], np.nan)
+    first = (~np.isnan(block)).argmax(axis=1)
+    # rows without values point at column 0, which is NaN for them
+    return block[np.arange(block.shape[0]), first]
+
 # ----------------------------
 # Other helpers
 # ----------------------------
 def choose_first_nonnull_numeric(df: pd.DataFrame, cols: List[str]) -> pd.Series:
-    out = pd.Series([np.nan] * len(df), index=df.index, dtype="float64")
-    for c in cols:
-        if c in df.columns:
-            v = pd.to_numeric(df[c], errors="coerce")
-            out = out.where(~out.isna(), v)
-    return out
+    block, _ = coerce_numeric_block(df, cols)
+    return pd.Series(coalesce_first_nonnull(block), index=df.index, dtype="float64")
 
 # ----------------------------
 # Core transform
@@ -221,7 +270,14 @@ def transform(df: pd.DataFrame,
               sheet2_map: Dict[str, Dict[str, str]],
               true_codes_override: Dict[str, List[str]],
               force_inc_if_date_present: bool,
-              quiet: bool = False) -> pd.DataFrame:
+              quiet: bool = False,
+              typed: bool = False) -> pd.DataFrame:
+    """
+    Compact dataset. With typed=True the derived columns keep their types instead of being formatted
+    as strings: dates (datetime64), booleans (nullable), sex/smoking (categorical). The original RS
+    columns (lab values included) keep their text in both modes, so "1.250" is not turned into 1.25
+    and a non-numeric value is not lost.
+    """
 
     out = pd.DataFrame(index=df.index)
 
@@ -249,16 +305,22 @@ def transform(df: pd.DataFrame,
     stroke_dt   = to_datetime_series(df.get(COL["stroke_date"])) if COL["stroke_date"] in df.columns else pd.Series(pd.NaT, index=df.index)
     hf_dt       = to_datetime_series(df.get(COL["inc_hf_date_or_censor"])) if COL["inc_hf_date_or_censor"] in df.columns else pd.Series(pd.NaT, index=df.index)
 
+    # Numeric block, coerced in one pass: the lab values and age, used for the derivations and the
+    # unparseable value counts (the output keeps the original strings)
+    numeric_cols = LAB_COLS + [COL["age"]]
+    numeric_block, unparseable = coerce_numeric_block(df, numeric_cols)
+
     # 4) Age at baseline
     if COL["age"] in df.columns:
-        out["age_at_baseline_years"] = pd.to_numeric(df[COL["age"]], errors="coerce")
+        # integer ages stay integers (e.g., 63, not 63.0), also when typed
+        out["age_at_baseline_years"] = numeric_column(df[COL["age"]], numeric_block[:, numeric_cols.index(COL["age"])])
         out["age_at_baseline_years_derived"] = ((baseline_dt - birth_dt).dt.days / 365.25).round(2)
     else:
         out["age_at_baseline_years"] = ((baseline_dt - birth_dt).dt.days / 365.25).round(2)
         out["age_at_baseline_years_derived"] = out["age_at_baseline_years"]
 
     # 5) LDL chosen
-    out["LDL_mmol_chosen"] = choose_first_nonnull_numeric(df, [c for c in COL["ldl_priority"] if c in df.columns])
+    out["LDL_mmol_chosen"] = pd.Series(coalesce_first_nonnull(numeric_block[:, :len(COL["ldl_priority"])]), index=df.index)
 
     # 6) Prevalent flags
     def bool_from_map_or_default(series: pd.Series, varname: str, pos_keywords: List[str]) -> pd.Series:
@@ -334,7 +396,15 @@ def transform(df: pd.DataFrame,
 
     for name, dtser in date_cols_to_format.items():
         if name in out.columns or name.startswith("incident_"):
-            out[name] = to_fmt(dtser)
+            out[name] = pd.to_datetime(dtser, errors="coerce").dt.normalize() if typed else to_fmt(dtser)
+
+    # Typed columns (instead of the original strings)
+    if typed:
+        for c in out.columns:
+            if c.endswith("_bool"):
+                out[c] = out[c].astype("boolean")
+        out["sex_mapped"] = out["sex_mapped"].astype("category")
+        out["smoking_status"] = out["smoking_status"].astype("category")
 
     # 12) Diagnostics
     if not quiet:
@@ -349,13 +419,37 @@ def transform(df: pd.DataFrame,
         print(f"  incident_mi_bool TRUE: {int(inc_mi_bool.sum())}")
         print(f"  incident_hf_bool TRUE: {int(inc_hf_bool.sum())}")
         print(f"  incident_stroke_bool TRUE: {int(incident_stroke_bool.sum())}")
-        print(f"  incident_mi_date_derived non-empty: {int((out['incident_mi_date_derived']!='').sum())}")
-        print(f"  incident_hf_date_derived non-empty: {int((out['incident_hf_date_derived']!='').sum())}")
-        print(f"  incident_stroke_date_derived non-empty: {int((out['incident_stroke_date_derived']!='').sum())}")
-        print(f"  incident_cvd_date_derived non-empty: {int((out['incident_cvd_date_derived']!='').sum())}\n")
+        print(f"  incident_mi_date_derived non-empty: {int(incident_mi_date_dt.notna().sum())}")
+        print(f"  incident_hf_date_derived non-empty: {int(incident_hf_date_dt.notna().sum())}")
+        print(f"  incident_stroke_date_derived non-empty: {int(incident_stroke_date_dt.notna().sum())}")
+        print(f"  incident_cvd_date_derived non-empty: {int(comp_dt.notna().sum())}")
+        print("  Unparseable numeric values:", {c: n for c, n in unparseable.items() if c in df.columns}, "\n")
 
     return out
 
+# ----------------------------
+# Typed output
+# ----------------------------
+def write_typed_parquet(compact: pd.DataFrame, path: str) -> None:
+    """
+    Write the typed compact dataset (transform(..., typed=True)) as Parquet, with the dates as date32.
+    A project_pseudo_id column (the RS id as string) is added so the CDF generator can use the file
+    directly as a datafile.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("--format parquet requires the pyarrow package (pip install pyarrow)")
+
+    compact = compact.copy()
+    if "project_pseudo_id" not in compact.columns:
+        compact.insert(0, "project_pseudo_id", compact[COL["id"]].astype(str).str.strip())
+
+    table = pa.Table.from_pandas(compact, preserve_index=False)
+    schema = pa.schema([pa.field(f.name, pa.date32()) if pa.types.is_timestamp(f.type) else f for f in table.schema])
+    pq.write_table(table.cast(schema), path, compression="zstd")
+
 # ----------------------------
 # CLI
 # ----------------------------
@@ -369,7 +463,9 @@ def main():
     ap.add_argument("--true-codes", dest="true_codes", default="", help='Override true codes, e.g. "inc_MI=1;inc_hf_2018=1"')
     ap.add_argument("--force-incident-if-date-present", dest="force_inc", action="store_true", help="If set, mark MI/HF incident when their date field is non-empty.")
     ap.add_argument("--quiet", dest="quiet", action="store_true", help="Suppress diagnostics.")
+    ap.add_argument("--format", dest="out_format", choices=["csv", "parquet"], default=None, help="Output format (default: parquet when --out ends with .parquet, csv otherwise). 'parquet' writes typed columns (requires pyarrow).")
     args = ap.parse_args()
+    out_format = args.out_format or ("parquet" if args.out.endswith(".parquet") else "csv")
 
     df = pd.read_csv(args.inp, sep=args.sep, encoding=args.encoding, dtype=str)
     sheet2_map = load_sheet2_value_map(args.codebook) if args.codebook else {}
@@ -381,12 +477,15 @@ def main():
         true_codes_override=true_codes_override,
         force_inc_if_date_present=args.force_inc,
         quiet=args.quiet,
+        typed=(out_format == "parquet"),
     )
 
-    compact = compact[compact["date_int_cen"].notna() & (compact["date_int_cen"] != "")]
-
-
-    compact.to_csv(args.out, index=False, encoding=args.encoding)
+    if out_format == "parquet":
+        compact = compact[compact["date_int_cen"].notna()]
+        write_typed_parquet(compact, args.out)
+    else:
+        compact = compact[compact["date_int_cen"].notna() & (compact["date_int_cen"] != "")]
+        compact.to_csv(args.out, index=False, encoding=args.encoding)
     if not args.quiet:
         print(f"Wrote: {args.out} (n={len(compact)})")
 
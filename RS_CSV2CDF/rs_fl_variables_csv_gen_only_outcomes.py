@@ -7,10 +7,12 @@ Reads the full RS CSV and outputs a compact CSV with just:
 - raw incident fields (inc_MI, enddat_MI, stroke_date, inc_hf_2018, enddat_hf)
 - derived incident_* flags and *_date (MI, stroke, HF)
 - derived composite (incident_cvd_composite, incident_cvd_date)
+- survival variables per outcome (mi, stroke, hf, cvd): <outcome>_event (1 = event, 0 = censored),
+  <outcome>_followup_end, <outcome>_followup_days and <outcome>_followup_years
 """
 
 import argparse
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 import numpy as np
 import pandas as pd
 
@@ -40,6 +42,8 @@ COLUMN_NAMES = {
 TRUE_TOKENS = {"1","true","t","yes","y","ja","waar","si"}
 FALSE_TOKENS = {"0","false","f","no","n","nee","onwaar"}
 
+DAYS_PER_YEAR = 365.25
+
 def to_bool(x: Any) -> Optional[bool]:
     if x is None or (isinstance(x, float) and np.isnan(x)):
         return None
@@ -58,15 +62,44 @@ def to_bool(x: Any) -> Optional[bool]:
         pass
     return None
 
-def parse_date(series: pd.Series) -> pd.Series:
+def to_bool_series(series: pd.Series) -> pd.Series:
+    """to_bool of every value of the series, evaluated once per distinct value (flags have only a few)."""
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    # the last entry is for the missing values (code -1)
+    mapped = np.array([to_bool(u) for u in uniques] + [None], dtype=object)
+    return pd.Series(mapped[codes], index=series.index, dtype=object)
+
+def parse_datetime(series: pd.Series) -> pd.Series:
     # removed deprecated infer_datetime_format
-    return pd.to_datetime(series, errors="coerce", utc=False).dt.date
+    return pd.to_datetime(series, errors="coerce", utc=False).dt.normalize()
 
-def min_date_ignore_null(dates: List[Optional[pd.Timestamp]]) -> Optional[pd.Timestamp]:
-    vals = [pd.to_datetime(d) for d in dates if pd.notna(d)]
-    if not vals:
-        return pd.NaT
-    return min(vals)
+def parse_date(series: pd.Series) -> pd.Series:
+    return parse_datetime(series).dt.date
+
+def min_datetime_columns(columns: List[pd.Series], index: pd.Index) -> pd.Series:
+    """Row-wise earliest of datetime64 columns, ignoring missing dates (NaT when all are missing)."""
+    if not columns:
+        return pd.Series(pd.NaT, index=index, dtype="datetime64[ns]")
+    return pd.concat(columns, axis=1).min(axis=1, skipna=True)
+
+def survival_columns(baseline: pd.Series, event: pd.Series, event_date: pd.Series, censor_date: pd.Series,
+                     prefix: str) -> Tuple[pd.DataFrame, int]:
+    """
+    Time-to-event and censoring indicator of an outcome: follow-up ends on the event date for the
+    participants with the event, and on censor_date otherwise. Follow-up times that cannot be computed
+    (missing dates) or are negative (end before baseline) are left empty; the latter are counted.
+    """
+    event = event.fillna(False).astype(bool)
+    end = event_date.where(event, censor_date)
+    days = (end - baseline).dt.days
+    negative = days < 0
+    days = days.mask(negative)
+    return pd.DataFrame({
+        f"{prefix}_event": event.astype("int8"),
+        f"{prefix}_followup_end": end.dt.date,
+        f"{prefix}_followup_days": days.astype("Int64"),
+        f"{prefix}_followup_years": (days / DAYS_PER_YEAR).round(4),
+    }), int(negative.sum())
 
 def transform_df(df: pd.DataFrame, col: Dict[str, str]) -> pd.DataFrame:
     required = [
@@ -80,47 +113,49 @@ def transform_df(df: pd.DataFrame, col: Dict[str, str]) -> pd.DataFrame:
     if missing:
         raise ValueError(f"Missing required columns in input CSV: {missing}")
 
-    # Parse dates
-    baseline_dt = parse_date(df[col["baseline_date"]])
-    mi_dt      = parse_date(df[col["inc_mi_date_or_censor"]])
-    stroke_dt  = parse_date(df[col["stroke_date"]])
-    hf_dt      = parse_date(df[col["inc_hf_date_or_censor"]])
+    # Parse dates (datetime64, so the derivations below are vectorized)
+    baseline_ts = parse_datetime(df[col["baseline_date"]])
+    mi_ts      = parse_datetime(df[col["inc_mi_date_or_censor"]])
+    stroke_ts  = parse_datetime(df[col["stroke_date"]])
+    hf_ts      = parse_datetime(df[col["inc_hf_date_or_censor"]])
+    baseline_dt = baseline_ts.dt.date
+    mi_dt      = mi_ts.dt.date
+    stroke_dt  = stroke_ts.dt.date
+    hf_dt      = hf_ts.dt.date
 
     # Flags
-    prev_mi  = df[col["prev_mi"]].apply(to_bool)
-    prev_cv  = df[col["prev_stroke_tia"]].apply(to_bool)
-    prev_hf  = df[col["prev_hf"]].apply(to_bool)
+    prev_mi  = to_bool_series(df[col["prev_mi"]])
+    prev_cv  = to_bool_series(df[col["prev_stroke_tia"]])
+    prev_hf  = to_bool_series(df[col["prev_hf"]])
 
-    inc_mi_flag = df[col["inc_mi_flag"]].apply(to_bool)
-    inc_hf_flag = df[col["inc_hf_flag"]].apply(to_bool)
+    inc_mi_flag = to_bool_series(df[col["inc_mi_flag"]])
+    inc_hf_flag = to_bool_series(df[col["inc_hf_flag"]])
 
     # Incident MI: date = enddat_MI when inc_MI is True
-    incident_mi = inc_mi_flag.fillna(False)
-    incident_mi_date = np.where(incident_mi, mi_dt, pd.NaT)
+    incident_mi = inc_mi_flag.fillna(False).astype(bool)
+    incident_mi_ts = mi_ts.where(incident_mi)
 
     # Incident Stroke: derive from stroke_date (> baseline, not prevalent)
-    stroke_after_baseline = (pd.to_datetime(stroke_dt) > pd.to_datetime(baseline_dt)) | baseline_dt.isna()
-    not_prevalent_stroke  = ~(prev_cv.fillna(False))
-    incident_stroke = stroke_dt.notna() & stroke_after_baseline & not_prevalent_stroke
-    incident_stroke_date = np.where(incident_stroke, stroke_dt, pd.NaT)
+    stroke_after_baseline = (stroke_ts > baseline_ts) | baseline_ts.isna()
+    not_prevalent_stroke  = ~(prev_cv.fillna(False).astype(bool))
+    incident_stroke = stroke_ts.notna() & stroke_after_baseline & not_prevalent_stroke
+    incident_stroke_ts = stroke_ts.where(incident_stroke)
 
     # Incident HF: date = enddat_hf when inc_hf_2018 is True
-    incident_hf = inc_hf_flag.fillna(False)
-    incident_hf_date = np.where(incident_hf, hf_dt, pd.NaT)
+    incident_hf = inc_hf_flag.fillna(False).astype(bool)
+    incident_hf_ts = hf_ts.where(incident_hf)
 
     # Composite CVD: earliest of available incident dates
-    comp_dates = []
-    for mi_d, st_d, hf_d in zip(incident_mi_date, incident_stroke_date, incident_hf_date):
-        comp_dates.append(min_date_ignore_null([mi_d, st_d, hf_d]))
-    comp_dates = pd.Series(pd.to_datetime(comp_dates)).dt.date
-
     incident_cvd = incident_mi | incident_stroke | incident_hf
-    incident_cvd_date = np.where(incident_cvd, comp_dates, pd.NaT)
+    incident_cvd_ts = min_datetime_columns([incident_mi_ts, incident_stroke_ts, incident_hf_ts], df.index).where(incident_cvd)
 
     # Optional
-    death_date = parse_date(df[col["death_date"]]) if col["death_date"] in df.columns else pd.NaT
-    last_contact = parse_date(df[col["last_contact_date"]]) if col["last_contact_date"] in df.columns else pd.NaT
-    overall_censor = parse_date(df[col["overall_censor_date"]]) if col["overall_censor_date"] in df.columns else pd.NaT
+    death_ts = parse_datetime(df[col["death_date"]]) if col["death_date"] in df.columns else None
+    last_contact_ts = parse_datetime(df[col["last_contact_date"]]) if col["last_contact_date"] in df.columns else None
+    overall_censor_ts = parse_datetime(df[col["overall_censor_date"]]) if col["overall_censor_date"] in df.columns else None
+
+    # Censoring: end of follow-up without an event = earliest of death, overall censoring and last contact
+    censor_ts = min_datetime_columns([ts for ts in (death_ts, overall_censor_ts, last_contact_ts) if ts is not None], df.index)
 
     # Output
     out = pd.DataFrame({
@@ -139,25 +174,37 @@ def transform_df(df: pd.DataFrame, col: Dict[str, str]) -> pd.DataFrame:
         "enddat_hf": hf_dt,
     })
 
-    # Use Series wrapping to avoid DatetimeIndex .dt errors
-    out["incident_mi"] = incident_mi.astype(bool)
-    out["incident_mi_date"] = pd.to_datetime(pd.Series(incident_mi_date), errors="coerce").dt.date
+    out["incident_mi"] = incident_mi
+    out["incident_mi_date"] = incident_mi_ts.dt.date
 
     out["incident_stroke"] = incident_stroke.astype(bool)
-    out["incident_stroke_date"] = pd.to_datetime(pd.Series(incident_stroke_date), errors="coerce").dt.date
+    out["incident_stroke_date"] = incident_stroke_ts.dt.date
 
-    out["incident_hf"] = incident_hf.astype(bool)
-    out["incident_hf_date"] = pd.to_datetime(pd.Series(incident_hf_date), errors="coerce").dt.date
+    out["incident_hf"] = incident_hf
+    out["incident_hf_date"] = incident_hf_ts.dt.date
 
     out["incident_cvd_composite"] = incident_cvd.astype(bool)
-    out["incident_cvd_date"] = pd.to_datetime(pd.Series(incident_cvd_date), errors="coerce").dt.date
-
-    if isinstance(death_date, pd.Series):
-        out["fp_mortdat"] = death_date
-    if isinstance(last_contact, pd.Series):
-        out["fp_date_lastcontact"] = last_contact
-    if isinstance(overall_censor, pd.Series):
-        out["fp_censordate"] = overall_censor
+    out["incident_cvd_date"] = incident_cvd_ts.dt.date
+
+    if death_ts is not None:
+        out["fp_mortdat"] = death_ts.dt.date
+    if last_contact_ts is not None:
+        out["fp_date_lastcontact"] = last_contact_ts.dt.date
+    if overall_censor_ts is not None:
+        out["fp_censordate"] = overall_censor_ts.dt.date
+
+    # Survival: time-to-event and censoring indicator per outcome
+    outcomes = [
+        ("mi", incident_mi, incident_mi_ts),
+        ("stroke", incident_stroke, incident_stroke_ts),
+        ("hf", incident_hf, incident_hf_ts),
+        ("cvd", incident_cvd, incident_cvd_ts),
+    ]
+    for prefix, incident, incident_ts in outcomes:
+        survival, negative = survival_columns(baseline_ts, incident, incident_ts, censor_ts, prefix)
+        if negative:
+            print(f"[WARN] {prefix}: {negative} follow-up times before baseline set to missing")
+        out = pd.concat([out, survival], axis=1)
 
     return out
 
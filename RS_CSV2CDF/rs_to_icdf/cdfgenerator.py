@@ -1,20 +1,22 @@
-import pandas as pd
+from __future__ import annotations
 import time
-import resource
 import json
 from typing import Set, Dict, List
-import uuid
 import argparse
 import csv
 import os
 import sys
-import psutil
 import logging
 import traceback
+from .lazy_imports import lazy_import
 from .transformation_exceptions import MissingParticipantRowException
 from .transformation_exceptions import MoreThanOneValueInAssessmentVariants
 
 
+# pandas is only imported once it is actually used (e.g., not when printing the --help)
+pd = lazy_import('pandas')
+
+
 # Set the log level to INFO
 logging.basicConfig(level=logging.INFO)
 
@@ -33,7 +35,14 @@ def load_val(data_frames:Dict[str,pd.core.frame.DataFrame],file:str,col:str,part
         raise MissingParticipantRowException(ke)    
 
 
-def load_and_index_csv_datafiles(config_file_path:str) -> Dict[str,pd.core.frame.DataFrame]:
+def memory_usage_mb() -> float:
+    #psutil is only imported when memory logging is enabled (--log-memory)
+    import psutil
+    process = psutil.Process()
+    return process.memory_info().rss / 1024 ** 2
+
+
+def load_and_index_csv_datafiles(config_file_path:str, log_memory:bool=False) -> Dict[str,pd.core.frame.DataFrame]:
 
     data_frames:Dict[str,pd.core.frame.DataFrame] = {}
 
@@ -75,10 +84,10 @@ def load_and_index_csv_datafiles(config_file_path:str) -> Dict[str,pd.core.frame
         logging.info(str(data_frames[file]))      
         data_frames[file].set_index('project_pseudo_id',inplace=True)
         data_frames[file] = data_frames[file].sort_values(by='project_pseudo_id')
-        process = psutil.Process()
-        memory_usage = process.memory_info().rss / 1024 ** 2
-
-        logging.info(f"{file} loaded and indexed. Total memory usage: {memory_usage} MB")
+        if log_memory:
+            logging.info(f"{file} loaded and indexed. Total memory usage: {memory_usage_mb()} MB")
+        else:
+            logging.info(f"{file} loaded and indexed.")
 
     
     return data_frames
@@ -183,6 +192,7 @@ def main():
     parser.add_argument('ids_file', help='Path to the CSV file with a list of IDs.')
     parser.add_argument('config_file', help='Path to the JSON configuration file.')
     parser.add_argument('output_folder', help='Path to the output folder.')
+    parser.add_argument('--log-memory', action='store_true', help='Log the memory usage of the process while the CSV files are loaded (requires psutil).')
 
     # Parse the command-line arguments
     args = parser.parse_args()
@@ -207,15 +217,13 @@ def main():
     
     load_start_time = time.time()
     ids = load_ids(args.ids_file)
-    data_frames = load_and_index_csv_datafiles(args.config_file)
+    data_frames = load_and_index_csv_datafiles(args.config_file,args.log_memory)
     load_end_time = time.time()
 
     logging.info(f"{len(data_frames)} CSV files loaded and indexed in {load_end_time - load_start_time} seconds.")
 
-    process = psutil.Process()
-    memory_usage = process.memory_info().rss / 1024 ** 2
-
-    logging.info(f"Total memory usage: {memory_usage} MB")
+    if args.log_memory:
+        logging.info(f"Total memory usage: {memory_usage_mb()} MB")
 
 
     config_file = open(args.config_file)
@@ -0,0 +1,36 @@
+import importlib.util
+import sys
+from types import ModuleType
+
+
+def lazy_import(name:str) -> ModuleType:
+    """
+    Return the module 'name' without executing it: the actual import happens the first time one of
+    its attributes is used. Used for heavy dependencies (e.g., pandas) that some code paths never need,
+    so that they do not add to the start-up time of the command-line tools.
+
+    The first use must happen on a single thread: on Python < 3.12 the lazy module is not thread-safe,
+    and threads using it while another one is executing it see a partially initialized module (e.g.,
+    "module 'pandas' has no attribute 'read_csv'"). Call resolve() on the module before starting
+    threads that use it.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError(f"No module named '{name}'", name=name)
+
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+def resolve(module:ModuleType) -> ModuleType:
+    """Execute a module returned by lazy_import now (if it was not used yet), on the calling thread."""
+    #any attribute access runs the deferred import
+    module.__name__
+    return module